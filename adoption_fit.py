@@ -0,0 +1,158 @@
+import numpy as np
+
+# ---------------- Logistic Adoption Fitting ----------------
+# Fits the logistic adoption curve of the projection engine,
+#     share(t) = cap / (1 + exp(-rate * (t - midpoint))),
+# to observed chatbot shares of many series (e.g. segments) at once. Every
+# Levenberg-Marquardt iteration builds the 3 x 3 normal equations of all series
+# with array operations and solves them in one batched np.linalg.solve call, so
+# thousands of curves are fitted together instead of one optimizer call each.
+
+# Fitted parameters mapped to the assumption keys of the logistic adoption model.
+ASSUMPTION_KEYS = {
+    "rate": "chatbot_adoption_growth_rate",
+    "midpoint": "chatbot_adoption_midpoint",
+    "cap": "max_chatbot_rate",
+}
+
+def logistic_curve(t, rate, midpoint, cap):
+    """
+    Logistic adoption curve, written with tanh so it never overflows.
+
+    Parameters:
+    t (np.ndarray): Times in years.
+    rate, midpoint, cap (np.ndarray): Curve parameters, broadcastable against `t`.
+
+    Returns:
+    np.ndarray: Adoption share at `t`.
+    """
+    return cap * 0.5 * (1 + np.tanh(0.5 * rate * (t - midpoint)))
+
+def _weighted_line(x, y, w):
+    # Closed-form weighted least-squares line y = intercept + slope * x of every row.
+    sw = w.sum(axis=1)
+    mx = (w * x).sum(axis=1) / sw
+    my = (w * y).sum(axis=1) / sw
+    dx = x - mx[:, np.newaxis]
+    sxx = (w * dx * dx).sum(axis=1)
+    slope = np.where(sxx > 0, (w * dx * (y - my[:, np.newaxis])).sum(axis=1) / np.where(sxx > 0, sxx, 1.0), 0.0)
+    return my - slope * mx, slope
+
+def _initial_guess(t, y, w, cap_bounds):
+    # Cap a little above the largest observation, then rate and midpoint from a
+    # weighted line through the logit of the shares (the curve is a line there).
+    observed = np.where(w > 0, y, -np.inf).max(axis=1)
+    cap = np.clip(np.maximum(1.25 * observed, observed + 1e-3), cap_bounds[0], cap_bounds[1])
+    share = np.clip(y / cap[:, np.newaxis], 1e-4, 1 - 1e-4)
+    logit = np.log(share / (1 - share))
+    # Points near 0 or the cap carry little information about the logit.
+    intercept, rate = _weighted_line(t, logit, w * (share * (1 - share)) ** 2)
+    rate = np.where(rate > 1e-3, rate, 0.5)
+    midpoint = np.where(rate > 1e-3, -intercept / rate, (w * t).sum(axis=1) / w.sum(axis=1))
+    return np.stack([rate, midpoint, cap], axis=1)
+
+def _residuals(params, t, y, w):
+    fitted = logistic_curve(t, params[:, 0:1], params[:, 1:2], params[:, 2:3])
+    residuals = np.where(w > 0, y - fitted, 0.0)
+    return residuals, (w * residuals * residuals).sum(axis=1)
+
+def fit_logistic(t, y, weights=None, cap_bounds=(1e-6, 1.0), max_iter=200, tol=1e-9):
+    """
+    Least-squares fit of logistic adoption curves to many observed series at once.
+
+    Example: monthly chatbot shares of 5,000 segments over the last 3 years, with
+    t in years relative to the start of the projection (so t <= 0):
+        fit = fit_logistic(t, shares, weights=contacts)
+        segment_table = segment_table.assign(**adoption_assumptions(fit))
+
+    Parameters:
+    t (np.ndarray): (T,) times in years shared by all series, or (S, T) per series.
+    y (np.ndarray): (S, T) observed shares; NaN marks missing observations.
+    weights (np.ndarray | None): (S, T) or (T,) observation weights (e.g. contact
+        counts), 1 by default.
+    cap_bounds (tuple): (low, high) bounds of the fitted cap.
+    max_iter (int): Maximum number of Levenberg-Marquardt iterations.
+    tol (float): Relative decrease of the residual sum of squares below which a
+        series is considered converged.
+
+    Returns:
+    dict:
+        "rate", "midpoint", "cap": (S,) fitted parameters (NaN for series with fewer
+            than 3 observations).
+        "rss": (S,) weighted residual sum of squares.
+        "converged": (S,) boolean mask of the series that met `tol`.
+        "iterations": Number of batched iterations run.
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+    n_series = y.shape[0]
+    t = np.broadcast_to(np.asarray(t, dtype=np.float64), y.shape)
+    w = np.ones_like(y) if weights is None else np.broadcast_to(np.asarray(weights, dtype=np.float64), y.shape)
+    w = np.where(np.isnan(y) | np.isnan(t), 0.0, w)
+    y = np.where(w > 0, y, 0.0)
+    t = np.where(w > 0, t, 0.0)
+    valid = (w > 0).sum(axis=1) >= 3
+    w = np.where(valid[:, np.newaxis], w, 0.0)
+    w[~valid, 0] = 1.0  # Keeps the normal equations of skipped series solvable.
+
+    params = _initial_guess(t, y, w, cap_bounds)
+    residuals, rss = _residuals(params, t, y, w)
+    damping = np.full(n_series, 1e-3)
+    active = np.flatnonzero(valid)
+    iterations = 0
+    while iterations < max_iter and len(active):
+        # Only the series still improving are carried through the iteration.
+        ta, ya, wa, pa = t[active], y[active], w[active], params[active]
+        rate, midpoint, cap = pa[:, 0:1], pa[:, 1:2], pa[:, 2:3]
+        share = 0.5 * (1 + np.tanh(0.5 * rate * (ta - midpoint)))
+        slope = cap * share * (1 - share)
+        jacobian = np.stack([slope * (ta - midpoint), -slope * rate, share], axis=2)  # (S, T, 3)
+        weighted = jacobian * wa[:, :, np.newaxis]
+        normal = np.einsum("stj,stk->sjk", weighted, jacobian)
+        gradient = np.einsum("stj,st->sj", weighted, residuals[active])
+        # Marquardt scaling of the diagonal, plus a tiny ridge for flat series.
+        diagonal = np.einsum("sjj->sj", normal)
+        lhs = normal + (damping[active, np.newaxis] * diagonal + 1e-12)[:, :, np.newaxis] * np.eye(3)
+        step = np.linalg.solve(lhs, gradient[:, :, np.newaxis])[:, :, 0]
+
+        trial = pa + step
+        trial[:, 2] = np.clip(trial[:, 2], cap_bounds[0], cap_bounds[1])
+        trial_residuals, trial_rss = _residuals(trial, ta, ya, wa)
+        improved = trial_rss < rss[active]
+
+        accepted = active[improved]
+        converged = rss[accepted] - trial_rss[improved] <= tol * rss[accepted]
+        params[accepted] = trial[improved]
+        residuals[accepted] = trial_residuals[improved]
+        rss[accepted] = trial_rss[improved]
+        damping[active] = np.where(improved, damping[active] / 3, damping[active] * 4)
+        # A series whose damping keeps growing can no longer improve: it is at a minimum.
+        done = np.zeros(len(active), dtype=bool)
+        done[np.flatnonzero(improved)[converged]] = True
+        done |= damping[active] > 1e10
+        active = active[~done]
+        iterations += 1
+
+    unconverged = np.zeros(n_series, dtype=bool)
+    unconverged[active] = True
+    params[~valid] = np.nan
+    return {
+        "rate": params[:, 0],
+        "midpoint": params[:, 1],
+        "cap": params[:, 2],
+        "rss": np.where(valid, rss, np.nan),
+        "converged": valid & ~unconverged,
+        "iterations": iterations,
+    }
+
+def adoption_assumptions(fit):
+    """
+    Fitted parameters as assumption columns of the logistic adoption model,
+    e.g. to add to a segment table or to override a scenario's assumptions.
+
+    Parameters:
+    fit (dict): Result of `fit_logistic`.
+
+    Returns:
+    dict: Assumption key mapped to its (S,) fitted values.
+    """
+    return {key: fit[parameter] for parameter, key in ASSUMPTION_KEYS.items()}
@@ -1,11 +1,107 @@
+import os
+
+import pandas as pd
 import streamlit as st
+
+import segments
+from financial_core import DEFAULT_ASSUMPTIONS
 # ---------------- Asumptions Input ----------------
 
 def scenario_timeframe():
     """
     Sidebar widget to select the scenario time frame.
     """
-    return st.sidebar.slider("Scenario Time Frame (Years)", 2, 10, 6)
+    return st.sidebar.slider("Scenario Time Frame (Years)", 2, 30, 6)
+
+def scenario_time_step():
+    """
+    Sidebar widget to select the time step the model is run at. Results are
+    always shown per year.
+    """
+    labels = {"year": "Anual", "quarter": "Trimestral", "month": "Mensual", "day": "Diaria"}
+    return st.sidebar.selectbox("Granularidad del modelo", list(labels), format_func=labels.get)
+
+def scenario_retention_model():
+    """
+    Sidebar widget to select the retention model: one flat retention effect or
+    one retention curve per cohort of new customers.
+    """
+    labels = {"flat": "Plano", "cohort": "Por cohortes"}
+    return st.sidebar.selectbox("Modelo de retención", list(labels), format_func=labels.get)
+
+def scenario_adoption_model():
+    """
+    Sidebar widget to select how the chatbot share of contacts grows: linearly from
+    the initial rate or along a logistic (S-shaped) adoption curve.
+    """
+    labels = {"linear": "Lineal", "logistic": "Logística"}
+    return st.sidebar.selectbox("Modelo de adopción del chatbot", list(labels), format_func=labels.get)
+
+def scenario_count():
+    """
+    Sidebar widget to select how many scenarios are configured and compared.
+    """
+    return st.sidebar.number_input("Número de escenarios", min_value=1, max_value=20, value=2, step=1)
+
+def scenarios_file():
+    """
+    Sidebar widget to load scenarios from a file instead of configuring them in the sidebar.
+
+    The file (CSV, Parquet or JSONL) has one scenario per row and one column per
+    assumption; missing assumption columns use DEFAULT_ASSUMPTIONS and an optional
+    "scenario" column names the scenarios. Files with repeated scenario names or
+    blank assumption cells are rejected with an error in the sidebar.
+
+    Returns:
+    dict | None: Scenario name mapped to its assumptions, None if no valid file is loaded.
+    """
+    uploaded = st.sidebar.file_uploader("Cargar escenarios (CSV, Parquet o JSONL)", type=["csv", "parquet", "jsonl"])
+    if uploaded is None:
+        return None
+
+    extension = os.path.splitext(uploaded.name)[1].lower()
+    if extension == ".parquet":
+        rows = pd.read_parquet(uploaded)
+    elif extension == ".jsonl":
+        rows = pd.read_json(uploaded, lines=True)
+    else:
+        rows = pd.read_csv(uploaded)
+
+    names = pd.Series([f"Escenario {i + 1}" for i in range(len(rows))], index=rows.index)
+    if "scenario" in rows.columns:
+        names = rows["scenario"].astype(str).where(rows["scenario"].notna(), names)
+    repeated = names[names.duplicated()].unique()
+    if len(repeated):
+        st.sidebar.error(f"Nombres de escenario repetidos en el archivo: {', '.join(repeated)}.")
+        return None
+    blank = rows[[key for key in rows.columns if key in DEFAULT_ASSUMPTIONS]].isna().stack()
+    blank = blank[blank]
+    if len(blank):
+        cells = [f"{names[row]} ({key})" for row, key in blank.index[:10]]
+        st.sidebar.error(f"Faltan {len(blank)} valores en el archivo de escenarios: {', '.join(cells)}.")
+        return None
+
+    scenarios = {}
+    for name, row in zip(names, rows.to_dict("records")):
+        scenarios[name] = {
+            **DEFAULT_ASSUMPTIONS,
+            **{key: float(value) for key, value in row.items() if key in DEFAULT_ASSUMPTIONS},
+        }
+    return scenarios
+
+def segments_file():
+    """
+    Sidebar widget to load a segment table (one row per segment, e.g. region x
+    product x channel). Assumption columns override the scenario's assumptions
+    for each segment; any other column is a segment attribute for drill-downs.
+
+    Returns:
+    pd.DataFrame | None: The segment table, None if no file is loaded.
+    """
+    uploaded = st.sidebar.file_uploader("Cargar segmentos (CSV o Parquet)", type=["csv", "parquet"])
+    if uploaded is None:
+        return None
+    return segments.read_segments(uploaded)
 
 def input_assumptions(scenario_name):
     """
@@ -27,17 +123,17 @@ def input_assumptions(scenario_name):
         f"{scenario_name} - Current Conversion Rate (%)",
         min_value=0.001,
         max_value=0.025,
-        value=0.005,
+        value=DEFAULT_ASSUMPTIONS["perc_estimated_current_conversion"],
         format="%.3f"  # Formato con 2 decimales
     )
     avg_telephone_cost_per_interaction = st.sidebar.number_input(
         f"{scenario_name} - Average Telephone Cost per Interaction (€)",
-        value=1.5  # Default: €1.5 per phone interaction.
+        value=DEFAULT_ASSUMPTIONS["avg_telephone_cost_per_interaction"]  # Default: €1.5 per phone interaction.
     )  # Average cost of a customer interaction via telephone.
 
     avg_chatbot_cost_per_interaction = st.sidebar.slider(
         f"{scenario_name} - Average Chatbot Cost Decrease per Interaction (%)",
-        0.0, 0.6, 0.3  # Range: 0% to 100%, Default: 30%.  ### MEDIA DE LLAMADAS POR INTERACCION DE USUARIO 6/7--> CALCULAR CUANTAS INTERACCIONES SON NECESARIAS CON EL CHATBOT
+        0.0, 0.6, DEFAULT_ASSUMPTIONS["avg_chatbot_cost_per_interaction"]  # Range: 0% to 100%, Default: 30%.  ### MEDIA DE LLAMADAS POR INTERACCION DE USUARIO 6/7--> CALCULAR CUANTAS INTERACCIONES SON NECESARIAS CON EL CHATBOT
     )  # Percentage cost reduction of chatbot vs. telephone interactions.
 
     # insurance_company_avg_policy_price = st.sidebar.number_input(
@@ -47,38 +143,10 @@ def input_assumptions(scenario_name):
 
     # Return a dictionary of assumptions
 
+    # Fixed assumptions (company data and historical benchmarks) come from
+    # financial_core.DEFAULT_ASSUMPTIONS; the dynamic ones are overridden here.
     return {
-        # Fixed Assumptions: Derived from company data and historical benchmarks
-        # "years": scenario_timeframe(),  # Timeframe for the analysis, defined elsewhere.
-        "initial_insurance_company_health_policies": 2_000_000,  # Starting insurance policies at the end of 2024 (from insurance_company investors report). TBC Maria
-        "avg_contacts_phone_web_daily": 3_500,  # Average daily customer interactions (phone + web). AKA cotizaciones
-        "nps_increase": 0.01,  # 1% improvement in retention from NPS enhancement.
-        "nps_diminishing_rate": -0.005,  # 1% annual decline in the effect of NPS improvement.
-        "economies_scale_cost_factor": 0.03,  # 3% annual efficiency gain due to economies of scale.
-        "first_year_costs": 110_000 + 100_000 + 40_000 + 10_000,  # Total initial implementation costs:
-        # - Team Costs: €110k
-        # - Design & implementation: €100k
-        # - Database configuration & integration: €40k
-        # - Testing: €10k
-        "recurring_monthly_costs": 50_000,  # Monthly infrastructure costs after implementation. LLAMADAS API CHATBOT
-        "conversion_increase": 0.005,  # Annual improvement in conversion rate (0.05%).
-        "max_conversion_rate": 0.03,  # Maximum achievable conversion rate (3%).
-        "discount_rate": 0.05,  # Discount rate for financial projections (5%).
-
-        "avg_market_policy_price": 40,  # Base value of current health insurance policy (€40).
-        "price_elasticity": 0.7,  # Price elasticity of demand for insurance policies (0.5).
-
-        "initial_phone_rate": 0.6,
-        "initial_web_rate": 1 - 0.6 - 0.05,
-        "initial_chatbot_rate": 0.05, # Initial chatbot handling rate (%).
-        
-        "phone_decrease_rate": 0.02,
-        "web_decrease_rate": -0.02,
-        "chatbot_increase_rate": 0.05,
-        # Dynamic Assumptions: Configurable by the user
-          # perc_contacts_handled_by_chatbot_initial,  
-        "insurance_company_avg_policy_price": 50,  # Average annual revenue per policy (€).
-        "health_insurance_yearly_company_growth_rate": 0.095,  # Company growth rate (%).
+        **DEFAULT_ASSUMPTIONS,
         "perc_estimated_current_conversion": perc_estimated_current_conversion,  # Initial conversion rate (%).
         "avg_telephone_cost_per_interaction": avg_telephone_cost_per_interaction,  # Cost per phone interaction (€).
         "avg_chatbot_cost_per_interaction": avg_chatbot_cost_per_interaction  # Cost per chatbot interaction (€).
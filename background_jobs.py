@@ -0,0 +1,166 @@
+"""
+Background execution of long, chunked computations.
+
+A job runs an iterator of (units done, partial result) pairs on a worker
+thread, e.g. `monte_carlo.iter_simulate_financials`. The NumPy kernels release
+the GIL, so the Streamlit script thread stays responsive while the job runs.
+The handle exposes progress and the latest partial result for progressive
+rendering, and cancellation is checked between chunks: the iterator is simply
+not resumed once a job is cancelled.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------------- Jobs ----------------
+
+class Job:
+    """
+    Handle of a background computation.
+
+    Parameters:
+    key (str): Identity of the inputs, e.g. from `scenario_cache.assumptions_hash`.
+    total (int | None): Units of work (paths, sweep points...) if known, for progress.
+    """
+
+    def __init__(self, key, total=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.total = total
+        self.completed = 0
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.status = "pending"
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def progress(self):
+        """Fraction of the work done, between 0 and 1 (0 while unknown)."""
+        if self.status == "done":
+            return 1.0
+        return min(self.completed / self.total, 1.0) if self.total else 0.0
+
+    @property
+    def done(self):
+        """True once the job finished, failed or was cancelled."""
+        return self._finished.is_set()
+
+    def cancel(self):
+        """Request cancellation; the job stops before its next chunk."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Block until the job is done.
+
+        Returns:
+        bool: True if the job is done, False on timeout.
+        """
+        return self._finished.wait(timeout)
+
+    def _run(self, chunks):
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            iterator = iter(chunks())
+            while not self._cancel.is_set():
+                try:
+                    completed, partial = next(iterator)
+                except StopIteration:
+                    self.result = self.partial
+                    self.status = "done"
+                    break
+                self.completed, self.partial = completed, partial
+            else:
+                self.status = "cancelled"
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+        except Exception as error:
+            self.error = error
+            self.status = "failed"
+        finally:
+            self.finished_at = time.time()
+            self._finished.set()
+
+class JobManager:
+    """
+    Thread pool running background jobs.
+
+    Parameters:
+    max_workers (int): Number of jobs that run concurrently; further jobs wait in a queue.
+    """
+
+    def __init__(self, max_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="background-job")
+
+    def submit(self, key, chunks, total=None):
+        """
+        Start a job.
+
+        Parameters:
+        key (str): Identity of the inputs.
+        chunks (callable): Function without arguments returning an iterator of
+            (units done, partial result) pairs; the last partial result is the job's result.
+        total (int | None): Units of work, for progress.
+
+        Returns:
+        Job: The job handle.
+        """
+        job = Job(key, total)
+        self._executor.submit(job._run, chunks)
+        return job
+
+    def replace(self, previous, key, chunks, total=None):
+        """
+        Keep `previous` if it computes the same `key`, otherwise cancel it and start a new job.
+
+        This is the cancel-on-input-change rule: a session keeps one job per
+        computation and calls `replace` on every rerun with the current inputs.
+
+        Returns:
+        Job: `previous` or the new job.
+        """
+        if previous is not None:
+            if previous.key == key and previous.status not in ("failed", "cancelled"):
+                return previous
+            previous.cancel()
+        return self.submit(key, chunks, total)
+
+    def shutdown(self, cancel=True):
+        self._executor.shutdown(wait=False, cancel_futures=cancel)
+
+_headless_manager = None
+
+def _new_manager():
+    return JobManager()
+
+def get_manager():
+    """
+    Return the process-wide job manager, held with `st.cache_resource` inside a Streamlit app.
+
+    Returns:
+    JobManager: The shared manager.
+    """
+    global _headless_manager
+    try:
+        import streamlit as st
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        if get_script_run_ctx(suppress_warning=True) is not None:
+            return st.cache_resource(_new_manager)()
+    except ImportError:
+        pass
+
+    if _headless_manager is None:
+        _headless_manager = _new_manager()
+    return _headless_manager
@@ -0,0 +1,166 @@
+"""
+Headless batch evaluation of scenario files.
+
+Reads assumption sets (one scenario per row, missing columns use the model
+defaults) from CSV, Parquet or JSONL in chunks, runs the batch projection engine
+on each chunk and streams the yearly results to Parquet (one row group per
+chunk) or CSV. Memory use is bounded by the chunk size, not by the number of
+scenarios in the file.
+
+Usage:
+    python batch_cli.py scenarios.csv results.parquet --years 10 --chunk-size 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import financial_core as core
+
+# ---------------- Input ----------------
+
+def _file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".csv", ".txt"):
+        return "csv"
+    if extension in (".parquet", ".pq"):
+        return "parquet"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"Unsupported file type '{extension}' for {path}.")
+
+def read_scenarios(path, chunk_size):
+    """
+    Iterate over a scenario file in chunks.
+
+    Parameters:
+    path (str): CSV, Parquet or JSONL file with one assumption set per row.
+    chunk_size (int): Maximum number of scenarios per chunk.
+
+    Yields:
+    pd.DataFrame: Chunk of scenario rows.
+    """
+    file_format = _file_format(path)
+    if file_format == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif file_format == "jsonl":
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+# ---------------- Evaluation ----------------
+
+def evaluate_chunk(scenarios, time_period, first_scenario_id=0, dtype=np.float64):
+    """
+    Run the projection for a chunk of scenarios.
+
+    Parameters:
+    scenarios (pd.DataFrame): One assumption set per row; missing columns use core.DEFAULT_ASSUMPTIONS.
+    time_period (int): Number of years in the projection.
+    first_scenario_id (int): Id given to the first row of the chunk.
+    dtype (np.dtype): Storage type of the result columns.
+
+    Returns:
+    pd.DataFrame: Long-format results in raw units (see core.RESULT_COLUMNS), one row per scenario and year.
+    """
+    # Assumptions without a column in the file fall back to the model defaults.
+    assumptions = {
+        key: scenarios[key].to_numpy() if key in scenarios.columns else core.DEFAULT_ASSUMPTIONS[key]
+        for key in core.PROJECTION_KEYS
+    }
+    batch = core.calculate_financials_batch(time_period, assumptions, dtype)
+    n_scenarios = len(scenarios)
+    results = {"scenario_id": np.repeat(np.arange(first_scenario_id, first_scenario_id + n_scenarios), time_period + 1)}
+    for column, values in batch.items():
+        results[column] = values.ravel().astype(np.int64) if column == "year" else values.ravel()
+    return pd.DataFrame(results)
+
+# ---------------- Output ----------------
+
+class ResultWriter:
+    """
+    Streams result chunks to a Parquet file (one row group per chunk) or a CSV file.
+
+    Parameters:
+    path (str): Output file, the format is taken from the extension.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file_format = _file_format(path)
+        self._writer = None
+        if self.file_format == "jsonl":
+            raise ValueError("Results can only be written to Parquet or CSV.")
+
+    def write(self, results):
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(results, preserve_index=False)
+        if self._writer is None:
+            if self.file_format == "csv":
+                import pyarrow.csv as pa_csv
+
+                self._writer = pa_csv.CSVWriter(self.path, table.schema)
+            else:
+                import pyarrow.parquet as pq
+
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def run_batch(input_path, output_path, time_period, chunk_size=50_000, dtype=np.float64, log=sys.stderr):
+    """
+    Evaluate every scenario in `input_path` and stream the results to `output_path`.
+
+    Returns:
+    dict: Number of scenarios, elapsed seconds and throughput in scenarios per second.
+    """
+    start = time.perf_counter()
+    n_scenarios = 0
+    with ResultWriter(output_path) as writer:
+        for scenarios in read_scenarios(input_path, chunk_size):
+            writer.write(evaluate_chunk(scenarios, time_period, n_scenarios, dtype))
+            n_scenarios += len(scenarios)
+            if log is not None:
+                elapsed = time.perf_counter() - start
+                print(f"{n_scenarios:,} scenarios, {n_scenarios / elapsed:,.0f} scenarios/s", file=log)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "scenarios": n_scenarios,
+        "seconds": elapsed,
+        "scenarios_per_second": n_scenarios / elapsed if elapsed > 0 else float("inf"),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate scenario files with the financial projection engine.")
+    parser.add_argument("input", help="CSV, Parquet or JSONL file with one assumption set per row.")
+    parser.add_argument("output", help="Parquet or CSV file for the yearly results.")
+    parser.add_argument("--years", type=int, default=6, help="Projection horizon in years (default: 6).")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="Scenarios per chunk / row group.")
+    parser.add_argument("--float32", action="store_true", help="Store result columns as float32.")
+    parser.add_argument("--quiet", action="store_true", help="Only print the final summary.")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(args.input, args.output, args.years, args.chunk_size,
+                        dtype=np.float32 if args.float32 else np.float64, log=None if args.quiet else sys.stderr)
+    print(f"Processed {summary['scenarios']:,} scenarios in {summary['seconds']:.2f}s "
+          f"({summary['scenarios_per_second']:,.0f} scenarios/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Benchmark suite for the projection engine, UI data preparation and chart rendering.
+
+Times every case at realistic sizes, writes the results to a JSON file and
+compares them with a stored baseline. Exits with status 1 when any case is
+slower than the baseline by more than the regression threshold.
+
+Usage:
+    python benchmarks/run_benchmarks.py                         # compare with benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --only engine --threshold 0.5
+    python benchmarks/run_benchmarks.py --update-baseline        # store the current timings as baseline
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import financial_core as core  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results.json")
+
+# ---------------- Fixtures ----------------
+
+def _scenario_batch(n_scenarios, seed=0):
+    """
+    Default assumptions with the main dynamic inputs varied across `n_scenarios`.
+    """
+    rng = np.random.default_rng(seed)
+    assumptions = dict(core.DEFAULT_ASSUMPTIONS)
+    assumptions["chatbot_increase_rate"] = rng.uniform(0.0, 0.1, n_scenarios)
+    assumptions["perc_estimated_current_conversion"] = rng.uniform(0.001, 0.025, n_scenarios)
+    assumptions["avg_chatbot_cost_per_interaction"] = rng.uniform(0.0, 0.6, n_scenarios)
+    assumptions["recurring_monthly_costs"] = rng.uniform(20_000, 80_000, n_scenarios)
+    return assumptions
+
+def _scenario_frames(n_scenarios, time_period=10):
+    import helper_functions as hf
+
+    batch = _scenario_batch(n_scenarios)
+    return [
+        hf.calculate_financials(time_period, {key: (value[i] if isinstance(value, np.ndarray) else value)
+                                              for key, value in batch.items()})
+        for i in range(n_scenarios)
+    ]
+
+# ---------------- Cases ----------------
+# Each case builds its inputs once and returns the `run` callable that is timed.
+
+def case_calculate_financials_10y():
+    import helper_functions as hf
+    return lambda: hf.calculate_financials(10, core.DEFAULT_ASSUMPTIONS)
+
+def _engine_case(n_scenarios, time_period, time_step="year", adoption_model="linear"):
+    def case():
+        assumptions = _scenario_batch(n_scenarios)
+        return lambda: core.calculate_financials_batch(time_period, assumptions, time_step=time_step,
+                                                       adoption_model=adoption_model)
+    return case
+
+def case_calculate_contacts_scalar():
+    a = core.DEFAULT_ASSUMPTIONS
+    return lambda: [
+        core.calculate_contacts(a["avg_contacts_phone_web_daily"] * 365, a["initial_phone_rate"], a["initial_web_rate"],
+                                a["initial_chatbot_rate"], a["phone_decrease_rate"], a["web_decrease_rate"],
+                                a["chatbot_increase_rate"], year)
+        for year in range(11)
+    ]
+
+def case_calculate_contacts_100k_x_10y():
+    a = _scenario_batch(100_000)
+    year = np.arange(11, dtype=np.float64)[np.newaxis, :]
+    chatbot_increase_rate = a["chatbot_increase_rate"][:, np.newaxis]
+    return lambda: core.calculate_contacts(a["avg_contacts_phone_web_daily"] * 365, a["initial_phone_rate"],
+                                           a["initial_web_rate"], a["initial_chatbot_rate"], a["phone_decrease_rate"],
+                                           a["web_decrease_rate"], chatbot_increase_rate, year)
+
+def case_calculate_max_y_limit():
+    import helper_functions as hf
+    df1, df2 = _scenario_frames(2)
+    return lambda: hf.calculate_max_y_limit(df1, df2)
+
+def _waterfall_case(n_scenarios, renderer="plot_waterfall"):
+    def case():
+        import matplotlib
+        matplotlib.use("Agg")
+        import helper_functions as hf
+        import visuals
+
+        frames = _scenario_frames(n_scenarios)
+        y_max = hf.calculate_max_y_limit(*frames)
+        plot = getattr(visuals, renderer)
+
+        def run():
+            for i, df in enumerate(frames):
+                plot(df, f"Escenario {i + 1}", y_max)
+
+        # Streamlit configures its loggers on the first call outside a script run;
+        # afterwards silence the per-call "missing ScriptRunContext" warnings.
+        run()
+        for name in list(logging.root.manager.loggerDict):
+            if name.startswith("streamlit"):
+                logging.getLogger(name).setLevel(logging.ERROR)
+        return run
+    return case
+
+def case_render_waterfall_png():
+    # Uncached matplotlib render of one waterfall; plot_waterfall serves repeats from its cache.
+    import matplotlib
+    matplotlib.use("Agg")
+    import helper_functions as hf
+    import visuals
+
+    df = _scenario_frames(1)[0]
+    components = hf.waterfall_components(df)
+    y_max = hf.calculate_max_y_limit(df)
+    return lambda: visuals.render_waterfall_png(components, y_max)
+
+def case_fit_logistic_10k():
+    # Monthly chatbot shares of 10,000 segments over 4 years.
+    import adoption_fit
+
+    rng = np.random.default_rng(0)
+    t = np.arange(48) / 12 - 4
+    n_series = 10_000
+    shares = adoption_fit.logistic_curve(t, rng.uniform(0.8, 3, n_series)[:, np.newaxis],
+                                         rng.uniform(-3, -1, n_series)[:, np.newaxis],
+                                         rng.uniform(0.2, 0.9, n_series)[:, np.newaxis])
+    shares = shares + rng.normal(0, 0.01, shares.shape)
+    return lambda: adoption_fit.fit_logistic(t, shares)
+
+CASES = {
+    "engine/calculate_financials_1x10y": case_calculate_financials_10y,
+    "engine/batch_1x10y": _engine_case(1, 10),
+    "engine/batch_1kx10y": _engine_case(1_000, 10),
+    "engine/batch_100kx10y": _engine_case(100_000, 10),
+    "engine/batch_1x360m": _engine_case(1, 29, "month"),
+    "engine/batch_1kx360m": _engine_case(1_000, 29, "month"),
+    "engine/batch_100kx360m": _engine_case(100_000, 29, "month"),
+    "engine/batch_1kx30y_daily": _engine_case(1_000, 29, "day"),
+    "engine/batch_100kx10y_logistic": _engine_case(100_000, 10, adoption_model="logistic"),
+    "engine/calculate_contacts_scalar_11y": case_calculate_contacts_scalar,
+    "engine/calculate_contacts_100kx10y": case_calculate_contacts_100k_x_10y,
+    "ui/calculate_max_y_limit": case_calculate_max_y_limit,
+    "fit/logistic_10kx48m": case_fit_logistic_10k,
+    "render/plot_waterfall_2": _waterfall_case(2),
+    "render/plot_waterfall_20": _waterfall_case(20),
+    "render/plot_waterfall_vega_20": _waterfall_case(20, "plot_waterfall_vega"),
+    "render/waterfall_png_uncached": case_render_waterfall_png,
+}
+
+# ---------------- Runner ----------------
+
+def time_case(run, repeat=5, min_time=0.2):
+    """
+    Time `run`, calibrating the number of loops so one measurement takes at least `min_time`.
+
+    Returns:
+    dict: Median and best seconds per call, loops per measurement and repeats.
+    """
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        samples.append((time.perf_counter() - start) / loops)
+    return {"median_s": float(np.median(samples)), "best_s": min(samples), "loops": loops, "repeat": repeat}
+
+def run_benchmarks(only=None, repeat=5, min_time=0.2):
+    results = {}
+    for name, case in CASES.items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        results[name] = time_case(case(), repeat, min_time)
+        print(f"{name:<40} {results[name]['median_s'] * 1e3:>10.3f} ms", file=sys.stderr)
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    Compare median timings with the baseline.
+
+    Returns:
+    list[dict]: One row per case present in both, with the slowdown ratio and whether it regressed.
+    """
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median_s"] / baseline[name]["median_s"]
+        rows.append({"case": name, "ratio": ratio, "regressed": ratio > 1 + threshold})
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare with a baseline.")
+    parser.add_argument("--only", nargs="*", help="Only run cases whose name contains one of these strings.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON file for the results.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown relative to the baseline before failing (default: 0.25 = 25%%).")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per measurement.")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to the baseline file.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.repeat, args.min_time)
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    rows = compare(results, baseline, args.threshold)
+    for row in rows:
+        status = "REGRESSION" if row["regressed"] else "ok"
+        print(f"{row['case']:<40} {row['ratio']:>6.2f}x  {status}")
+    return 1 if any(row["regressed"] for row in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+
+# ---------------- Chart Data Preparation ----------------
+# Charts receive small, pre-aggregated, pre-folded (long format) frames built here
+# with NumPy, so Vega-Lite never serialises or transforms more than a few
+# thousand rows, however many paths or grid points are behind a chart.
+
+# Hard cap on the rows sent to one chart.
+MAX_CHART_ROWS = 5_000
+
+# Horizontal resolution the charts are downsampled to: one min and one max per pixel bucket.
+DEFAULT_PIXEL_BUDGET = 800
+
+class ChartPayloadError(ValueError):
+    """
+    Raised when the data for a chart would exceed MAX_CHART_ROWS even after downsampling.
+    """
+
+def check_payload(data, max_rows=MAX_CHART_ROWS):
+    """
+    Enforce the row cap of a chart.
+
+    Parameters:
+    data (pd.DataFrame): Data about to be sent to a chart.
+    max_rows (int): Maximum number of rows.
+
+    Returns:
+    pd.DataFrame: `data`, unchanged.
+    """
+    if len(data) > max_rows:
+        raise ChartPayloadError(f"Chart data has {len(data):,} rows, more than the limit of {max_rows:,}; "
+                                "aggregate it with quantile_bands or envelope first.")
+    return data
+
+def downsample_indices(values, max_points=DEFAULT_PIXEL_BUDGET):
+    """
+    Indices of the points kept when downsampling series to `max_points` points.
+
+    The series are split into max_points / 2 equal buckets and the minimum and the
+    maximum of every bucket are kept, in order, so peaks and troughs survive.
+
+    Parameters:
+    values (np.ndarray): (T,) series or (S, T) series sharing the same x values.
+    max_points (int): Maximum number of points kept per series (at least 2).
+
+    Returns:
+    np.ndarray: Sorted indices into the last axis, (P,) or (S, P) with P <= max_points.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_points = values.shape[-1]
+    if n_points <= max_points:
+        return np.broadcast_to(np.arange(n_points), values.shape).copy()
+
+    bucket_size = -(-n_points // max(max_points // 2, 1))
+    n_buckets = -(-n_points // bucket_size)
+    # Pad the last bucket with its own last value.
+    padding = [(0, 0)] * (values.ndim - 1) + [(0, n_buckets * bucket_size - n_points)]
+    buckets = np.pad(values, padding, mode="edge").reshape(values.shape[:-1] + (n_buckets, bucket_size))
+    missing = np.isnan(buckets)
+
+    offsets = np.arange(n_buckets) * bucket_size
+    # NaNs never win a min or a max.
+    lowest = np.where(missing, np.inf, buckets).argmin(axis=-1) + offsets
+    highest = np.where(missing, -np.inf, buckets).argmax(axis=-1) + offsets
+    indices = np.stack([np.minimum(lowest, highest), np.maximum(lowest, highest)], axis=-1)
+    indices = np.minimum(indices.reshape(values.shape[:-1] + (2 * n_buckets,)), n_points - 1)
+    return indices
+
+def fold(x, series, x_name="x", series_name="serie", value_name="valor"):
+    """
+    Build the long-format frame of several series (what Vega-Lite's fold transform
+    would produce in the browser).
+
+    Parameters:
+    x (np.ndarray): (P,) x values shared by all series, or (S, P) per series.
+    series (dict): Series name mapped to its (P,) values, in plotting order.
+    x_name, series_name, value_name (str): Column names.
+
+    Returns:
+    pd.DataFrame: S * P rows with columns x_name, series_name and value_name.
+    """
+    names = list(series)
+    values = np.stack([np.asarray(series[name], dtype=np.float64) for name in names])
+    x = np.broadcast_to(np.asarray(x), values.shape)
+    return pd.DataFrame({
+        x_name: x.reshape(-1),
+        series_name: np.repeat(np.asarray(names, dtype=object), values.shape[1]),
+        value_name: values.reshape(-1),
+    })
+
+def line_data(x, series, max_rows=MAX_CHART_ROWS, pixel_budget=DEFAULT_PIXEL_BUDGET,
+              x_name="x", series_name="serie", value_name="valor"):
+    """
+    Long-format data for a multi-line chart, every series downsampled to
+    `pixel_budget` points or fewer so the whole chart stays under `max_rows`.
+
+    Parameters:
+    x (np.ndarray): (T,) x values shared by all series.
+    series (dict): Series name mapped to its (T,) values.
+    max_rows (int): Row cap of the chart.
+    pixel_budget (int): Maximum number of points per series.
+    x_name, series_name, value_name (str): Column names.
+
+    Returns:
+    pd.DataFrame: Folded data (see fold).
+    """
+    if not series:
+        return pd.DataFrame({x_name: [], series_name: [], value_name: []})
+    if len(series) * 2 > max_rows:
+        raise ChartPayloadError(f"{len(series):,} series cannot be drawn as lines within {max_rows:,} rows; "
+                                "aggregate them with quantile_bands or envelope first.")
+    names = list(series)
+    values = np.stack([np.asarray(series[name], dtype=np.float64) for name in names])
+    indices = downsample_indices(values, min(pixel_budget, max_rows // len(names)))
+    x = np.asarray(x)[indices]
+    values = np.take_along_axis(values, indices, axis=-1)
+    return check_payload(fold(x, dict(zip(names, values)), x_name, series_name, value_name), max_rows)
+
+def quantile_bands(x, paths, percentiles=(5, 25, 50, 75, 95), max_rows=MAX_CHART_ROWS,
+                   pixel_budget=DEFAULT_PIXEL_BUDGET, x_name="x"):
+    """
+    Percentile bands of many paths, one row per x value and one column per percentile
+    ("P5", "P50", ...), ready for area (y/y2) and line marks.
+
+    Parameters:
+    x (np.ndarray): (T,) x values.
+    paths (np.ndarray): (N, T) paths, e.g. Monte Carlo paths or sweep slices.
+    percentiles (tuple): Percentiles to compute, in increasing order.
+    max_rows (int): Row cap of the chart.
+    pixel_budget (int): Maximum number of x values kept.
+    x_name (str): Name of the x column.
+
+    Returns:
+    pd.DataFrame: min(T, pixel_budget) rows.
+    """
+    paths = np.asarray(paths, dtype=np.float64)
+    bands = np.percentile(paths, percentiles, axis=0)
+    # Downsample on the middle band so its extremes are kept; the others follow it.
+    indices = downsample_indices(bands[len(percentiles) // 2], min(pixel_budget, max_rows))
+    data = {x_name: np.asarray(x)[indices]}
+    data.update({f"P{p:g}": band[indices] for p, band in zip(percentiles, bands)})
+    return check_payload(pd.DataFrame(data), max_rows)
+
+def envelope(x, paths, max_rows=MAX_CHART_ROWS, pixel_budget=DEFAULT_PIXEL_BUDGET, x_name="x"):
+    """
+    Min / median / max envelope of many paths (columns "P0", "P50", "P100").
+
+    See quantile_bands for the parameters.
+    """
+    return quantile_bands(x, paths, (0, 50, 100), max_rows, pixel_budget, x_name)
@@ -0,0 +1,335 @@
+"""
+Calibrate contact and conversion assumptions from raw contact-centre logs.
+
+Interaction records (timestamp, channel, outcome and optional segment columns)
+are streamed from CSV or Parquet in record batches with pyarrow (Parquet files
+are memory-mapped), so memory use is bounded by the chunk size and the number
+of segment x day cells, not by the number of records. Every chunk is reduced to
+daily counts per segment and channel; the result gives daily volumes, channel
+mix, channel-share trends and conversion rates per segment, as an assumptions
+dict or as a segment table for `segments.evaluate_segments`.
+
+Usage:
+    python contact_logs.py interactions.parquet --segment region product --output segments.csv
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import adoption_fit
+import financial_core as core
+
+# Model channels, in the order of the count columns.
+CHANNELS = ["phone", "web", "chatbot"]
+
+# Raw channel labels mapped to the model channels; labels not listed are ignored.
+DEFAULT_CHANNEL_MAP = {
+    "phone": "phone", "telefono": "phone", "teléfono": "phone", "call": "phone", "voice": "phone",
+    "web": "web", "email": "web", "form": "web", "formulario": "web",
+    "chatbot": "chatbot", "chat": "chatbot", "bot": "chatbot",
+}
+
+# Outcome labels counted as a conversion (numeric or boolean outcomes count when true / non-zero).
+DEFAULT_CONVERSION_OUTCOMES = {"conversion", "converted", "sale", "venta", "poliza", "póliza"}
+
+# Partial daily aggregates are combined once this many are pending.
+_MERGE_EVERY = 64
+
+# ---------------- Reading ----------------
+
+def iter_log_batches(path, columns, chunk_size=1_000_000):
+    """
+    Iterate over a log file in record batches of the needed columns only.
+
+    Parameters:
+    path (str): CSV or Parquet file.
+    columns (list[str]): Columns to read.
+    chunk_size (int): Records per batch (Parquet) or approximate target (CSV, via the block size).
+
+    Yields:
+    pd.DataFrame: Chunk of records.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    elif extension in (".csv", ".txt"):
+        import pyarrow.csv as pa_csv
+
+        # ~64 bytes per record is a typical CSV row of these four columns.
+        reader = pa_csv.open_csv(
+            path,
+            read_options=pa_csv.ReadOptions(block_size=max(1 << 20, chunk_size * 64)),
+            convert_options=pa_csv.ConvertOptions(include_columns=columns),
+        )
+        for batch in reader:
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported file type '{extension}' for {path}.")
+
+# ---------------- Aggregation ----------------
+
+class LogAggregate:
+    """
+    Daily contact counts per segment and channel, plus daily conversions.
+
+    Parameters:
+    daily (pd.DataFrame): One row per segment and day with the segment columns,
+        "date" and the counts "phone", "web", "chatbot" and "conversions".
+    segment_columns (list[str]): Segment attribute columns, empty for a single block.
+    """
+
+    def __init__(self, daily, segment_columns):
+        self.daily = daily
+        self.segment_columns = list(segment_columns)
+
+    def summary(self, baseline_days=365):
+        """
+        Per-segment calibration statistics.
+
+        Volumes, channel mix and conversion rate are measured over the last
+        `baseline_days` days of the logs (days without contacts count as zero).
+        Channel-share trends are least-squares slopes, per year, of the monthly
+        channel shares over the whole history.
+
+        Returns:
+        pd.DataFrame: One row per segment with "days", "avg_daily_contacts",
+            "<channel>_share", "<channel>_share_trend" and "conversion_rate".
+        """
+        daily = self.daily
+        keys = self.segment_columns or None
+        last_day = daily["date"].max()
+        first_day = max(daily["date"].min(), last_day - np.timedelta64(baseline_days - 1, "D"))
+        n_days = int((last_day - first_day) / np.timedelta64(1, "D")) + 1
+
+        recent = daily[daily["date"] >= first_day]
+        totals = recent.groupby(keys, sort=True)[CHANNELS + ["conversions"]].sum() if keys else \
+            recent[CHANNELS + ["conversions"]].sum().to_frame().T
+        contacts = totals[CHANNELS].sum(axis=1)
+        summary = pd.DataFrame(index=totals.index)
+        summary["days"] = n_days
+        summary["avg_daily_contacts"] = contacts / n_days
+        for channel in CHANNELS:
+            summary[f"{channel}_share"] = totals[channel] / contacts
+        summary["conversion_rate"] = totals["conversions"] / contacts
+
+        # Least-squares slope of the monthly channel shares against time in years,
+        # per segment, from the groupwise sums of the closed-form solution.
+        monthly, months = self._monthly()
+        shares = monthly[CHANNELS].div(monthly[CHANNELS].sum(axis=1), axis=0)
+        t = (months - months.min()) / 12.0
+        terms = pd.DataFrame({"n": 1.0, "t": t, "tt": t * t}, index=monthly.index)
+        for channel in CHANNELS:
+            terms[f"y_{channel}"] = shares[channel]
+            terms[f"ty_{channel}"] = t * shares[channel]
+        sums = terms.groupby([monthly[key] for key in keys], sort=True).sum() if keys else terms.sum().to_frame().T
+        denominator = sums["n"] * sums["tt"] - sums["t"] ** 2
+        # Segments with a single month of history have no trend.
+        denominator = denominator.where(denominator > 1e-12)
+        for channel in CHANNELS:
+            slope = (sums["n"] * sums[f"ty_{channel}"] - sums["t"] * sums[f"y_{channel}"]) / denominator
+            summary[f"{channel}_share_trend"] = slope.reindex(summary.index).fillna(0.0)
+        return summary
+
+    def _monthly(self):
+        # Monthly counts per segment (months without contacts dropped) and the month numbers.
+        daily = self.daily
+        monthly = daily.assign(month=daily["date"].to_numpy().astype("datetime64[M]"))
+        monthly = monthly.groupby(self.segment_columns + ["month"], sort=True)[CHANNELS].sum().reset_index()
+        monthly = monthly[monthly[CHANNELS].sum(axis=1) > 0]
+        return monthly, monthly["month"].to_numpy().astype("datetime64[M]").astype(np.int64)
+
+    def adoption_curves(self, **fit_options):
+        """
+        Logistic adoption curves fitted to the monthly chatbot share of every segment
+        (see `adoption_fit.fit_logistic`), weighted by the monthly contacts. Time is
+        counted in years from the last month of the logs, so the fitted midpoint is
+        relative to the start of the projection.
+
+        Parameters:
+        **fit_options: Passed through to `adoption_fit.fit_logistic`.
+
+        Returns:
+        pd.DataFrame: One row per segment with the logistic adoption assumptions
+            (NaN where fewer than 3 months were observed) and "converged".
+        """
+        keys = self.segment_columns
+        monthly, months = self._monthly()
+        contacts = monthly[CHANNELS].sum(axis=1).to_numpy(dtype=np.float64)
+        if keys:
+            groups = monthly.groupby(keys, sort=True)
+            series, index = groups.ngroup().to_numpy(), groups.size().index
+        else:
+            series, index = np.zeros(len(monthly), dtype=np.int64), pd.RangeIndex(1)
+
+        # One row per segment and one column per month; unobserved months are NaN.
+        n_months = months.max() - months.min() + 1
+        column = months - months.min()
+        shares = np.full((len(index), n_months), np.nan)
+        weights = np.zeros((len(index), n_months))
+        shares[series, column] = monthly["chatbot"].to_numpy() / contacts
+        weights[series, column] = contacts
+        t = (np.arange(n_months) - (n_months - 1)) / 12.0
+
+        fit = adoption_fit.fit_logistic(t, shares, weights / weights.max(), **fit_options)
+        curves = pd.DataFrame(adoption_fit.adoption_assumptions(fit), index=index)
+        curves["converged"] = fit["converged"]
+        return curves
+
+    def to_segment_table(self, baseline_days=365, adoption_model="linear", policies=None):
+        """
+        Segment table for `segments.evaluate_segments`: the segment columns plus
+        the calibrated assumptions of every segment.
+
+        The logs carry no policy counts, so the book of policies is apportioned by
+        the segments' share of contacts; the segments add up to `policies`.
+        With adoption_model="logistic" the table also has the parameters of the
+        logistic chatbot adoption curve fitted to every segment (see `adoption_curves`);
+        segments whose fit did not converge get the default adoption parameters.
+
+        Parameters:
+        baseline_days (int): Window of the volumes, mix and conversion, see `summary`.
+        adoption_model (str): One of core.ADOPTION_MODELS.
+        policies (float | None): Book of policies of the whole portfolio,
+            DEFAULT_ASSUMPTIONS["initial_insurance_company_health_policies"] if None.
+        """
+        summary = self.summary(baseline_days)
+        if policies is None:
+            policies = core.DEFAULT_ASSUMPTIONS["initial_insurance_company_health_policies"]
+        contacts = summary["avg_daily_contacts"]
+        table = pd.DataFrame({
+            "initial_insurance_company_health_policies": policies * contacts / contacts.sum(),
+            "avg_contacts_phone_web_daily": contacts,
+            "initial_phone_rate": summary["phone_share"],
+            "initial_web_rate": summary["web_share"],
+            "initial_chatbot_rate": summary["chatbot_share"],
+            # The model's rates move linearly: phone and web decrease, the chatbot increases.
+            "phone_decrease_rate": -summary["phone_share_trend"],
+            "web_decrease_rate": -summary["web_share_trend"],
+            "chatbot_increase_rate": summary["chatbot_share_trend"],
+            "perc_estimated_current_conversion": summary["conversion_rate"],
+        })
+        if adoption_model == "logistic":
+            curves = self.adoption_curves().reindex(summary.index)
+            converged = curves["converged"].fillna(False).astype(bool)
+            for key in adoption_fit.ASSUMPTION_KEYS.values():
+                table[key] = curves[key].where(converged, core.DEFAULT_ASSUMPTIONS[key])
+        return table.reset_index() if self.segment_columns else table.reset_index(drop=True)
+
+    def to_assumptions(self, assumptions=None, baseline_days=365, adoption_model="linear"):
+        """
+        Assumptions for the whole portfolio: `assumptions` (DEFAULT_ASSUMPTIONS if
+        None) with the contact and conversion values calibrated over all segments.
+        """
+        assumptions = core.DEFAULT_ASSUMPTIONS if assumptions is None else assumptions
+        portfolio = LogAggregate(self.daily.groupby("date", as_index=False)[CHANNELS + ["conversions"]].sum(), [])
+        calibrated = portfolio.to_segment_table(baseline_days, adoption_model,
+                                                assumptions["initial_insurance_company_health_policies"])
+        return {**assumptions, **{key: float(value) for key, value in calibrated.iloc[0].items()}}
+
+def _reduce_chunk(chunk, timestamp, channel, outcome, segment_columns, channel_map, conversion_outcomes):
+    """
+    Daily counts per segment and channel of one chunk of records.
+    """
+    channels = chunk[channel].astype(str).str.strip().str.lower().map(channel_map)
+    known = channels.notna().to_numpy()
+    chunk = chunk[known]
+    channel_codes = pd.Categorical(channels[known], categories=CHANNELS).codes
+
+    values = chunk[outcome]
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+        converted = values.fillna(0).to_numpy(dtype=np.float64) != 0
+    else:
+        converted = values.astype(str).str.strip().str.lower().isin(conversion_outcomes).to_numpy()
+
+    frame = chunk[segment_columns].copy()
+    # Timestamps with a timezone are counted in UTC days; naive ones are taken as they are.
+    stamps = pd.to_datetime(chunk[timestamp], utc=True).dt.tz_convert(None)
+    frame["date"] = stamps.to_numpy().astype("datetime64[D]")
+    counts = np.zeros((len(chunk), len(CHANNELS) + 1), dtype=np.int64)
+    counts[np.arange(len(chunk)), channel_codes] = 1
+    counts[:, -1] = converted
+    frame[CHANNELS + ["conversions"]] = counts
+    return frame.groupby(segment_columns + ["date"], sort=False, observed=True).sum()
+
+def _combine(partials, keys):
+    return pd.concat(partials).groupby(level=list(range(len(keys))), sort=False).sum()
+
+def ingest_logs(path, timestamp="timestamp", channel="channel", outcome="outcome", segment_columns=("segment",),
+                channel_map=None, conversion_outcomes=None, chunk_size=1_000_000, log=None):
+    """
+    Stream a contact-centre log and aggregate it into daily counts.
+
+    Parameters:
+    path (str): CSV or Parquet file with one interaction per row.
+    timestamp, channel, outcome (str): Column names of the record fields.
+    segment_columns (tuple): Segment attribute columns; empty for one block.
+    channel_map (dict | None): Lower-case channel labels mapped to "phone", "web" or
+        "chatbot", DEFAULT_CHANNEL_MAP if None. Unmapped channels are skipped.
+    conversion_outcomes (set | None): Lower-case outcome labels counted as conversions,
+        DEFAULT_CONVERSION_OUTCOMES if None.
+    chunk_size (int): Records per chunk.
+    log (file | None): Where to print progress, e.g. sys.stderr.
+
+    Returns:
+    LogAggregate: Daily counts per segment.
+    """
+    segment_columns = list(segment_columns)
+    channel_map = DEFAULT_CHANNEL_MAP if channel_map is None else channel_map
+    conversion_outcomes = DEFAULT_CONVERSION_OUTCOMES if conversion_outcomes is None else set(conversion_outcomes)
+    keys = segment_columns + ["date"]
+
+    partials = []
+    n_records = 0
+    for chunk in iter_log_batches(path, [timestamp, channel, outcome] + segment_columns, chunk_size):
+        partials.append(_reduce_chunk(chunk, timestamp, channel, outcome, segment_columns, channel_map,
+                                      conversion_outcomes))
+        if len(partials) >= _MERGE_EVERY:
+            partials = [_combine(partials, keys)]
+        n_records += len(chunk)
+        if log is not None:
+            print(f"{n_records:,} records", file=log)
+
+    if not partials:
+        raise ValueError(f"No records in {path}.")
+    daily = _combine(partials, keys).sort_index().reset_index()
+    return LogAggregate(daily, segment_columns)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate contact and conversion assumptions from contact logs.")
+    parser.add_argument("input", help="CSV or Parquet file with one interaction per row.")
+    parser.add_argument("--segment", nargs="*", default=[], help="Segment columns (default: none, one block).")
+    parser.add_argument("--timestamp", default="timestamp")
+    parser.add_argument("--channel", default="channel")
+    parser.add_argument("--outcome", default="outcome")
+    parser.add_argument("--baseline-days", type=int, default=365, help="Window for volumes, mix and conversion.")
+    parser.add_argument("--adoption-model", choices=core.ADOPTION_MODELS, default="linear",
+                        help="Also fit logistic chatbot adoption curves with 'logistic'.")
+    parser.add_argument("--policies", type=float, default=None,
+                        help="Book of policies of the portfolio, shared out by contacts (default: model default).")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--output", help="Write the segment table to this CSV or Parquet file; "
+                                         "without it the portfolio assumptions are printed as JSON.")
+    args = parser.parse_args(argv)
+
+    aggregate = ingest_logs(args.input, args.timestamp, args.channel, args.outcome, args.segment,
+                            chunk_size=args.chunk_size, log=sys.stderr)
+    if args.output:
+        table = aggregate.to_segment_table(args.baseline_days, args.adoption_model, args.policies)
+        if os.path.splitext(args.output)[1].lower() in (".parquet", ".pq"):
+            table.to_parquet(args.output, index=False)
+        else:
+            table.to_csv(args.output, index=False)
+        print(f"{len(table):,} segments written to {args.output}")
+    else:
+        print(json.dumps(aggregate.to_assumptions(baseline_days=args.baseline_days,
+                                                  adoption_model=args.adoption_model), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,12 @@ import assumptions_config as ac
 import visuals as visuals
 import helper_functions as hf
 import pandas as pd
+import sensitivities
+import profiling
+import background_jobs
+import chart_data
+import monte_carlo
+import scenario_cache
 
 def create_scenario_config(scenario_name: str):
     """
@@ -19,121 +25,405 @@ def create_scenario_config(scenario_name: str):
         assumptions = ac.input_assumptions(scenario_name)
         return assumptions
     
-def scenario_metrics_comparison(df1, df2):
+def saved_scenarios_panel(store, assumptions_by_scenario):
+    """
+    Creates the saved scenarios section of the sidebar: save one of the current
+    scenarios to the persistent store, add saved scenarios to the comparison and
+    show the assumptions that differ when exactly two are selected.
+
+    Parameters:
+    store (scenario_store.ScenarioStore): Persistent scenario store.
+    assumptions_by_scenario (dict): Scenario name mapped to its assumptions.
+
+    Returns:
+    dict: Selected saved scenarios (name mapped to assumptions) to add to the comparison.
+    """
+    with st.sidebar.expander("Escenarios guardados", expanded=False):
+        to_save = st.selectbox("Escenario a guardar", list(assumptions_by_scenario), key="store_save_scenario")
+        save_name = st.text_input("Guardar como", value=to_save or "", key="store_save_name")
+        if st.button("Guardar", key="store_save") and to_save and save_name:
+            store.save_scenario(save_name, assumptions_by_scenario[to_save])
+
+        saved = store.list_scenarios()
+        selected = st.multiselect("Añadir a la comparación", list(saved["name"]), key="store_load")
+        if len(selected) == 2:
+            st.dataframe(store.diff_scenarios(*selected))
+    return {f"{name} (guardado)": store.load_scenario(name) for name in selected}
+
+def scenario_grid(names, per_row=2):
+    """
+    Lays out one Streamlit column per scenario, `per_row` scenarios per row.
+
+    Parameters:
+    names (list): Scenario names.
+    per_row (int): Number of columns per row.
+
+    Yields:
+    tuple: (scenario name, Streamlit column).
+    """
+    names = list(names)
+    for start in range(0, len(names), per_row):
+        row = names[start:start + per_row]
+        for name, column in zip(row, st.columns(per_row)):
+            yield name, column
+
+def scenario_metrics_comparison(scenarios):
     """
     Creates the Scenario Metrics Comparison section.
 
     Parameters:
-    df1 (pd.DataFrame): DataFrame for Scenario 1.
-    df2 (pd.DataFrame): DataFrame for Scenario 2.
+    scenarios (dict): Scenario name mapped to its DataFrame.
     """
-    metrics = st.multiselect("Selecciona métricas", df1.columns[1:])
+    first_df = next(iter(scenarios.values()))
+    metrics = st.multiselect("Selecciona métricas", first_df.columns[1:])
 
     if metrics:
-        col1, col2 = st.columns([10, 10])  # Adjust the width ratio as needed
-
-        # Calculate the maximum y-axis limit across both scenarios
-        max_y1 = df1[metrics].max().max()
-        max_y2 = df2[metrics].max().max()
-        y_max = max(max_y1, max_y2) * 1.1
-
-        with col1:
-            st.subheader("Escenario 1")
-            chart1 = alt.Chart(df1).transform_fold(
-                metrics,
-                as_=['Metric', 'Value']
-            ).mark_line().encode(
-                x='Year:Q',
-                y=alt.Y('Value:Q', scale=alt.Scale(domain=[0, y_max])),
-                color='Metric:N',
-                tooltip=['Year:Q', 'Value:Q']
-            ).properties(
-                height=400,
-                width='container'
-            ).configure_legend(
-                orient='bottom'
-            )
-            st.altair_chart(chart1, use_container_width=True)
-
-        with col2:
-            st.subheader("Escenario 2")
-            chart2 = alt.Chart(df2).transform_fold(
-                metrics,
-                as_=['Metric', 'Value']
-            ).mark_line().encode(
-                x='Year:Q',
-                y=alt.Y('Value:Q', scale=alt.Scale(domain=[0, y_max])),
-                color='Metric:N',
-                tooltip=['Year:Q', 'Value:Q']
-            ).properties(
-                height=400,
-                width='container'
-            ).configure_legend(
-                orient='bottom'
-            )
-            st.altair_chart(chart2, use_container_width=True)
-
-def scenario_comparison(df1, df2):
+        # Calculate the maximum y-axis limit across all scenarios
+        y_max = max(df[metrics].to_numpy().max() for df in scenarios.values()) * 1.1
+
+        for name, column in scenario_grid(scenarios):
+            with column:
+                st.subheader(name)
+                df = scenarios[name]
+                # Folded and downsampled here, not with transform_fold in the browser.
+                data = chart_data.line_data(df["Year"].to_numpy(), {metric: df[metric] for metric in metrics},
+                                            x_name="Year", series_name="Metric", value_name="Value")
+                chart = alt.Chart(data).mark_line().encode(
+                    x='Year:Q',
+                    y=alt.Y('Value:Q', scale=alt.Scale(domain=[0, y_max])),
+                    color=alt.Color('Metric:N', sort=list(metrics)),
+                    tooltip=['Year:Q', 'Value:Q']
+                ).properties(
+                    height=400,
+                    width='container'
+                ).configure_legend(
+                    orient='bottom'
+                )
+                st.altair_chart(chart, use_container_width=True)
+
+def scenario_comparison(scenarios):
     """
     Creates the Scenario Comparison section.
 
     Parameters:
-    df1 (pd.DataFrame): DataFrame for Scenario 1.
-    df2 (pd.DataFrame): DataFrame for Scenario 2.
+    scenarios (dict): Scenario name mapped to its DataFrame.
     """
-    comparison_metric = st.selectbox("Selecciona una métrica para comparar", df1.columns[1:])
+    first_df = next(iter(scenarios.values()))
+    comparison_metric = st.selectbox("Selecciona una métrica para comparar", first_df.columns[1:])
     if comparison_metric:
-        comparison_df = pd.DataFrame({
-            "Year": df1["Year"],
-            f"Escenario 1 - {comparison_metric}": df1[comparison_metric],
-            f"Escenario 2 - {comparison_metric}": df2[comparison_metric]
-        }).set_index("Year")
+        comparison_df = chart_data.line_data(
+            first_df["Year"].to_numpy(),
+            {name: df[comparison_metric] for name, df in scenarios.items()},
+            x_name="Year", series_name="Escenario", value_name="Value"
+        )
 
         # Calculate the maximum y-axis limit for the comparison chart
-        max_y_comparison = comparison_df.max().max() * 1.1
+        max_y_comparison = comparison_df["Value"].max() * 1.1
 
         # Create the comparison chart using Altair
-        comparison_chart = alt.Chart(comparison_df.reset_index()).transform_fold(
-            [f"Escenario 1 - {comparison_metric}", f"Escenario 2 - {comparison_metric}"],
-            as_=['Escenario', 'Value']
-        ).mark_line().encode(
+        comparison_chart = alt.Chart(comparison_df).mark_line().encode(
             x=alt.X('Year:Q', axis=alt.Axis(format='d', title='Año')),
             y=alt.Y('Value:Q', axis=alt.Axis(title=comparison_metric), scale=alt.Scale(domain=[0, max_y_comparison])),
-            color='Escenario:N',
-            tooltip=['Year:Q', 'Value:Q']
+            color=alt.Color('Escenario:N', sort=list(scenarios)),
+            tooltip=['Escenario:N', 'Year:Q', 'Value:Q']
         ).properties(
             height=400,
             width='container'
         )
         st.altair_chart(comparison_chart, use_container_width=True)
 
-def cumulative_profit_contribution(df1, df2):
+def investment_metrics_comparison(scenarios):
+    """
+    Creates the Investment Metrics section: final NPV, IRR, discounted payback
+    and discounted ROI of every scenario, discounted at `discount_rate`.
+
+    Parameters:
+    scenarios (dict): Scenario name mapped to its DataFrame.
+    """
+    rows = []
+    for name, df in scenarios.items():
+        summary = hf.investment_summary(df)
+        if not summary:
+            continue
+        rows.append({
+            "Escenario": name,
+            "VAN (€M)": summary["npv"] / 1_000_000,
+            "TIR (%)": summary["irr"] * 100,
+            "Payback descontado (años)": summary["discounted_payback"],
+            "ROI Descontado (%)": summary["discounted_roi"],
+        })
+    if not rows:
+        st.write("Sin datos")
+        return
+    # NaN IRR / payback mean no sign change or no payback within the horizon.
+    st.dataframe(pd.DataFrame(rows).set_index("Escenario").style.format("{:,.2f}", na_rep="n/a"), width=1200)
+
+def cumulative_profit_contribution(scenarios, vector_threshold=6):
     """
     Creates the Cumulative Profit Contribution section.
 
     Parameters:
-    df1 (pd.DataFrame): DataFrame for Scenario 1.
-    df2 (pd.DataFrame): DataFrame for Scenario 2.
+    scenarios (dict): Scenario name mapped to its DataFrame.
+    vector_threshold (int): From this many scenarios on, the vector (Altair) charts are the default.
     """
-    y_max = hf.calculate_max_y_limit(df1, df2)
+    renderers = {"Imagen": visuals.plot_waterfall, "Vectorial": visuals.plot_waterfall_vega}
+    renderer = st.radio("Formato de los gráficos", list(renderers), horizontal=True, key="waterfall_renderer",
+                        index=int(len(scenarios) >= vector_threshold))
+    y_max = hf.calculate_max_y_limit(*scenarios.values())
     with st.container():
-        col1, col2 = st.columns([5, 5])
+        for name, column in scenario_grid(scenarios):
+            with column:
+                st.subheader(name)
+                renderers[renderer](scenarios[name], name, y_max)
+
+def segment_drilldown(segment_results, top_n=30):
+    """
+    Creates the Segments section: roll-up of the portfolio by the chosen segment
+    attributes, optionally filtered, for one metric and year. Roll-ups reuse the
+    evaluated segments, so changing the grouping or the filters does not re-run
+    the projection.
+
+    Parameters:
+    segment_results (dict): Scenario name mapped to its segments.SegmentResult.
+    top_n (int): Number of groups shown in the chart.
+    """
+    scenario_name = st.selectbox("Escenario", list(segment_results), key="segments_scenario")
+    result = segment_results[scenario_name]
+    attributes = list(result.attributes.columns)
+    if not attributes:
+        st.write("La tabla de segmentos no tiene atributos para agrupar.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        by = st.multiselect("Agrupar por", attributes, default=attributes[:1], key="segments_by")
+    with col2:
+        metric = st.selectbox(
+            "Métrica",
+            [column for column in hf.DISPLAY_COLUMNS if column != "year"],
+            format_func=lambda column: hf.DISPLAY_COLUMNS[column][0],
+            key="segments_metric"
+        )
+    with col3:
+        year = st.slider("Año", 0, result.data.shape[2] - 1, result.data.shape[2] - 1, key="segments_year")
 
-        with col1:
-            st.subheader("Escenario 1")
-            visuals.plot_waterfall(df1, "Escenario 1", y_max)
+    filters = {}
+    with st.expander("Filtros"):
+        for attribute in attributes:
+            values = st.multiselect(attribute, sorted(result.attributes[attribute].unique()), key=f"segments_filter_{attribute}")
+            if values:
+                filters[attribute] = values
 
-        with col2:
-            st.subheader("Escenario 2")
-            visuals.plot_waterfall(df2, "Escenario 2", y_max)
+    label, scale = hf.DISPLAY_COLUMNS[metric]
+    table = result.frame(by, filters, [metric], year).drop(columns="year")
+    table[metric] *= scale
+    table = table.rename(columns={metric: label}).sort_values(label, ascending=False, ignore_index=True)
+    st.caption(f"{int(result.mask(filters).sum()):,} de {result.n_segments:,} segmentos seleccionados.")
+
+    if by:
+        top = table.head(top_n).copy()
+        top["Grupo"] = top[by].astype(str).agg(" / ".join, axis=1)
+        chart = alt.Chart(chart_data.check_payload(top[["Grupo", label]])).mark_bar(color="#FF3333").encode(
+            x=alt.X(f"{label}:Q", title=label),
+            y=alt.Y("Grupo:N", sort="-x", title=None),
+            tooltip=["Grupo:N", alt.Tooltip(f"{label}:Q", format=",.2f")]
+        ).properties(
+            height=max(200, 20 * len(top)),
+            width='container'
+        )
+        st.altair_chart(chart, use_container_width=True)
+    st.dataframe(table, width=1200)
 
-def assumptions_comparison_table(assumptions1, assumptions2):
+def sensitivity_tornado(years, assumptions_by_scenario, relative_change=0.1, top_n=10, time_step="year",
+                        retention_model="flat", adoption_model="linear"):
+    """
+    Creates the Sensitivity Analysis section: a tornado chart of the linearised
+    impact of a ±`relative_change` change in every assumption, plus the full table.
+
+    Parameters:
+    years (int): Number of years in the projection.
+    assumptions_by_scenario (dict): Scenario name mapped to its assumptions.
+    relative_change (float): Relative change applied to each assumption.
+    top_n (int): Number of assumptions shown in the chart.
+    time_step (str): Projection step; the impact is read on the last year.
+    retention_model (str): Retention model of the projection.
+    adoption_model (str): Chatbot adoption model of the projection.
+    """
+    col1, col2 = st.columns([5, 5])
+    with col1:
+        scenario_name = st.selectbox("Escenario", list(assumptions_by_scenario), key="sensitivity_scenario")
+    with col2:
+        output_column = st.selectbox(
+            "Métrica",
+            ["cumulative_profit", "roi"],
+            format_func=lambda column: hf.DISPLAY_COLUMNS[column][0],
+            key="sensitivity_metric"
+        )
+
+    assumptions = assumptions_by_scenario[scenario_name]
+    table = sensitivities.sensitivity_table(years, assumptions, columns=(output_column,),
+                                            relative_change=relative_change, time_step=time_step,
+                                            retention_model=retention_model, adoption_model=adoption_model)
+    label, scale = hf.DISPLAY_COLUMNS[output_column]
+    impact = table[f"impact_{output_column}"] * scale
+    impact = impact[impact != 0].reindex(impact.abs().sort_values(ascending=False).index).dropna().head(top_n)
+
+    pct = f"{relative_change:.0%}"
+    tornado_df = pd.DataFrame({
+        "Supuesto": [key.replace("_", " ").capitalize() for key in impact.index] * 2,
+        "Cambio": [f"-{pct}"] * len(impact) + [f"+{pct}"] * len(impact),
+        "Impacto": list(-impact.values) + list(impact.values),
+    })
+    tornado_chart = alt.Chart(tornado_df).mark_bar().encode(
+        x=alt.X("Impacto:Q", title=f"Impacto en {label}"),
+        y=alt.Y("Supuesto:N", sort=list(tornado_df["Supuesto"][:len(impact)]), title=None),
+        color=alt.Color("Cambio:N", scale=alt.Scale(range=["#FF9999", "#FF0000"])),
+        tooltip=["Supuesto:N", "Cambio:N", alt.Tooltip("Impacto:Q", format=".3f")]
+    ).properties(
+        height=400,
+        width='container'
+    )
+    st.altair_chart(tornado_chart, use_container_width=True)
+
+    with st.expander("Tabla de sensibilidades"):
+        st.dataframe(table, width=1200)
+
+def monte_carlo_simulation(years, assumptions_by_scenario, poll_interval=0.5, streaming_threshold=100_000,
+                           time_step="year", retention_model="flat", adoption_model="linear"):
+    """
+    Creates the Monte Carlo section. The simulation runs as a background job: the
+    percentile bands are drawn from the paths simulated so far and refined while
+    it progresses, and changing any input cancels the running job. While a job
+    runs only this section reruns, every `poll_interval` seconds.
+
+    Parameters:
+    years (int): Number of years in the projection.
+    assumptions_by_scenario (dict): Scenario name mapped to its assumptions.
+    poll_interval (float): Seconds between progress updates.
+    streaming_threshold (int): Above this many paths the simulation is streamed into
+        quantile sketches instead of keeping every path (see monte_carlo.stream_simulate_financials);
+        it is below the largest path counts of the selector, whose path x year matrices run into gigabytes.
+    time_step (str): Projection step; the bands are yearly.
+    retention_model (str): Retention model of the projection.
+    adoption_model (str): Chatbot adoption model of the projection.
+    """
+    job = st.session_state.get("mc_job")
+    polling = job is not None and not job.done
+    st.fragment(_monte_carlo_fragment, run_every=poll_interval if polling else None)(
+        years, assumptions_by_scenario, polling, streaming_threshold, time_step, retention_model, adoption_model)
+
+def _monte_carlo_fragment(years, assumptions_by_scenario, polling, streaming_threshold, time_step, retention_model,
+                          adoption_model):
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        scenario_name = st.selectbox("Escenario", list(assumptions_by_scenario), key="mc_scenario")
+    with col2:
+        output_column = st.selectbox(
+            "Métrica",
+            ["cumulative_profit", "roi", "npv"],
+            format_func=lambda column: hf.DISPLAY_COLUMNS[column][0],
+            key="mc_metric"
+        )
+    with col3:
+        n_paths = st.select_slider("Trayectorias", [10_000, 50_000, 100_000, 500_000, 1_000_000, 10_000_000],
+                                   value=100_000, key="mc_paths")
+    with col4:
+        variation = st.slider("Incertidumbre (desviación, %)", 0, 50, 20, key="mc_variation") / 100
+
+    # Normal uncertainty around the scenario's value for every default uncertain assumption
+    assumptions = assumptions_by_scenario[scenario_name]
+    distributions = {
+        key: ("normal", float(assumptions[key]), abs(float(assumptions[key])) * variation)
+        for key in monte_carlo.UNCERTAIN_KEYS
+    }
+    model = {"time_step": time_step, "retention_model": retention_model, "adoption_model": adoption_model}
+    key = scenario_cache.simulation_key(years, assumptions, distributions, n_paths, **model)
+    cache = scenario_cache.get_cache()
+    summary = cache.get(key)
+    job = st.session_state.get("mc_job")
+
+    if summary is not None:
+        if job is not None and job.key != key:
+            job.cancel()
+    else:
+        if n_paths > streaming_threshold:
+            # Too many paths to keep in memory: stream them into quantile sketches.
+            chunks = lambda: monte_carlo.iter_stream_financials(years, assumptions, distributions, n_paths, **model)
+        else:
+            chunks = lambda: monte_carlo.iter_simulate_financials(years, assumptions, distributions, n_paths,
+                                                                  chunk_size=max(n_paths // 10, 10_000), **model)
+        job = background_jobs.get_manager().replace(job, key, chunks, total=n_paths)
+        st.session_state["mc_job"] = job
+        if job.status == "failed":
+            st.error(f"La simulación ha fallado: {job.error}")
+            return
+        if job.status == "done":
+            cache.put(key, job.result)
+        st.progress(job.progress, text=f"{job.completed:,} de {n_paths:,} trayectorias")
+        summary = job.partial
+
+    if summary is not None:
+        label, scale = hf.DISPLAY_COLUMNS[output_column]
+        bands = summary["bands"][output_column] * scale
+        bands = chart_data.check_payload(bands.reset_index().rename(columns={"Year": "Año"}))
+        base = alt.Chart(bands).encode(x=alt.X("Año:Q", axis=alt.Axis(format="d")))
+        chart = alt.layer(
+            base.mark_area(opacity=0.2, color="#FF0000").encode(y=alt.Y("P5:Q", title=label), y2="P95:Q"),
+            base.mark_area(opacity=0.35, color="#FF0000").encode(y="P25:Q", y2="P75:Q"),
+            base.mark_line(color="#FF0000").encode(y="P50:Q", tooltip=["Año:Q", "P5:Q", "P50:Q", "P95:Q"]),
+        ).properties(
+            height=400,
+            width='container'
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.caption("Bandas P5–P95 y P25–P75, línea P50.")
+        if "tail_risk" in summary:
+            tail = summary["tail_risk"][output_column] * scale
+            st.caption(f"VaR y Expected Shortfall al {summary['tail_level']:.0%} (cuantil y media de las "
+                       f"trayectorias por debajo) sobre {summary['n_paths']:,} trayectorias.")
+            st.dataframe(tail.rename_axis("Año").T.style.format("{:,.2f}"), width=1200)
+
+    # Start polling when a job is running, stop once it is done (both need a full rerun).
+    running = job is not None and not job.done and job.key == key
+    if running != polling:
+        st.rerun()
+
+def assumptions_comparison_table(assumptions_by_scenario):
     """
     Creates the Assumptions Comparison Table section.
 
     Parameters:
-    assumptions1 (dict): Assumptions for Scenario 1.
-    assumptions2 (dict): Assumptions for Scenario 2.
+    assumptions_by_scenario (dict): Scenario name mapped to its assumptions.
     """
     with st.container():
-        visuals.compare_assumptions(assumptions1, assumptions2)
\ No newline at end of file
+        visuals.compare_assumptions(assumptions_by_scenario)
+
+def profiling_panel(run):
+    """
+    Creates the debug panel: time per stage of the current rerun next to the rolling
+    p50/p95 over the recent reruns of every session.
+
+    Parameters:
+    run (dict | None): Output of `profiling.end_run` for this rerun.
+    """
+    summary = profiling.history.summary()
+    if not summary:
+        st.write("Sin datos de tiempos")
+        return
+    current = {} if run is None else {**run["stages"], "total": run["total_ms"]}
+    table = pd.DataFrame.from_dict(summary, orient="index")
+    table.insert(0, "actual_ms", pd.Series(current, dtype=float))
+    table.index.name = "Etapa"
+    st.dataframe(table.style.format({"actual_ms": "{:.1f}", "p50_ms": "{:.1f}", "p95_ms": "{:.1f}"}, na_rep="-"),
+                 width=800)
+    if run is not None:
+        stages = pd.DataFrame({"Etapa": list(run["stages"]), "ms": list(run["stages"].values())})
+        chart = alt.Chart(stages).mark_bar().encode(
+            x=alt.X("ms:Q", title="Tiempo (ms)"),
+            y=alt.Y("Etapa:N", sort="-x", title=None),
+            tooltip=["Etapa:N", alt.Tooltip("ms:Q", format=".1f")]
+        ).properties(
+            height=300,
+            width='container'
+        )
+        st.altair_chart(chart, use_container_width=True)
@@ -0,0 +1,912 @@
+"""
+UI-free computational core of the financial model.
+
+Holds the projection functions, the batch engine and the default assumptions.
+Only depends on numpy (plus the standard library) so it can be imported cheaply
+by worker processes, the batch CLI and the Streamlit app alike.
+"""
+import inspect
+
+import numpy as np
+
+# Version of the projection model. Bump it whenever a change alters the numbers the
+# engine produces or the options results are keyed on, so persisted results computed
+# by an older model are discarded.
+MODEL_VERSION = "14"
+
+# ---------------- Default Assumptions ----------------
+
+DEFAULT_ASSUMPTIONS = {
+    # Fixed Assumptions: Derived from company data and historical benchmarks
+    "initial_insurance_company_health_policies": 2_000_000,  # Starting insurance policies at the end of 2024 (from insurance_company investors report). TBC Maria
+    "avg_contacts_phone_web_daily": 3_500,  # Average daily customer interactions (phone + web). AKA cotizaciones
+    "nps_increase": 0.01,  # 1% improvement in retention from NPS enhancement.
+    "nps_diminishing_rate": -0.005,  # 1% annual decline in the effect of NPS improvement.
+    "economies_scale_cost_factor": 0.03,  # 3% annual efficiency gain due to economies of scale.
+    "first_year_costs": 110_000 + 100_000 + 40_000 + 10_000,  # Total initial implementation costs:
+    # - Team Costs: €110k
+    # - Design & implementation: €100k
+    # - Database configuration & integration: €40k
+    # - Testing: €10k
+    "recurring_monthly_costs": 50_000,  # Monthly infrastructure costs after implementation. LLAMADAS API CHATBOT
+    "conversion_increase": 0.005,  # Annual improvement in conversion rate (0.05%).
+    "max_conversion_rate": 0.03,  # Maximum achievable conversion rate (3%).
+    "discount_rate": 0.05,  # Discount rate for financial projections (5%).
+
+    "avg_market_policy_price": 40,  # Base value of current health insurance policy (€40).
+    "price_elasticity": 0.7,  # Price elasticity of demand for insurance policies (0.5).
+
+    "initial_phone_rate": 0.6,
+    "initial_web_rate": 1 - 0.6 - 0.05,
+    "initial_chatbot_rate": 0.05, # Initial chatbot handling rate (%).
+
+    "phone_decrease_rate": 0.02,
+    "web_decrease_rate": -0.02,
+    "chatbot_increase_rate": 0.05,
+    "insurance_company_avg_policy_price": 50,  # Average annual revenue per policy (€).
+    "health_insurance_yearly_company_growth_rate": 0.095,  # Company growth rate (%).
+    "cohort_retention_rate": 1.0,  # Annual survival of each customer cohort in the cohort retention model.
+    # Logistic chatbot adoption model: share = max_chatbot_rate / (1 + exp(-growth_rate * (year - midpoint))).
+    # The defaults start at the 5% initial chatbot rate.
+    "chatbot_adoption_growth_rate": 0.6,  # Steepness of the adoption curve (per year).
+    "chatbot_adoption_midpoint": 4.0,  # Years until half of the maximum share is reached.
+    "max_chatbot_rate": 0.6,  # Share of contacts the chatbot can eventually handle.
+
+    # Dynamic Assumptions: defaults of the user-configurable values
+    "perc_estimated_current_conversion": 0.005,  # Initial conversion rate (%).
+    "avg_telephone_cost_per_interaction": 1.5,  # Cost per phone interaction (€).
+    "avg_chatbot_cost_per_interaction": 0.3,  # Percentage cost reduction of chatbot vs. telephone interactions.
+}
+
+# ---------------- Helper Functions ----------------
+
+def logistic_growth(time_period, initial_value, rate_of_growth, max_value=1.0, midpoint=5):
+    """
+    Calculate logistic growth for a given time period.
+    
+    Parameters:
+    time_period (int): The time period (e.g., year) for the growth calculation.
+    initial_value (float): The initial value at the start of the time period.
+    rate_of_growth (float): The rate at which the value grows over time.
+    max_value (float): The maximum value that can be reached (carrying capacity).
+    midpoint (int): The midpoint of the logistic function where the growth is most rapid.
+
+    Returns:
+    float: The value after applying logistic growth.
+    """
+    return max_value / (1 + np.exp(-rate_of_growth * (time_period - midpoint))) + initial_value
+
+def calculate_chatbot_adoption_rate(time_period, initial_adoption_rate, adoption_growth_rate):
+    """
+    Calculate the chatbot adoption rate using logistic growth.
+    
+    Parameters:
+    time_period (int): The time period (e.g., year) for the growth calculation.
+    initial_adoption_rate (float): The initial rate of chatbot adoption.
+    adoption_growth_rate (float): The annual growth rate of chatbot adoption.
+
+    Returns:
+    float: The chatbot adoption rate after applying logistic growth.
+    """
+    return logistic_growth(time_period, 
+                           initial_adoption_rate, # Initial adoption % of contacts handled by the chatbot
+                           adoption_growth_rate,
+                           max_value=1,
+                           midpoint=10) ## Should this be the max that the chatbot can handle?
+
+def calculate_growth_factor(time_period, initial_growth_value, growth_rate, max_growth_value=0.3):
+    """
+    Calculate the growth factor using logistic growth.
+    
+    Parameters:
+    time_period (int): The time period (e.g., year) for the growth calculation.
+    initial_growth_value (float): The initial growth value at the start of the time period.
+    growth_rate (float): The rate at which the growth value increases over time.
+    max_growth_value (float): The maximum growth value that can be reached.
+
+    Returns:
+    float: The growth factor after applying logistic growth.
+    """
+    return logistic_growth(time_period, 
+                           initial_growth_value,
+                           growth_rate,
+                           max_growth_value)
+
+def adjust_total_contacts(total_contacts, growth_adjustment, max_growth_value):
+    """
+    Adjust the total contacts based on the growth adjustment.
+    
+    Parameters:
+    total_contacts (int): The initial number of total contacts.
+    growth_adjustment (float): The growth adjustment factor to be applied.
+    max_growth_value (float): The maximum growth value that can be reached.
+
+    Returns:
+    int: The adjusted total contacts.
+    """
+    adjusted_contacts = total_contacts * (1 + growth_adjustment)
+    return np.minimum(adjusted_contacts, total_contacts * (1 + max_growth_value))
+
+def calculate_contacts(initial_contacts, 
+                       initial_phone_rate, 
+                       initial_web_rate,
+                       initial_chatbot_rate,
+                       phone_decrease_rate,
+                       web_decrease_rate, 
+                       chatbot_increase_rate, 
+                       time_period, 
+                       initial_growth_value=0.01, 
+                       growth_rate=0.01, 
+                       max_growth_value=0.2,
+                       adoption_model="linear",
+                       chatbot_adoption_growth_rate=0.6,
+                       chatbot_adoption_midpoint=4.0,
+                       max_chatbot_rate=0.6):
+    """
+    Calculate total contact volume handled by phone, web, and chatbot.
+    All arguments may be scalars or broadcastable NumPy arrays (e.g. one row per
+    scenario and one column per year).
+    
+    Parameters:
+    initial_contacts (int): Total annual phone/web contacts.
+    initial_phone_rate (float): Initial rate of phone contacts.
+    initial_web_rate (float): Initial rate of web contacts.
+    initial_chatbot_rate (float): Initial rate of chatbot contacts.
+    phone_decrease_rate (float): Annual decrease rate of phone contacts.
+    web_decrease_rate (float): Annual decrease rate of web contacts.
+    chatbot_increase_rate (float): Annual increase rate of chatbot contacts.
+    time_period (int): Current year in the projection.
+    initial_growth_value (float): Initial growth value for total contacts.
+    growth_rate (float): Rate of growth for the linear model.
+    max_growth_value (float): Maximum growth value for total contacts.
+    adoption_model (str): "linear" (initial rate plus a constant annual increase) or
+        "logistic" (chatbot share follows a logistic curve), see ADOPTION_MODELS.
+    chatbot_adoption_growth_rate (float): Steepness of the logistic adoption curve.
+    chatbot_adoption_midpoint (float): Year of the steepest logistic adoption.
+    max_chatbot_rate (float): Cap of the logistic adoption curve.
+
+    Returns:
+    tuple: Total contacts handled, phone contacts, web contacts, and chatbot contacts.
+    """
+    # Adjust total contacts based on growth factor
+    total_contacts = adjust_total_contacts(initial_contacts, initial_growth_value + growth_rate * time_period, max_growth_value)
+    
+    # Calculate linear growth for each type of contact
+    web_rate = np.maximum(initial_web_rate - web_decrease_rate * time_period, 0.0)
+    phone_rate = np.maximum(initial_phone_rate - phone_decrease_rate * time_period, 0.0)
+
+    if adoption_model == "logistic":
+        # The curve sets the chatbot share; phone and web split the remaining
+        # contacts in the proportion of their linear rates.
+        chatbot_rate = logistic_growth(time_period, 0.0, chatbot_adoption_growth_rate, max_chatbot_rate,
+                                       chatbot_adoption_midpoint)
+        phone_web_rate = phone_rate + web_rate
+        rate_scale = (1 - chatbot_rate) / np.where(phone_web_rate > 0, phone_web_rate, 1.0)
+        web_rate = web_rate * rate_scale
+        phone_rate = phone_rate * rate_scale
+    else:
+        chatbot_rate = np.minimum(initial_chatbot_rate + chatbot_increase_rate * time_period, 1.0)
+
+        # Ensure the sum of the rates does not exceed 100%
+        total_rate = chatbot_rate + web_rate + phone_rate
+        rate_scale = np.where(total_rate > 1.0, total_rate, 1.0)
+        chatbot_rate = chatbot_rate / rate_scale
+        web_rate = web_rate / rate_scale
+        phone_rate = phone_rate / rate_scale
+    
+    # Calculate the number of contacts for each type
+    chatbot_contacts = total_contacts * chatbot_rate
+    web_contacts = total_contacts * web_rate
+    phone_contacts = total_contacts * phone_rate
+    
+    return total_contacts, phone_contacts, web_contacts, chatbot_contacts
+
+def calculate_new_customers(total_contacts, conversion_rate, avg_market_policy_price, insurance_company_avg_policy_price, price_elasticity):
+    """
+    Calculate the number of new customers, adjusted for price sensitivity.
+    - total_contacts: Total number of contacts.
+    - conversion_rate: Conversion rate of contacts to customers.
+    - avg_market_policy_price: Current average market policy price. AVG. MARKET
+    - insurance_company_avg_policy_price: insurance_company policy price for comparison. insurance_company
+    - price_elasticity: Price elasticity factor.
+
+    Returns the adjusted number of new customers.
+    """
+    price_adjustment_factor = (avg_market_policy_price / insurance_company_avg_policy_price) ** price_elasticity
+    new_customers = total_contacts * conversion_rate * price_adjustment_factor
+    return new_customers
+
+def calculate_retention_profit(new_customers, initial_insurance_company_health_policies, nps_increase, nps_diminishing_rate, year, insurance_company_avg_policy_price):
+    """
+    Calculate profit from customer retention improvements due to NPS increase.
+    - new_customers: Number of new customers acquired in the year.
+    - initial_insurance_company_health_policies: Total existing policies at the start of the year.
+    - nps_increase: Percentage increase in retention due to NPS improvement.
+    - nps_diminishing_rate: Annual rate at which the NPS effect diminishes.
+    - year: Current year in the projection.
+    - insurance_company_avg_policy_price: Average annual revenue per policy.
+
+    Returns the revenue generated from retained customers.
+    """
+    retention_effect = nps_increase * (1 - (year * nps_diminishing_rate))
+    retention_effect = retention_effect # max(retention_effect, 0)  # Ensure retention effect doesn't drop below 0.
+    retained_customers = initial_insurance_company_health_policies * retention_effect + new_customers * retention_effect
+    return retained_customers * insurance_company_avg_policy_price
+
+def calculate_chatbot_savings(contact_volume, phone_cost, chatbot_cut_cost):
+    """
+    Calculate savings from replacing phone interactions with chatbot interactions.
+    - contact_volume: Total number of contacts handled.
+    - phone_cost: Cost per phone interaction.
+    - chatbot_cut_cost: Percentage cost reduction per chatbot interaction compared to phone.
+
+    Returns the total savings achieved.
+    """
+    savings_per_contact = phone_cost - (phone_cost * (1 - chatbot_cut_cost))
+    savings_per_contact = np.maximum(savings_per_contact, 0)  # Ensure savings are non-negative.
+    return contact_volume * savings_per_contact
+
+def diminishing_conversion_rate(base_rate, increase_rate, year, max_rate):
+    """
+    Model diminishing returns for conversion rate improvements over time.
+    - base_rate: Initial conversion rate.
+    - increase_rate: Annual improvement in conversion rate.
+    - year: Current year in the projection.
+    - max_rate: Maximum achievable conversion rate.
+
+    Returns the conversion rate for the given year.
+    """
+    return np.minimum(base_rate + (increase_rate / (1 + 0 * year)), max_rate)
+
+def calculate_costs(yearly_recurrent_cost, economies_scale_cost_factor, year):
+    """
+    Calculate costs with economies of scale applied over time.
+    - yearly_recurrent_cost: Initial annual cost.
+    - economies_scale_cost_factor: Annual cost reduction due to economies of scale.
+    - year: Current year in the projection.
+
+    Returns the adjusted cost for the year.
+    """
+    return yearly_recurrent_cost / (1 + economies_scale_cost_factor * year)
+
+# ---------------- Batch Projection Engine ----------------
+
+# Assumption keys consumed by the projection engine.
+PROJECTION_KEYS = [
+    "initial_insurance_company_health_policies",
+    "avg_contacts_phone_web_daily",
+    "nps_increase",
+    "nps_diminishing_rate",
+    "economies_scale_cost_factor",
+    "first_year_costs",
+    "recurring_monthly_costs",
+    "conversion_increase",
+    "max_conversion_rate",
+    "avg_market_policy_price",
+    "price_elasticity",
+    "initial_phone_rate",
+    "initial_web_rate",
+    "initial_chatbot_rate",
+    "phone_decrease_rate",
+    "web_decrease_rate",
+    "chatbot_increase_rate",
+    "insurance_company_avg_policy_price",
+    "perc_estimated_current_conversion",
+    "avg_telephone_cost_per_interaction",
+    "avg_chatbot_cost_per_interaction",
+    "cohort_retention_rate",
+    "discount_rate",
+    "chatbot_adoption_growth_rate",
+    "chatbot_adoption_midpoint",
+    "max_chatbot_rate",
+]
+
+# Keys added after the original model; assumption sets without them use DEFAULT_ASSUMPTIONS.
+OPTIONAL_KEYS = ["cohort_retention_rate", "discount_rate", "chatbot_adoption_growth_rate",
+                 "chatbot_adoption_midpoint", "max_chatbot_rate"]
+
+# Retention models: "flat" applies one retention effect to the book and the year's
+# new customers; "cohort" tracks every step's new customers as a cohort with its own
+# decaying NPS uplift and survival curve.
+RETENTION_MODELS = ["flat", "cohort"]
+
+# Chatbot adoption models: "linear" grows the chatbot share by a constant amount per
+# year from the initial rate; "logistic" follows an S-curve up to max_chatbot_rate
+# (see adoption_fit.py to fit its parameters to observed usage).
+ADOPTION_MODELS = ["linear", "logistic"]
+
+# Output columns of the projection (stable internal names, raw units: contacts and
+# customers as counts, money in euros, ROI in percent), in display order.
+RESULT_COLUMNS = [
+    "year",
+    "total_contacts",
+    "phone_contacts",
+    "web_contacts",
+    "chatbot_contacts",
+    "new_customers",
+    "retention_profit",
+    "chatbot_savings",
+    "costs",
+    "net_profit",
+    "cumulative_costs",
+    "cumulative_profit",
+    "roi",
+    "npv",
+    "discounted_roi",
+]
+
+def stack_assumptions(assumptions):
+    """
+    Stack one or many assumption sets into column arrays for the batch engine.
+
+    Parameters:
+    assumptions (dict | list[dict]): A single assumptions dict (values may be
+        scalars or 1-D arrays with one entry per scenario) or a list of dicts.
+
+    Returns:
+    dict: Projection keys mapped to float64 arrays of shape (N, 1). Missing
+        OPTIONAL_KEYS fall back to DEFAULT_ASSUMPTIONS.
+    """
+    def lookup(a, key):
+        return a.get(key, DEFAULT_ASSUMPTIONS[key]) if key in OPTIONAL_KEYS else a[key]
+
+    if isinstance(assumptions, dict):
+        columns = {key: np.asarray(lookup(assumptions, key), dtype=np.float64) for key in PROJECTION_KEYS}
+    else:
+        columns = {key: np.array([lookup(a, key) for a in assumptions], dtype=np.float64) for key in PROJECTION_KEYS}
+
+    n_scenarios = max(column.size for column in columns.values())
+    for key, column in columns.items():
+        if column.size not in (1, n_scenarios):
+            raise ValueError(f"Assumption '{key}' has {column.size} values, expected 1 or {n_scenarios}.")
+    return {key: np.broadcast_to(column.reshape(-1, 1), (n_scenarios, 1)) for key, column in columns.items()}
+
+# ---------------- Cohort Retention ----------------
+
+def cohort_retention_kernel(n_periods, periods_per_year, nps_increase, nps_diminishing_rate, cohort_retention_rate):
+    """
+    Retention uplift of one customer by cohort age.
+
+    A cohort's NPS uplift decays with its own age through `nps_diminishing_rate`
+    (as in `calculate_retention_profit`) and the cohort shrinks by
+    `cohort_retention_rate` per year.
+
+    Parameters:
+    n_periods (int): Number of ages (steps) to evaluate.
+    periods_per_year (float): Steps per year.
+    nps_increase, nps_diminishing_rate, cohort_retention_rate: Assumption arrays of shape (N, 1).
+
+    Returns:
+    np.ndarray: Array of shape (N, n_periods); entry [n, a] applies to a cohort aged `a` steps.
+    """
+    age = (np.arange(n_periods, dtype=np.float64) / periods_per_year)[np.newaxis, :]
+    return nps_increase * (1 - age * nps_diminishing_rate) * cohort_retention_rate ** age
+
+def cohort_matrix(new_customers, kernel):
+    """
+    Explicit cohort x time matrix of retained (uplifted) customers.
+
+    Built with broadcasting over a lower-triangular age index, so it costs
+    O(N T^2) memory; use it for inspection and drill-down of moderate horizons.
+
+    Parameters:
+    new_customers (np.ndarray): Customers joining in each step, shape (N, T).
+    kernel (np.ndarray): Output of `cohort_retention_kernel`, shape (N, T).
+
+    Returns:
+    np.ndarray: Array of shape (N, T, T); entry [n, c, t] is cohort c's contribution at step t.
+    """
+    n_periods = new_customers.shape[-1]
+    steps = np.arange(n_periods)
+    age = steps[np.newaxis, :] - steps[:, np.newaxis]  # [c, t] = t - c
+    active = age >= 0
+    return np.where(active, new_customers[:, :, np.newaxis] * kernel[:, np.clip(age, 0, None)], 0.0)
+
+def cohort_convolve(new_customers, kernel):
+    """
+    Retained customers summed over cohorts at every step: sum_c new[c] * kernel[t - c].
+
+    This is a causal convolution along the time axis. Short horizons use the
+    triangular cohort matrix; longer ones use an FFT, O(N T log T), so monthly or
+    daily horizons over large batches never build the T x T matrix.
+
+    Parameters:
+    new_customers (np.ndarray): Customers joining in each step, shape (N, T).
+    kernel (np.ndarray): Output of `cohort_retention_kernel`, shape (N, T).
+
+    Returns:
+    np.ndarray: Array of shape (N, T).
+    """
+    n_periods = new_customers.shape[-1]
+    if n_periods <= 32:
+        return cohort_matrix(new_customers, kernel).sum(axis=1)
+    n_fft = 1 << (2 * n_periods - 1).bit_length()
+    spectrum = np.fft.rfft(new_customers, n_fft, axis=-1) * np.fft.rfft(kernel, n_fft, axis=-1)
+    return np.fft.irfft(spectrum, n_fft, axis=-1)[..., :n_periods]
+
+# ---------------- Time Steps ----------------
+
+# Projection steps per year. Rate assumptions are annual and are applied per step
+# on a continuous time axis (in years); flows are booked per step.
+TIME_STEPS = {"year": 1, "quarter": 4, "month": 12, "day": 365}
+
+# Result columns that are per-period flows (summed when aggregating); the other
+# columns are running totals or ratios read at the end of each year.
+FLOW_COLUMNS = [
+    "total_contacts",
+    "phone_contacts",
+    "web_contacts",
+    "chatbot_contacts",
+    "new_customers",
+    "retention_profit",
+    "chatbot_savings",
+    "costs",
+    "net_profit",
+]
+
+def time_inputs(time_period, time_step="year", retention_model="flat", adoption_model="linear"):
+    """
+    Time and model inputs of the projection graph.
+
+    Parameters:
+    time_period (int): Number of years in the projection (years 0..time_period are modelled).
+    time_step (str): One of TIME_STEPS.
+    retention_model (str): One of RETENTION_MODELS.
+    adoption_model (str): One of ADOPTION_MODELS.
+
+    Returns:
+    dict: "year" as a (1, periods) array of elapsed years at the start of every step,
+        "periods_per_year", "retention_model" and "adoption_model".
+    """
+    if retention_model not in RETENTION_MODELS:
+        raise ValueError(f"Unknown retention model '{retention_model}', expected one of {', '.join(RETENTION_MODELS)}.")
+    if adoption_model not in ADOPTION_MODELS:
+        raise ValueError(f"Unknown adoption model '{adoption_model}', expected one of {', '.join(ADOPTION_MODELS)}.")
+    if time_step not in TIME_STEPS:
+        raise ValueError(f"Unknown time step '{time_step}', expected one of {', '.join(TIME_STEPS)}.")
+    periods_per_year = TIME_STEPS[time_step]
+    steps = np.arange((time_period + 1) * periods_per_year, dtype=np.float64)
+    return {
+        "year": (steps / periods_per_year)[np.newaxis, :],
+        "periods_per_year": float(periods_per_year),
+        "retention_model": retention_model,
+        "adoption_model": adoption_model,
+    }
+
+# ---------------- Projection Dependency Graph ----------------
+# Each node is a function whose parameter names are the assumption keys, the time
+# inputs ("year", "periods_per_year") or other nodes it depends on. Nodes are
+# listed in evaluation (topological) order.
+
+def _node_contacts(year, periods_per_year, adoption_model, avg_contacts_phone_web_daily, initial_phone_rate,
+                   initial_web_rate, initial_chatbot_rate, phone_decrease_rate, web_decrease_rate, chatbot_increase_rate,
+                   chatbot_adoption_growth_rate, chatbot_adoption_midpoint, max_chatbot_rate):
+    # Calculate total contact volume (phone, web, and chatbot) handled in each step
+    return calculate_contacts(
+        avg_contacts_phone_web_daily * 365 / periods_per_year,
+        initial_phone_rate,
+        initial_web_rate,
+        initial_chatbot_rate,
+        phone_decrease_rate,
+        web_decrease_rate,
+        chatbot_increase_rate,
+        year,
+        initial_growth_value=0.0,  # Grow from the base contacts
+        growth_rate=0.01,           # 1% annually
+        max_growth_value=year/100,      # Until the max year selected
+        adoption_model=adoption_model,
+        chatbot_adoption_growth_rate=chatbot_adoption_growth_rate,
+        chatbot_adoption_midpoint=chatbot_adoption_midpoint,
+        max_chatbot_rate=max_chatbot_rate,
+    )
+
+def _node_conversion_rate(year, perc_estimated_current_conversion, conversion_increase, max_conversion_rate):
+    # Calculate the conversion rate with diminishing returns
+    return diminishing_conversion_rate(perc_estimated_current_conversion, conversion_increase, year, max_conversion_rate)
+
+def _node_new_customers(total_contacts, conversion_rate, avg_market_policy_price, insurance_company_avg_policy_price,
+                        price_elasticity):
+    return calculate_new_customers(total_contacts, conversion_rate, avg_market_policy_price,
+                                   insurance_company_avg_policy_price, price_elasticity)
+
+def _node_retention_profit(year, periods_per_year, retention_model, new_customers,
+                           initial_insurance_company_health_policies, nps_increase, nps_diminishing_rate,
+                           cohort_retention_rate, insurance_company_avg_policy_price):
+    if retention_model == "cohort":
+        # The existing book is the cohort of step 0; every step's new customers
+        # form a cohort that keeps its uplift (decaying with its own age).
+        new_customers = np.broadcast_to(new_customers, np.broadcast_shapes(new_customers.shape, year.shape))
+        kernel = cohort_retention_kernel(new_customers.shape[-1], periods_per_year, nps_increase,
+                                         nps_diminishing_rate, cohort_retention_rate)
+        retained_customers = initial_insurance_company_health_policies * kernel + cohort_convolve(new_customers, kernel)
+        return retained_customers * insurance_company_avg_policy_price / periods_per_year
+
+    # The retention formula is annual: feed it the annualised new customers and
+    # book the resulting revenue pro rata over the steps of the year.
+    annual_retention_profit = calculate_retention_profit(new_customers * periods_per_year,
+                                                         initial_insurance_company_health_policies, nps_increase,
+                                                         nps_diminishing_rate, year, insurance_company_avg_policy_price)
+    return annual_retention_profit / periods_per_year
+
+def _node_chatbot_savings(total_contacts, avg_telephone_cost_per_interaction, avg_chatbot_cost_per_interaction):
+    return calculate_chatbot_savings(total_contacts, avg_telephone_cost_per_interaction, avg_chatbot_cost_per_interaction)
+
+def _node_costs(year, periods_per_year, recurring_monthly_costs, economies_scale_cost_factor, first_year_costs):
+    # Calculate costs per step (monthly costs land in their months), including economies of
+    # scale, plus one-time implementation costs in the first step.
+    costs = calculate_costs(recurring_monthly_costs * 12 / periods_per_year, economies_scale_cost_factor, year)
+    return costs + np.where(year == 0, first_year_costs, 0.0)
+
+def _node_net_profit(retention_profit, chatbot_savings, costs):
+    return retention_profit + chatbot_savings - costs
+
+def _node_roi(cumulative_profit, cumulative_costs):
+    # ROI is 0 until costs are incurred; written with np.where only so the node
+    # also works on the dual numbers used for sensitivities.
+    has_costs = cumulative_costs > 0
+    return np.where(has_costs, cumulative_profit * 100 / np.where(has_costs, cumulative_costs, 1.0), 0.0)
+
+def _node_discount_factor(year, discount_rate):
+    # Cash flows are discounted from the start of the step they are booked in.
+    return (1 + discount_rate) ** -year
+
+PROJECTION_NODES = {
+    "contacts": _node_contacts,
+    "total_contacts": lambda contacts: contacts[0],
+    "phone_contacts": lambda contacts: contacts[1],
+    "web_contacts": lambda contacts: contacts[2],
+    "chatbot_contacts": lambda contacts: contacts[3],
+    "conversion_rate": _node_conversion_rate,
+    "new_customers": _node_new_customers,
+    "retention_profit": _node_retention_profit,
+    "chatbot_savings": _node_chatbot_savings,
+    "costs": _node_costs,
+    "net_profit": _node_net_profit,
+    "cumulative_costs": lambda costs: np.cumsum(costs, axis=-1),
+    "cumulative_profit": lambda net_profit: np.cumsum(net_profit, axis=-1),
+    "roi": _node_roi,
+    "discount_factor": _node_discount_factor,
+    "npv": lambda net_profit, discount_factor: np.cumsum(net_profit * discount_factor, axis=-1),
+    "discounted_cumulative_costs": lambda costs, discount_factor: np.cumsum(costs * discount_factor, axis=-1),
+    "discounted_roi": lambda npv, discounted_cumulative_costs: _node_roi(npv, discounted_cumulative_costs),
+}
+
+# Direct dependencies of every node, read from the node function signatures.
+PROJECTION_DEPENDENCIES = {
+    name: list(inspect.signature(function).parameters) for name, function in PROJECTION_NODES.items()
+}
+
+def downstream_nodes(changed):
+    """
+    Nodes that must be recomputed when the given inputs or nodes change.
+
+    Parameters:
+    changed (iterable): Assumption keys, "year" or node names.
+
+    Returns:
+    set: Names of the affected nodes.
+    """
+    dirty = set(changed)
+    affected = set()
+    for name, dependencies in PROJECTION_DEPENDENCIES.items():
+        if dirty.intersection(dependencies):
+            dirty.add(name)
+            affected.add(name)
+    return affected
+
+def evaluate_nodes(values, names=None):
+    """
+    Evaluate graph nodes in dependency order.
+
+    Parameters:
+    values (dict): Stacked assumptions, "year" and any already computed nodes; updated in place.
+    names (set | None): Nodes to (re)compute, all nodes if None.
+
+    Returns:
+    dict: `values`, now including the evaluated nodes.
+    """
+    for name, function in PROJECTION_NODES.items():
+        if names is None or name in names:
+            values[name] = function(*(values[dependency] for dependency in PROJECTION_DEPENDENCIES[name]))
+    return values
+
+class ProjectionResult:
+    """
+    Columnar projection output.
+
+    All columns live in one contiguous (columns, scenarios, periods) block, so a
+    column is a zero-copy (N, T) view and a scenario is a zero-copy (columns, 1, T)
+    view. Values are in raw units; display labels and scaling are applied by the
+    presentation layer (see `helper_functions.DISPLAY_COLUMNS`).
+
+    Parameters:
+    data (np.ndarray): Array of shape (len(columns), N, T).
+    columns (list[str]): Column names, one per leading row of `data`.
+    periods_per_year (int): Steps per year of the period axis (see TIME_STEPS).
+    """
+
+    __slots__ = ("data", "columns", "periods_per_year", "_index")
+
+    def __init__(self, data, columns=RESULT_COLUMNS, periods_per_year=1):
+        self.data = data
+        self.columns = list(columns)
+        self.periods_per_year = periods_per_year
+        self._index = {column: i for i, column in enumerate(self.columns)}
+
+    def __getitem__(self, column):
+        return self.data[self._index[column]]
+
+    def __contains__(self, column):
+        return column in self._index
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def items(self):
+        return ((column, self.data[i]) for i, column in enumerate(self.columns))
+
+    @property
+    def n_scenarios(self):
+        return self.data.shape[1]
+
+    @property
+    def n_periods(self):
+        return self.data.shape[2]
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def scenario(self, index):
+        """
+        Zero-copy view of a single scenario.
+        """
+        return ProjectionResult(self.data[:, index:index + 1, :], self.columns, self.periods_per_year)
+
+    def astype(self, dtype):
+        return ProjectionResult(self.data.astype(dtype), self.columns, self.periods_per_year)
+
+def aggregate_to_years(result):
+    """
+    Yearly view of a projection computed with a sub-yearly time step.
+
+    Flow columns are summed over the steps of each year; running totals and ROI
+    are read at the last step of the year.
+
+    Parameters:
+    result (ProjectionResult): Projection with `periods_per_year` steps per year.
+
+    Returns:
+    ProjectionResult: One period per year (the same object if already yearly).
+    """
+    if result.periods_per_year == 1:
+        return result
+    n_columns, n_scenarios, n_periods = result.data.shape
+    by_year = result.data.reshape(n_columns, n_scenarios, n_periods // result.periods_per_year, result.periods_per_year)
+    yearly = np.empty(by_year.shape[:3], dtype=result.dtype)
+    for i, column in enumerate(result.columns):
+        if column in FLOW_COLUMNS:
+            by_year[i].sum(axis=-1, out=yearly[i])
+        elif column == "year":
+            yearly[i] = by_year[i, :, :, 0]
+        else:
+            yearly[i] = by_year[i, :, :, -1]
+    return ProjectionResult(yearly, result.columns)
+
+class IncrementalProjection:
+    """
+    Batch projection that keeps every intermediate node and, on update, only
+    recomputes the nodes downstream of the assumptions that actually changed.
+    Only the recomputed columns are rewritten in the result block, so the
+    returned `ProjectionResult` is updated in place by later calls.
+
+    Parameters:
+    time_period (int): Number of years in the projection.
+    assumptions (dict | list[dict]): Assumption sets, see `stack_assumptions`.
+    dtype (np.dtype): Storage type of the result block (float64 or float32).
+    time_step (str): Projection step, one of TIME_STEPS.
+    retention_model (str): One of RETENTION_MODELS.
+    adoption_model (str): One of ADOPTION_MODELS.
+    """
+
+    def __init__(self, time_period, assumptions, dtype=np.float64, time_step="year", retention_model="flat",
+                 adoption_model="linear"):
+        self.values = {}
+        self.result = None
+        self.recomputed = set()
+        self.time_period = None
+        self.time_step = time_step
+        self.retention_model = retention_model
+        self.adoption_model = adoption_model
+        self.dtype = np.dtype(dtype)
+        self.update(time_period, assumptions)
+
+    def update(self, time_period, assumptions, time_step=None, retention_model=None, adoption_model=None):
+        """
+        Apply new assumptions (and optionally a new horizon, time step,
+        retention model or adoption model) and recompute the affected nodes and columns.
+
+        Returns:
+        ProjectionResult: Every output column as an (N, periods) view.
+        """
+        time_step = self.time_step if time_step is None else time_step
+        retention_model = self.retention_model if retention_model is None else retention_model
+        adoption_model = self.adoption_model if adoption_model is None else adoption_model
+        inputs = stack_assumptions(assumptions)
+        changed = {
+            key for key, value in inputs.items()
+            if key not in self.values or not np.array_equal(self.values[key], value)
+        }
+        if time_period != self.time_period or time_step != self.time_step or "year" not in self.values:
+            self.time_period = time_period
+            self.time_step = time_step
+            inputs.update(time_inputs(time_period, time_step, retention_model, adoption_model))
+            changed.update(("year", "periods_per_year", "retention_model", "adoption_model"))
+        else:
+            if retention_model != self.values["retention_model"]:
+                inputs["retention_model"] = retention_model
+                changed.add("retention_model")
+            if adoption_model != self.values["adoption_model"]:
+                inputs["adoption_model"] = adoption_model
+                changed.add("adoption_model")
+        self.retention_model = retention_model
+        self.adoption_model = adoption_model
+        self.values.update(inputs)
+
+        self.recomputed = downstream_nodes(changed)
+        evaluate_nodes(self.values, self.recomputed)
+
+        shape = (len(RESULT_COLUMNS), self.values["net_profit"].shape[0], self.values["year"].shape[1])
+        stale = self.recomputed | changed
+        if self.result is None or self.result.data.shape != shape:
+            self.result = ProjectionResult(np.empty(shape, dtype=self.dtype),
+                                           periods_per_year=TIME_STEPS[time_step])
+            stale = set(RESULT_COLUMNS)
+        for i, column in enumerate(RESULT_COLUMNS):
+            if column in stale:
+                self.result.data[i] = self.values[column]
+        return self.result
+
+def calculate_financials_batch(time_period, assumptions, dtype=np.float64, time_step="year", retention_model="flat",
+                               max_chunk_elements=4_000_000, adoption_model="linear"):
+    """
+    Vectorized financial projection for a batch of assumption sets.
+
+    Parameters:
+    time_period (int): Number of years in the projection.
+    assumptions (dict | list[dict]): Assumption sets, see `stack_assumptions`.
+    dtype (np.dtype): Storage type of the result (float64, or float32 to halve memory).
+    time_step (str): Projection step, one of TIME_STEPS.
+    retention_model (str): One of RETENTION_MODELS.
+    max_chunk_elements (int): Scenarios are evaluated in chunks of at most this many
+        scenario x period cells, which bounds the intermediate arrays of long horizons.
+    adoption_model (str): One of ADOPTION_MODELS.
+
+    Returns:
+    ProjectionResult: Every column in `RESULT_COLUMNS` as an (N, periods) view,
+        with (time_period + 1) * TIME_STEPS[time_step] periods.
+    """
+    inputs = stack_assumptions(assumptions)
+    n_scenarios = inputs["nps_increase"].shape[0]
+    n_periods = (time_period + 1) * TIME_STEPS[time_step]
+    chunk_size = max(1, max_chunk_elements // n_periods)
+    if n_scenarios <= chunk_size:
+        return IncrementalProjection(time_period, inputs, dtype, time_step, retention_model, adoption_model).result
+
+    result = ProjectionResult(np.empty((len(RESULT_COLUMNS), n_scenarios, n_periods), dtype=dtype),
+                              periods_per_year=TIME_STEPS[time_step])
+    for start in range(0, n_scenarios, chunk_size):
+        chunk = {key: value[start:start + chunk_size] for key, value in inputs.items()}
+        result.data[:, start:start + chunk_size] = IncrementalProjection(time_period, chunk, dtype, time_step, retention_model,
+                                                                                adoption_model).result.data
+    return result
+
+# ---------------- Investment Metrics ----------------
+
+def _npv_and_slope(log_growth, cash_flows, year):
+    # NPV and its derivative with respect to log(1 + rate), where discounting is exp(-log_growth * year).
+    discounted = cash_flows * np.exp(-log_growth[:, np.newaxis] * year)
+    return discounted.sum(axis=-1), -(discounted * year).sum(axis=-1)
+
+def irr(cash_flows, year, bounds=(-0.99, 1_000.0), xtol=1e-10, max_iter=100):
+    """
+    Internal rate of return of many cash-flow vectors at once.
+
+    Solves sum_t cash_flows[t] * (1 + r) ** -year[t] = 0 with a safeguarded
+    Newton iteration on log(1 + r): every vector keeps a bracket with a sign
+    change, takes the Newton step when it stays inside the bracket and bisects
+    otherwise. Each iteration is one vectorized evaluation over the vectors that
+    have not converged yet.
+
+    Parameters:
+    cash_flows (np.ndarray): Cash flows of shape (N, T), e.g. the "net_profit" column.
+    year (np.ndarray): Time of every cash flow in years, shape (T,) or (1, T).
+    bounds (tuple): (low, high) search interval for the rate.
+    xtol (float): Tolerance on log(1 + r), roughly a relative tolerance on 1 + r.
+    max_iter (int): Maximum number of iterations.
+
+    Returns:
+    np.ndarray: Rate per vector, NaN where the NPV does not change sign inside `bounds`.
+    """
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=np.float64))
+    year = np.asarray(year, dtype=np.float64).reshape(-1)
+    n_vectors = cash_flows.shape[0]
+
+    low = np.full(n_vectors, np.log1p(bounds[0]))
+    high = np.full(n_vectors, np.log1p(bounds[1]))
+    f_low, _ = _npv_and_slope(low, cash_flows, year)
+    f_high, _ = _npv_and_slope(high, cash_flows, year)
+    bracketed = (np.sign(f_low) * np.sign(f_high) <= 0) & np.any(cash_flows != 0, axis=-1)
+
+    log_growth = np.full(n_vectors, np.nan)
+    active = np.flatnonzero(bracketed)
+    low, high, f_low = low[active], high[active], f_low[active]
+    guess = np.clip(np.log1p(0.1), low, high)
+    flows = cash_flows[active]
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        value, slope = _npv_and_slope(guess, flows, year)
+        # Shrink the bracket around the root before choosing the next step.
+        keeps_low_sign = np.sign(value) == np.sign(f_low)
+        low = np.where(keeps_low_sign, guess, low)
+        f_low = np.where(keeps_low_sign, value, f_low)
+        high = np.where(keeps_low_sign, high, guess)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = guess - value / slope
+        inside = (newton > low) & (newton < high)
+        next_guess = np.where(inside, newton, 0.5 * (low + high))
+
+        converged = (np.abs(next_guess - guess) <= xtol) | (value == 0)
+        log_growth[active[converged]] = np.where(value[converged] == 0, guess[converged], next_guess[converged])
+        keep = ~converged
+        if not keep.all():
+            active, flows, low, high, f_low = active[keep], flows[keep], low[keep], high[keep], f_low[keep]
+        guess = next_guess[keep]
+    log_growth[active] = guess  # Not converged within max_iter: best estimate so far.
+    return np.expm1(log_growth)
+
+def discounted_payback(npv, year):
+    """
+    Discounted payback period: the time at which the cumulative discounted cash
+    flow first reaches zero, interpolated linearly within the step.
+
+    Parameters:
+    npv (np.ndarray): Cumulative discounted cash flow of shape (N, T), e.g. the "npv" column.
+    year (np.ndarray): Time of every step in years, shape (T,) or (1, T).
+
+    Returns:
+    np.ndarray: Payback in years per scenario, NaN if it is not reached within the projection.
+    """
+    npv = np.atleast_2d(np.asarray(npv, dtype=np.float64))
+    year = np.asarray(year, dtype=np.float64).reshape(-1)
+    paid_back = npv >= 0
+    first = np.argmax(paid_back, axis=-1)
+    previous = np.maximum(first - 1, 0)
+    rows = np.arange(npv.shape[0])
+    before, after = npv[rows, previous], npv[rows, first]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(first > 0, -before / (after - before), 0.0)
+    payback = year[previous] + fraction * (year[first] - year[previous])
+    return np.where(paid_back.any(axis=-1), payback, np.nan)
+
+def investment_metrics(result):
+    """
+    Scenario-level investment metrics of a projection.
+
+    Parameters:
+    result (ProjectionResult | dict): Projection with the "year", "net_profit", "npv"
+        and "discounted_roi" columns as (N, T) arrays (yearly or sub-yearly steps).
+
+    Returns:
+    dict: (N,) arrays of the final "npv", the "irr", the "discounted_payback" in years
+        and the final "discounted_roi" (%).
+    """
+    year = np.asarray(result["year"])[0]
+    return {
+        "npv": np.asarray(result["npv"])[:, -1].astype(np.float64),
+        "irr": irr(result["net_profit"], year),
+        "discounted_payback": discounted_payback(result["npv"], year),
+        "discounted_roi": np.asarray(result["discounted_roi"])[:, -1].astype(np.float64),
+    }
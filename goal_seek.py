@@ -0,0 +1,87 @@
+import numpy as np
+
+import financial_core as core
+
+# ---------------- Goal Seek ----------------
+
+def goal_seek(time_period, assumptions, solve_for, column, target, bounds, year=None, xtol=1e-10, max_iter=200,
+              time_step="year", retention_model="flat", adoption_model="linear"):
+    """
+    Solve for the value of one assumption that makes an output column hit a target.
+
+    Every problem in the batch is solved simultaneously by vectorized bisection:
+    each iteration evaluates the whole batch once with `core.IncrementalProjection`,
+    so only the nodes downstream of `solve_for` are recomputed.
+
+    Example: maximum "recurring_monthly_costs" for which cumulative ROI is still 150% in year 5:
+        goal_seek(6, assumptions, "recurring_monthly_costs", "roi", 150, bounds=(0, 1e6), year=5)
+
+    For a monotonic output the solution is the threshold value, i.e. the minimum
+    (or maximum) assumption value that reaches the target.
+
+    Parameters:
+    time_period (int): Number of years in the projection.
+    assumptions (dict | list[dict]): One assumption set per problem, or one set shared by all
+        problems, see `core.stack_assumptions`.
+    solve_for (str): Assumption key to solve for (one of core.PROJECTION_KEYS).
+    column (str): Output column of the target (one of core.RESULT_COLUMNS, raw units).
+    target (float | np.ndarray): Target value, scalar or one per problem.
+    bounds (tuple): (low, high) search interval for `solve_for`, scalars or one per problem.
+    year (int): Year at which the target applies, defaults to the last year.
+    xtol (float): Absolute tolerance on the solution.
+    max_iter (int): Maximum number of bisection steps.
+    time_step (str): Projection step, one of core.TIME_STEPS; `year` refers to the
+        yearly aggregate (see `core.aggregate_to_years`).
+    retention_model (str): One of core.RETENTION_MODELS.
+    adoption_model (str): One of core.ADOPTION_MODELS.
+
+    Returns:
+    dict:
+        "value": Solution per problem (NaN where the target is not bracketed by `bounds`).
+        "bracketed": Boolean mask of problems with a sign change inside `bounds`.
+        "iterations": Number of batch evaluations after the bracket check.
+    """
+    if solve_for not in core.PROJECTION_KEYS:
+        raise KeyError(f"'{solve_for}' is not a projection assumption.")
+    year = time_period if year is None else year
+
+    inputs = {key: value[:, 0] for key, value in core.stack_assumptions(assumptions).items()}
+    target = np.asarray(target, dtype=np.float64)
+    low, high = (np.asarray(bound, dtype=np.float64) for bound in bounds)
+    # The batch is set by the assumption sets, the targets or the bounds, whichever is not scalar.
+    (n_problems,) = np.broadcast_shapes(inputs[solve_for].shape, target.shape, low.shape, high.shape)
+    inputs = {key: np.broadcast_to(value, (n_problems,)) for key, value in inputs.items()}
+    target = np.broadcast_to(target, (n_problems,))
+    low = np.broadcast_to(low, (n_problems,)).copy()
+    high = np.broadcast_to(high, (n_problems,)).copy()
+
+    projection = None
+
+    def residual(x):
+        nonlocal projection
+        inputs[solve_for] = x
+        if projection is None:
+            projection = core.IncrementalProjection(time_period, inputs, time_step=time_step,
+                                                    retention_model=retention_model, adoption_model=adoption_model)
+            result = projection.result
+        else:
+            result = projection.update(time_period, inputs)
+        return core.aggregate_to_years(result)[column][:, year] - target
+
+    f_low = residual(low)
+    f_high = residual(high)
+    bracketed = np.sign(f_low) * np.sign(f_high) <= 0
+
+    iterations = 0
+    while iterations < max_iter and np.any(bracketed & (high - low > xtol)):
+        mid = 0.5 * (low + high)
+        f_mid = residual(mid)
+        # Keep the half-interval that still contains the sign change.
+        take_low_half = np.sign(f_mid) * np.sign(f_low) <= 0
+        high = np.where(take_low_half, mid, high)
+        low = np.where(take_low_half, low, mid)
+        f_low = np.where(take_low_half, f_low, f_mid)
+        iterations += 1
+
+    value = np.where(bracketed, 0.5 * (low + high), np.nan)
+    return {"value": value, "bracketed": bracketed, "iterations": iterations}
@@ -0,0 +1,100 @@
+"""
+Measure cold import time of the project modules against a budget.
+
+Each module is imported in a fresh interpreter with `python -X importtime`, so
+the numbers reflect what a new container or process-pool worker pays. The
+script also checks that the computational modules never pull in the UI stack.
+
+Usage:
+    python import_budget.py            # report and exit 1 if a budget is exceeded
+    python import_budget.py --json     # machine-readable report
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Cold import budget in milliseconds per module.
+IMPORT_BUDGET_MS = {
+    "financial_core": 250,
+    "helper_functions": 1_000,
+    "monte_carlo": 1_000,
+    "batch_cli": 1_000,
+    "chart_data": 1_000,
+    "streaming_stats": 250,
+    "segments": 1_000,
+    "contact_logs": 1_000,
+    "adoption_fit": 250,
+}
+
+# Modules that must stay importable without the UI and plotting stack.
+UI_FREE_MODULES = {"financial_core", "helper_functions", "monte_carlo", "batch_cli", "chart_data", "streaming_stats", "segments",
+                   "contact_logs", "adoption_fit"}
+UI_PACKAGES = ("streamlit", "matplotlib", "altair", "scipy")
+
+def measure_import(module):
+    """
+    Import `module` in a fresh interpreter and parse the -X importtime report.
+
+    Parameters:
+    module (str): Module name importable from the project directory.
+
+    Returns:
+    dict: Total cumulative import time in ms and the set of top-level packages loaded.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_us = 0
+    packages = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # Header line.
+        packages.add(name.strip().split(".")[0])
+        if name.strip() == module:
+            total_us = int(cumulative)
+    return {"ms": total_us / 1000, "packages": packages}
+
+def check_budget(budget=IMPORT_BUDGET_MS):
+    """
+    Returns:
+    list[dict]: One report row per module with its time, budget and any violations.
+    """
+    report = []
+    for module, limit_ms in budget.items():
+        measured = measure_import(module)
+        ui_loaded = sorted(measured["packages"].intersection(UI_PACKAGES)) if module in UI_FREE_MODULES else []
+        report.append({
+            "module": module,
+            "ms": round(measured["ms"], 1),
+            "budget_ms": limit_ms,
+            "ui_packages": ui_loaded,
+            "ok": measured["ms"] <= limit_ms and not ui_loaded,
+        })
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check cold import times against the budget.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args(argv)
+
+    report = check_budget()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for row in report:
+            status = "OK  " if row["ok"] else "FAIL"
+            extra = f"  loads {', '.join(row['ui_packages'])}" if row["ui_packages"] else ""
+            print(f"{status} {row['module']:<18} {row['ms']:>8.1f} ms / {row['budget_ms']} ms{extra}")
+    return 0 if all(row["ok"] for row in report) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
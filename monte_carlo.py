@@ -0,0 +1,330 @@
+import numpy as np
+import pandas as pd
+
+import financial_core as core
+from streaming_stats import StreamingStats
+
+# ---------------- Monte Carlo Simulation ----------------
+
+# Assumptions treated as uncertain by default. Any key in core.PROJECTION_KEYS
+# can be given a distribution.
+UNCERTAIN_KEYS = [
+    "nps_increase",
+    "conversion_increase",
+    "price_elasticity",
+    "phone_decrease_rate",
+    "chatbot_increase_rate",
+    "recurring_monthly_costs",
+]
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+def _key_rng(seed, key, chunk=None):
+    """
+    Independent, reproducible random generator for one uncertain assumption.
+    The stream is fixed by the key's position in core.PROJECTION_KEYS, so adding or
+    removing a distribution never changes the draws of the other assumptions.
+    Streaming simulations draw every chunk of paths from its own sub-stream.
+    """
+    if key not in core.PROJECTION_KEYS:
+        raise KeyError(f"'{key}' is not a projection assumption.")
+    stream = core.PROJECTION_KEYS.index(key)
+    spawn_key = (stream,) if chunk is None else (stream, chunk)
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=spawn_key))
+
+def draw_assumption(distribution, n_paths, rng):
+    """
+    Draw samples for one assumption.
+
+    Parameters:
+    distribution (tuple): One of
+        ("normal", mean, std),
+        ("triangular", left, mode, right),
+        ("uniform", low, high),
+        ("lognormal", mean, sigma)  # parameters of the underlying normal.
+    n_paths (int): Number of samples to draw.
+    rng (np.random.Generator): Random generator to draw from.
+
+    Returns:
+    np.ndarray: Array of `n_paths` samples.
+    """
+    kind, *params = distribution
+    if kind == "normal":
+        return rng.normal(params[0], params[1], n_paths)
+    if kind == "triangular":
+        return rng.triangular(params[0], params[1], params[2], n_paths)
+    if kind == "uniform":
+        return rng.uniform(params[0], params[1], n_paths)
+    if kind == "lognormal":
+        return rng.lognormal(params[0], params[1], n_paths)
+    raise ValueError(f"Unknown distribution '{kind}'.")
+
+def sample_assumptions(assumptions, distributions, n_paths, seed=0):
+    """
+    Replace point estimates with sampled arrays.
+
+    Parameters:
+    assumptions (dict): Base assumptions for the scenario.
+    distributions (dict): Assumption keys mapped to distribution tuples, see `draw_assumption`.
+    n_paths (int): Number of simulated paths.
+    seed (int): Seed for the random streams.
+
+    Returns:
+    dict: A copy of `assumptions` where every key in `distributions` holds an array of `n_paths` draws.
+    """
+    sampled = dict(assumptions)
+    for key, distribution in distributions.items():
+        sampled[key] = draw_assumption(distribution, n_paths, _key_rng(seed, key))
+    return sampled
+
+def _percentiles(paths, percentiles):
+    """
+    Linear-interpolation percentiles along the last axis, equal to
+    np.percentile(..., axis=-1) but computed from a single sort, which is several
+    times faster than repeated selection when many percentiles are requested.
+    """
+    ordered = np.sort(paths, axis=-1)
+    position = np.asarray(percentiles, dtype=np.float64) / 100 * (ordered.shape[-1] - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, ordered.shape[-1] - 1)
+    weight = position - lower
+    return ordered[..., lower] * (1 - weight) + ordered[..., upper] * weight
+
+def _summarise(paths, n_done, time_period, percentiles):
+    """
+    Percentile bands and P(ROI < 0) over the first `n_done` simulated paths.
+    """
+    years = pd.Index(np.arange(time_period + 1), name="Year")
+    labels = [f"P{p:g}" for p in percentiles]
+    bands = {
+        column: pd.DataFrame(_percentiles(values[:, :n_done], percentiles), index=years, columns=labels)
+        for column, values in paths.items()
+    }
+    prob_negative_roi = pd.Series((paths["roi"][:, :n_done] < 0).mean(axis=1), index=years, name="P(ROI < 0)")
+    return {"bands": bands, "prob_negative_roi": prob_negative_roi}
+
+def _project_years(time_period, assumptions, time_step, retention_model, adoption_model):
+    """
+    Yearly projection of a chunk of paths (sub-yearly steps are aggregated to years).
+    """
+    return core.aggregate_to_years(core.calculate_financials_batch(
+        time_period, assumptions, time_step=time_step, retention_model=retention_model, adoption_model=adoption_model))
+
+def _simulate_paths(time_period, assumptions, distributions, n_paths, seed, chunk_size, time_step, retention_model,
+                    adoption_model):
+    """
+    Simulate the paths chunk by chunk, yielding (paths simulated so far, path arrays) after every chunk.
+    """
+    sampled = sample_assumptions(assumptions, distributions, n_paths, seed)
+    columns = [column for column in core.RESULT_COLUMNS if column != "year"]
+    # Paths are stored year-major so each year's draws are contiguous for sorting.
+    paths = {column: np.empty((time_period + 1, n_paths)) for column in columns}
+
+    for start in range(0, n_paths, chunk_size):
+        stop = min(start + chunk_size, n_paths)
+        chunk = {key: (value[start:stop] if key in distributions else value) for key, value in sampled.items()}
+        batch = _project_years(time_period, chunk, time_step, retention_model, adoption_model)
+        for column in columns:
+            paths[column][:, start:stop] = batch[column].T
+        yield stop, paths
+
+def iter_simulate_financials(time_period, assumptions, distributions, n_paths=100_000, seed=0,
+                             percentiles=DEFAULT_PERCENTILES, chunk_size=250_000, time_step="year",
+                             retention_model="flat", adoption_model="linear"):
+    """
+    Chunked `simulate_financials` that reports the summary of the paths simulated so far.
+
+    All draws are made up front, so the final summary equals `simulate_financials`
+    with the same arguments whatever the chunk size. Stopping the iteration stops
+    the simulation.
+
+    Yields:
+    tuple: (number of paths simulated, summary over those paths), after every chunk.
+    """
+    for n_done, paths in _simulate_paths(time_period, assumptions, distributions, n_paths, seed, chunk_size,
+                                         time_step, retention_model, adoption_model):
+        yield n_done, _summarise(paths, n_done, time_period, percentiles)
+
+def simulate_financials(time_period, assumptions, distributions, n_paths=100_000, seed=0,
+                        percentiles=DEFAULT_PERCENTILES, chunk_size=250_000, time_step="year",
+                        retention_model="flat", adoption_model="linear"):
+    """
+    Monte Carlo simulation of `calculate_financials` over uncertain assumptions.
+
+    Parameters:
+    time_period (int): Number of years in the projection.
+    assumptions (dict): Base assumptions for the scenario.
+    distributions (dict): Assumption keys mapped to distribution tuples, see `draw_assumption`.
+    n_paths (int): Number of simulated paths.
+    seed (int): Seed for the random streams; equal seeds give equal results.
+    percentiles (tuple): Percentiles to report for every column.
+    chunk_size (int): Paths evaluated per engine call, bounds the size of temporaries.
+    time_step (str): Projection step, one of core.TIME_STEPS; the summary is yearly.
+    retention_model (str): One of core.RETENTION_MODELS.
+    adoption_model (str): One of core.ADOPTION_MODELS.
+
+    Returns:
+    dict:
+        "bands": result column (see core.RESULT_COLUMNS, raw units) mapped to a DataFrame indexed
+                 by Year with one column per percentile (e.g. "P50").
+        "prob_negative_roi": Series indexed by Year with the share of paths whose cumulative ROI is negative.
+    """
+    for n_done, paths in _simulate_paths(time_period, assumptions, distributions, n_paths, seed, chunk_size,
+                                         time_step, retention_model, adoption_model):
+        pass
+    return _summarise(paths, n_done, time_period, percentiles)
+
+# ---------------- Streaming Simulation ----------------
+# For path counts whose path x year matrix does not fit in memory (10^7 and more):
+# every chunk of paths is folded into per-year streaming statistics (exact moments,
+# a mergeable quantile sketch and exact P(x < 0)) and then discarded.
+
+STREAM_COLUMNS = ("cumulative_profit", "roi", "npv")
+
+def _stream_chunks(time_period, assumptions, distributions, n_paths, seed, chunk_size, columns, compression, chunks,
+                   time_step="year", retention_model="flat", adoption_model="linear"):
+    """
+    Simulate the given chunks of paths, yielding (paths in the chunk, statistics so far) after every chunk.
+    """
+    stats = {column: StreamingStats(time_period + 1, compression) for column in columns}
+    for chunk in chunks:
+        size = min(chunk_size, n_paths - chunk * chunk_size)
+        sampled = dict(assumptions)
+        for key, distribution in distributions.items():
+            sampled[key] = draw_assumption(distribution, size, _key_rng(seed, key, chunk))
+        batch = _project_years(time_period, sampled, time_step, retention_model, adoption_model)
+        for column in columns:
+            stats[column].update(batch[column].T)
+        yield size, stats
+
+def _stream_worker(args):
+    # Process-pool task: the statistics of a subset of the chunks.
+    stats = None
+    for _, stats in _stream_chunks(*args):
+        pass
+    return stats
+
+def _stream_summary(stats, time_period, percentiles, tail_level):
+    """
+    Percentile bands, moments, tail risk and P(ROI < 0) from streaming statistics.
+    """
+    years = pd.Index(np.arange(time_period + 1), name="Year")
+    labels = [f"P{p:g}" for p in percentiles]
+    quantiles = np.asarray(percentiles, dtype=np.float64) / 100
+    summary = {
+        "bands": {
+            column: pd.DataFrame(column_stats.sketch.quantile(quantiles), index=years, columns=labels)
+            for column, column_stats in stats.items()
+        },
+        "moments": {
+            column: pd.DataFrame({
+                "mean": column_stats.moments.mean,
+                "std": column_stats.moments.std,
+                "skewness": column_stats.moments.skewness,
+                "kurtosis": column_stats.moments.kurtosis,
+                "min": column_stats.moments.min,
+                "max": column_stats.moments.max,
+            }, index=years)
+            for column, column_stats in stats.items()
+        },
+        "tail_risk": {
+            column: pd.DataFrame({
+                "VaR": column_stats.value_at_risk(tail_level),
+                "ES": column_stats.expected_shortfall(tail_level),
+            }, index=years)
+            for column, column_stats in stats.items()
+        },
+        "tail_level": tail_level,
+        "n_paths": int(next(iter(stats.values())).count[0]),
+    }
+    if "roi" in stats:
+        summary["prob_negative_roi"] = pd.Series(stats["roi"].prob_negative, index=years, name="P(ROI < 0)")
+    return summary
+
+def iter_stream_financials(time_period, assumptions, distributions, n_paths=10_000_000, seed=0,
+                           percentiles=DEFAULT_PERCENTILES, chunk_size=50_000, columns=STREAM_COLUMNS,
+                           compression=300, tail_level=0.05, report_every=20, time_step="year",
+                           retention_model="flat", adoption_model="linear"):
+    """
+    In-process `stream_simulate_financials` that reports the summary of the paths
+    simulated so far every `report_every` chunks (and after the last one), for
+    background jobs.
+
+    Yields:
+    tuple: (number of paths simulated, summary over those paths).
+    """
+    n_chunks = -(-n_paths // chunk_size)
+    n_done = 0
+    for i, (size, stats) in enumerate(_stream_chunks(time_period, assumptions, distributions, n_paths, seed,
+                                                     chunk_size, columns, compression, range(n_chunks),
+                                                     time_step, retention_model, adoption_model)):
+        n_done += size
+        if (i + 1) % report_every == 0 or n_done == n_paths:
+            yield n_done, _stream_summary(stats, time_period, percentiles, tail_level)
+
+def stream_simulate_financials(time_period, assumptions, distributions, n_paths=10_000_000, seed=0,
+                               percentiles=DEFAULT_PERCENTILES, chunk_size=50_000, columns=STREAM_COLUMNS,
+                               compression=300, tail_level=0.05, processes=1, time_step="year",
+                               retention_model="flat", adoption_model="linear"):
+    """
+    Bounded-memory Monte Carlo simulation for very large numbers of paths.
+
+    Paths are simulated `chunk_size` at a time and folded into streaming statistics,
+    so memory is bounded by one chunk's projection whatever `n_paths` is. Every chunk
+    draws from its own seeded sub-stream, so the draws do not depend on the number of
+    processes; worker statistics are merged at the end. Quantiles, VaR and expected
+    shortfall come from a quantile sketch (rank error around 1e-4 at the default
+    compression); moments and P(x < 0) are exact. The draws differ from
+    `simulate_financials` with the same seed.
+
+    Parameters:
+    time_period (int): Number of years in the projection.
+    assumptions (dict): Base assumptions for the scenario.
+    distributions (dict): Assumption keys mapped to distribution tuples, see `draw_assumption`.
+    n_paths (int): Number of simulated paths.
+    seed (int): Seed for the random streams.
+    percentiles (tuple): Percentiles to report for every column.
+    chunk_size (int): Paths evaluated per engine call.
+    columns (tuple): Result columns (core.RESULT_COLUMNS) to summarise.
+    compression (int): Accuracy parameter of the quantile sketches.
+    tail_level (float): Tail probability of VaR and expected shortfall, e.g. 0.05.
+    processes (int | None): Worker processes, None for the available cores; 1 runs in-process.
+    time_step (str): Projection step, one of core.TIME_STEPS; the summary is yearly.
+    retention_model (str): One of core.RETENTION_MODELS.
+    adoption_model (str): One of core.ADOPTION_MODELS.
+
+    Returns:
+    dict:
+        "bands": column mapped to a DataFrame indexed by Year with one column per percentile.
+        "moments": column mapped to a DataFrame of mean, std, skewness, (excess) kurtosis, min and max per Year.
+        "tail_risk": column mapped to a DataFrame with "VaR" (the `tail_level` quantile) and
+                     "ES" (mean of the paths below it) per Year.
+        "prob_negative_roi": Series indexed by Year (when "roi" is summarised).
+        "tail_level", "n_paths": The tail probability and the number of paths.
+    """
+    n_chunks = -(-n_paths // chunk_size)
+    if processes is None:
+        from parameter_sweep import default_processes
+        processes = default_processes()
+    processes = max(1, min(processes, n_chunks))
+
+    tasks = [
+        (time_period, assumptions, distributions, n_paths, seed, chunk_size, columns, compression,
+         range(worker, n_chunks, processes), time_step, retention_model, adoption_model)
+        for worker in range(processes)
+    ]
+    if processes == 1:
+        parts = [_stream_worker(tasks[0])]
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # "spawn" keeps the workers safe to start from a multi-threaded server process.
+        with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            parts = list(pool.map(_stream_worker, tasks))
+
+    stats = parts[0]
+    for part in parts[1:]:
+        for column in columns:
+            stats[column].merge(part[column])
+    return _stream_summary(stats, time_period, percentiles, tail_level)
@@ -0,0 +1,42 @@
+import pandas as pd
+import streamlit as st
+
+import scenario_cache
+import scenario_store
+import visuals
+
+# ---------------- Admin Page ----------------
+
+st.header("Administración")
+
+# Results cache shared by the sessions of this server (or all replicas with the disk backend)
+st.subheader("Caché de resultados")
+cache = scenario_cache.get_cache()
+stats = scenario_cache.cache_stats(cache)
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Tasa de aciertos", f"{stats['hit_rate']:.1%}")
+col2.metric("Entradas", f"{stats['entries']:,} / {stats['max_entries']:,}")
+col3.metric("Tamaño (MB)", f"{stats['nbytes'] / 1024**2:,.1f}")
+col4.metric("Peticiones deduplicadas", f"{stats['deduplicated']:,}")
+st.dataframe(pd.DataFrame({"Valor": pd.Series(stats, dtype=object).astype(str)}), width=600)
+if st.button("Vaciar caché"):
+    cache.clear()
+    st.rerun()
+
+# Rendered waterfall charts
+st.subheader("Caché de gráficos")
+chart_stats = visuals.waterfall_cache.stats()
+col1, col2, col3 = st.columns(3)
+col1.metric("Tasa de aciertos", f"{chart_stats['hit_rate']:.1%}")
+col2.metric("Gráficos", f"{chart_stats['entries']:,} / {chart_stats['max_entries']:,}")
+col3.metric("Tamaño (MB)", f"{chart_stats['nbytes'] / 1024**2:,.1f}")
+
+# Persistent scenario and result store
+st.subheader("Almacén de escenarios")
+store = scenario_store.get_store()
+store_stats = store.stats()
+col1, col2, col3 = st.columns(3)
+col1.metric("Escenarios guardados", f"{store_stats['scenarios']:,}")
+col2.metric("Resultados", f"{store_stats['results']:,}")
+col3.metric("Tamaño (MB)", f"{store_stats['nbytes'] / 1024**2:,.1f} / {store_stats['max_bytes'] / 1024**2:,.0f}")
+st.dataframe(store.list_scenarios(), width=1200)
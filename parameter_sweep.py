@@ -0,0 +1,252 @@
+"""
+Full-factorial parameter sweeps over a process pool.
+
+The grid is never materialised: every grid point is identified by its flat
+index, and workers rebuild the swept assumption values of a chunk from the
+small axis arrays with `np.unravel_index`. The axes and the result cube live in
+shared memory, created once by the parent and attached by every worker when the
+pool starts, so tasks only carry a chunk number and write their results in
+place. Chunks are fixed by `chunk_size` (by default derived from the horizon and
+time step), not by the number of processes, so results (including any random
+draws) do not depend on the pool size.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import financial_core as core
+
+# ---------------- Shared Buffers ----------------
+
+def _create_shared(shape, dtype):
+    dtype = np.dtype(dtype)
+    nbytes = max(int(np.prod(shape)) * dtype.itemsize, 1)
+    buffer = shared_memory.SharedMemory(create=True, size=nbytes)
+    return buffer, np.ndarray(shape, dtype=dtype, buffer=buffer.buf)
+
+def _attach_shared(name, shape, dtype):
+    # Before Python 3.13 attaching also registers the block with the resource tracker.
+    # Spawned workers share the parent's tracker, where the name is already
+    # registered, so that is harmless; the parent unlinks the block.
+    try:
+        buffer = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        buffer = shared_memory.SharedMemory(name=name)
+    return buffer, np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer.buf)
+
+# ---------------- Workers ----------------
+
+_worker = {}
+
+def _init_worker(spec):
+    """
+    Attach the shared axes and result buffers once per worker process.
+    """
+    buffers = []
+    axes = []
+    for name, length in spec["axes"]:
+        buffer, axis = _attach_shared(name, (length,), np.float64)
+        buffers.append(buffer)
+        axes.append(axis)
+    output_buffer, output = _attach_shared(spec["output"], spec["output_shape"], spec["dtype"])
+    buffers.append(output_buffer)
+    _worker.update(spec=spec, axes=axes, output=output, buffers=buffers)
+
+def _run_chunk(chunk):
+    """
+    Evaluate grid points [chunk * chunk_size, (chunk + 1) * chunk_size) into the result buffer.
+    """
+    spec, axes, output = _worker["spec"], _worker["axes"], _worker["output"]
+    start = chunk * spec["chunk_size"]
+    stop = min(start + spec["chunk_size"], spec["n_points"])
+    indices = np.unravel_index(np.arange(start, stop), spec["dims"])
+
+    inputs = dict(spec["base"])
+    for key, axis, index in zip(spec["keys"], axes, indices):
+        inputs[key] = axis[index]
+    if spec["distributions"]:
+        # One stream per chunk: the same chunk draws the same numbers in any process.
+        from monte_carlo import draw_assumption
+
+        rng = np.random.default_rng(np.random.SeedSequence(spec["seed"], spawn_key=(chunk,)))
+        for key, distribution in spec["distributions"]:
+            inputs[key] = draw_assumption(distribution, stop - start, rng)
+
+    result = core.calculate_financials_batch(spec["time_period"], inputs, time_step=spec["time_step"],
+                                             retention_model=spec["retention_model"],
+                                             adoption_model=spec["adoption_model"])
+    # Sub-yearly steps are summed (flows) or read at year end (running totals) first.
+    yearly = core.aggregate_to_years(result)
+    for c, column in enumerate(spec["columns"]):
+        output[c, :, start:stop] = yearly[column][:, spec["years"]].T
+    return stop - start
+
+# ---------------- Sweep ----------------
+
+class SweepResult:
+    """
+    N-dimensional result cube of a sweep.
+
+    Attributes:
+    cube (np.ndarray): Array of shape (columns, years, *axis lengths).
+    columns (list[str]): Output columns (core.RESULT_COLUMNS) on the first axis.
+    years (list[int]): Years on the second axis.
+    axes (dict): Swept assumption mapped to its values, in grid axis order.
+    """
+
+    def __init__(self, cube, columns, years, axes):
+        self.cube = cube
+        self.columns = list(columns)
+        self.years = list(years)
+        self.axes = axes
+
+    @property
+    def shape(self):
+        return self.cube.shape[2:]
+
+    def slice(self, column, year=None, **fixed):
+        """
+        Values of one output over the grid with some assumptions fixed.
+
+        Parameters:
+        column (str): Output column.
+        year (int): Year, defaults to the last swept year.
+        **fixed: Swept assumption mapped to a value; the nearest grid value is used.
+            Assumptions not fixed (and not reduced) stay as axes.
+
+        Returns:
+        pd.DataFrame | pd.Series | np.ndarray: A DataFrame (rows: first free assumption,
+            columns: second) when two assumptions remain, a Series for one, an array otherwise.
+        """
+        year = self.years[-1] if year is None else year
+        values = self.cube[self.columns.index(column), self.years.index(year)]
+        selection = []
+        free = []
+        for key, axis in self.axes.items():
+            if key in fixed:
+                selection.append(int(np.abs(axis - fixed[key]).argmin()))
+            else:
+                selection.append(slice(None))
+                free.append(key)
+        values = values[tuple(selection)]
+        if len(free) == 2:
+            return pd.DataFrame(values, index=pd.Index(self.axes[free[0]], name=free[0]),
+                                columns=pd.Index(self.axes[free[1]], name=free[1]))
+        if len(free) == 1:
+            return pd.Series(values, index=pd.Index(self.axes[free[0]], name=free[0]), name=column)
+        return values
+
+def default_processes():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def sweep(time_period, assumptions, grid, columns=("cumulative_profit", "roi"), years=None, processes=None,
+          chunk_size=None, distributions=None, seed=0, time_step="year", retention_model="flat",
+          dtype=np.float32, adoption_model="linear", max_chunk_elements=4_000_000):
+    """
+    Evaluate the projection on the full factorial grid of `grid`.
+
+    Example: ROI heatmap over chatbot adoption and chatbot cost:
+        result = sweep(6, assumptions, {
+            "chatbot_increase_rate": np.linspace(0, 0.2, 200),
+            "avg_chatbot_cost_per_interaction": np.linspace(0.1, 0.6, 100),
+            "recurring_monthly_costs": np.linspace(20_000, 80_000, 50),
+        }, processes=8)
+        result.slice("roi", recurring_monthly_costs=50_000)
+
+    Parameters:
+    time_period (int): Number of years in the projection.
+    assumptions (dict): Base assumptions; swept keys are overridden.
+    grid (dict): Assumption key mapped to the 1-D array of values it takes.
+    columns (tuple): Output columns (core.RESULT_COLUMNS) stored in the cube.
+    years (list[int] | None): Years stored in the cube, defaults to the last year.
+    processes (int | None): Worker processes, defaults to the available cores; 1 runs in-process.
+    chunk_size (int | None): Grid points per task; by default as many as fit in
+        `max_chunk_elements` grid point x period cells.
+    distributions (dict | None): Optional assumptions drawn at random per grid point
+        (see `monte_carlo.draw_assumption`), from one seeded stream per chunk.
+    seed (int): Seed of the per-chunk streams.
+    time_step (str): Projection step, one of core.TIME_STEPS.
+    retention_model (str): One of core.RETENTION_MODELS.
+    dtype (np.dtype): Storage type of the cube.
+    adoption_model (str): One of core.ADOPTION_MODELS.
+    max_chunk_elements (int): Bound on the grid point x period cells of one task, which
+        bounds the intermediate arrays of long horizons and sub-yearly steps.
+
+    Returns:
+    SweepResult: The result cube with its axes.
+    """
+    for key in list(grid) + list(distributions or {}):
+        if key not in core.PROJECTION_KEYS:
+            raise KeyError(f"'{key}' is not a projection assumption.")
+    years = [time_period] if years is None else list(years)
+    if chunk_size is None:
+        chunk_size = max(1, max_chunk_elements // ((time_period + 1) * core.TIME_STEPS[time_step]))
+    axes = {key: np.asarray(values, dtype=np.float64).ravel() for key, values in grid.items()}
+    dims = tuple(len(axis) for axis in axes.values())
+    n_points = int(np.prod(dims))
+    n_chunks = -(-n_points // chunk_size)
+    processes = min(processes or default_processes(), max(n_chunks, 1))
+
+    buffers = []
+    try:
+        shared_axes = []
+        axis_arrays = []
+        for axis in axes.values():
+            buffer, array = _create_shared(axis.shape, np.float64)
+            array[:] = axis
+            buffers.append(buffer)
+            axis_arrays.append(array)
+            shared_axes.append((buffer.name, len(axis)))
+        output_shape = (len(columns), len(years), n_points)
+        output_buffer, output = _create_shared(output_shape, dtype)
+        buffers.append(output_buffer)
+
+        spec = {
+            "axes": shared_axes,
+            "output": output_buffer.name,
+            "output_shape": output_shape,
+            "dtype": np.dtype(dtype).str,
+            "keys": list(axes),
+            "dims": dims,
+            "n_points": n_points,
+            "chunk_size": chunk_size,
+            "base": {key: value for key, value in assumptions.items() if key in core.PROJECTION_KEYS},
+            "distributions": sorted((distributions or {}).items()),
+            "seed": seed,
+            "columns": list(columns),
+            "years": years,
+            "time_period": time_period,
+            "time_step": time_step,
+            "retention_model": retention_model,
+            "adoption_model": adoption_model,
+        }
+
+        if processes <= 1:
+            # Same code path as a worker, using the parent's views of the buffers.
+            _worker.update(spec=spec, axes=axis_arrays, output=output)
+            try:
+                for chunk in range(n_chunks):
+                    _run_chunk(chunk)
+            finally:
+                _worker.clear()
+        else:
+            # "spawn" keeps the workers safe to start from a multi-threaded server process.
+            with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(spec,)) as pool:
+                for _ in pool.map(_run_chunk, range(n_chunks)):
+                    pass
+
+        cube = output.reshape((len(columns), len(years)) + dims).copy()
+        del output, axis_arrays
+    finally:
+        for buffer in buffers:
+            buffer.close()
+            buffer.unlink()
+    return SweepResult(cube, columns, years, axes)
@@ -0,0 +1,153 @@
+"""
+Lightweight per-stage timing of Streamlit reruns (or any other unit of work).
+
+A run is started with `start_run` and finished with `end_run`; in between,
+`stage` blocks and `timed` functions add their wall time to the run of the
+current thread. Outside a run both are a thread-local lookup and nothing else,
+so the instrumentation can stay in the hot path. Every finished run is logged
+as one JSON line on the "financial_analysis.profiling" logger and feeds rolling
+per-stage histories used for the p50/p95 of the debug panel.
+
+Set PROFILE_STAGES=1 to time every run regardless of the debug panel.
+"""
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+logger = logging.getLogger("financial_analysis.profiling")
+
+# Time every run, not only those of sessions with the debug panel open.
+ALWAYS_ON = os.environ.get("PROFILE_STAGES", "") not in ("", "0")
+
+_local = threading.local()
+_NULL = contextlib.nullcontext()
+
+# ---------------- Runs ----------------
+
+class _Run:
+    __slots__ = ("label", "start", "stages")
+
+    def __init__(self, label):
+        self.label = label
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+class _Stage:
+    __slots__ = ("run", "name", "start")
+
+    def __init__(self, run, name):
+        self.run = run
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.run.add(self.name, time.perf_counter() - self.start)
+
+class StageHistory:
+    """
+    Rolling window of stage durations shared by every session of the process.
+
+    Parameters:
+    window (int): Number of runs kept per stage.
+    """
+
+    def __init__(self, window=200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations = {}
+
+    def record(self, stages):
+        with self._lock:
+            for name, seconds in stages.items():
+                self._durations.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def summary(self, percentiles=(50, 95)):
+        """
+        Returns:
+        dict: Stage name mapped to {"runs", "p50_ms", "p95_ms", ...} over the window.
+        """
+        with self._lock:
+            durations = {name: np.array(values) for name, values in self._durations.items()}
+        summary = {}
+        for name, values in durations.items():
+            row = {"runs": len(values)}
+            for p, value in zip(percentiles, np.percentile(values, percentiles) * 1000):
+                row[f"p{p:g}_ms"] = float(value)
+            summary[name] = row
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self._durations.clear()
+
+history = StageHistory()
+
+def start_run(label="rerun"):
+    """
+    Start timing a run on the current thread (replacing any unfinished one).
+    """
+    _local.run = _Run(label)
+
+def end_run():
+    """
+    Finish the current thread's run, log it and add it to `history`.
+
+    Returns:
+    dict | None: {"label", "total_ms", "stages": {name: ms}}, None if no run was started.
+    """
+    run = getattr(_local, "run", None)
+    if run is None:
+        return None
+    _local.run = None
+    total = time.perf_counter() - run.start
+    run.add("total", total)
+    history.record(run.stages)
+    record = {
+        "label": run.label,
+        "total_ms": round(total * 1000, 3),
+        "stages": {name: round(seconds * 1000, 3) for name, seconds in run.stages.items() if name != "total"},
+    }
+    logger.info(json.dumps(record))
+    return record
+
+# ---------------- Timers ----------------
+
+def stage(name):
+    """
+    Context manager timing a block as stage `name` of the current run; a no-op outside a run.
+
+    Nested stages are recorded separately, so their times also count in the enclosing stage.
+    """
+    run = getattr(_local, "run", None)
+    return _NULL if run is None else _Stage(run, name)
+
+def timed(name=None):
+    """
+    Decorator timing every call of a function as stage `name` (default: the function name).
+    """
+    def decorate(function):
+        stage_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            run = getattr(_local, "run", None)
+            if run is None:
+                return function(*args, **kwargs)
+            with _Stage(run, stage_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,560 @@
+import contextlib
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import financial_core as core
+import helper_functions as hf
+
+# ---------------- Scenario Evaluation Cache ----------------
+
+def _canonical(value):
+    """
+    Convert an assumption value into a JSON-serialisable canonical form.
+    """
+    if isinstance(value, dict):
+        return {str(key): _canonical(value[key]) for key in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return {"__ndarray__": value.dtype.str, "shape": value.shape, "data": value.tolist()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and value.is_integer():
+        # 2_000_000 and 2_000_000.0 describe the same scenario.
+        return int(value)
+    return value
+
+def assumptions_hash(assumptions, *extra):
+    """
+    Stable content hash of an assumptions dict.
+
+    Parameters:
+    assumptions (dict): Assumptions for the scenario.
+    *extra: Additional values that are part of the key (e.g. years).
+
+    Returns:
+    str: Hex SHA-256 digest, independent of key order and of the Python process.
+    """
+    payload = json.dumps([_canonical(assumptions), _canonical(list(extra))], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _result_nbytes(value):
+    """
+    Approximate in-memory size of a cached result in bytes.
+    """
+    if hasattr(value, "memory_usage"):
+        # DataFrame.memory_usage is per column, Series.memory_usage a single int.
+        return int(np.sum(value.memory_usage(index=True, deep=True)))
+    if hasattr(value, "nbytes"):
+        # np.ndarray and result objects such as segments.SegmentResult.
+        return int(value.nbytes)
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_result_nbytes(item) for item in value.values())
+    return 0
+
+class LRUCache:
+    """
+    Size-bounded least-recently-used cache with hit/miss/eviction counters.
+    Safe to share between the threads of concurrent Streamlit sessions.
+
+    Parameters:
+    max_entries (int): Maximum number of cached results.
+    max_bytes (int | None): Optional bound on the total size of cached results.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None, record=True):
+        # record=False re-checks an entry without counting the lookup in the hit rate.
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += record
+                return self._entries[key][0]
+            self.misses += record
+            return default
+
+    def put(self, key, value):
+        nbytes = _result_nbytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self._nbytes += nbytes
+            self._evict()
+
+    def resize(self, max_entries, max_bytes=None):
+        with self._lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone exceeds max_bytes.
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self._nbytes > self.max_bytes)
+        ):
+            self._nbytes -= self._entries.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def lock(self, key):
+        # Entries live in this process only; `single_flight` already serialises its threads.
+        return contextlib.nullcontext()
+
+    def stats(self):
+        """
+        Returns:
+        dict: Current size, capacity and counters.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "nbytes": self._nbytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class DiskCache:
+    """
+    Size-bounded result cache in a directory shared by every process (and
+    replica, on a shared volume) that points at it.
+
+    Each entry is one pickle file named after its key. Reads refresh the file's
+    modification time, which eviction uses as the least-recently-used order.
+    Writes go through a temporary file and an atomic rename, and `lock` takes an
+    exclusive per-key file lock so concurrent processes compute a missing entry
+    once. Only point it at a directory written by this application.
+
+    Parameters:
+    root (str): Cache directory, created if needed.
+    max_entries (int): Maximum number of cached results.
+    max_bytes (int | None): Optional bound on the total size of the cache files.
+    """
+
+    def __init__(self, root, max_entries=10_000, max_bytes=1024**3):
+        self.root = root
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.join(root, "locks"), exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.pkl")
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def __len__(self):
+        return len(self._files())
+
+    def get(self, key, default=None, record=True):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            # Missing, or evicted by another process while being read.
+            with self._lock:
+                self.misses += record
+            return default
+        with self._lock:
+            self.hits += record
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+        self._evict()
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        try:
+            import fcntl
+        except ImportError:  # No advisory file locks (Windows): fall back to per-process de-duplication.
+            yield
+            return
+        with open(os.path.join(self.root, "locks", f"{key}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def resize(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def _files(self):
+        files = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(".pkl"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _evict(self):
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        # Always keep the most recent entry, even if it alone exceeds max_bytes.
+        while len(files) > 1 and (
+            len(files) > self.max_entries or (self.max_bytes is not None and total > self.max_bytes)
+        ):
+            _, size, path = files.pop(0)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def clear(self):
+        for _, _, path in self._files():
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+    def stats(self):
+        """
+        Returns:
+        dict: Current size and capacity of the shared directory, and this process's counters.
+        """
+        files = self._files()
+        lookups = self.hits + self.misses
+        return {
+            "backend": "disk",
+            "entries": len(files),
+            "max_entries": self.max_entries,
+            "nbytes": sum(size for _, size, _ in files),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "financial_analysis", "results")
+
+def _env_max_bytes(default):
+    value = os.environ.get("RESULT_CACHE_MAX_BYTES")
+    return default if value is None else int(value)
+
+# Cache backends selectable with $RESULT_CACHE_BACKEND; $RESULT_CACHE_MAX_BYTES bounds
+# either one. A networked backend only needs get/put/lock/resize/stats/clear and an entry here.
+CACHE_BACKENDS = {
+    "memory": lambda: LRUCache(max_bytes=_env_max_bytes(None)),
+    "disk": lambda: DiskCache(os.environ.get("RESULT_CACHE_DIR", DEFAULT_CACHE_DIR), max_bytes=_env_max_bytes(1024**3)),
+}
+
+_headless_cache = None
+
+def _new_cache():
+    backend = os.environ.get("RESULT_CACHE_BACKEND", "memory")
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"Unknown cache backend '{backend}', expected one of {', '.join(CACHE_BACKENDS)}.")
+    return CACHE_BACKENDS[backend]()
+
+def get_cache(max_entries=None, max_bytes=None):
+    """
+    Return the process-wide results cache.
+
+    The backend is chosen with $RESULT_CACHE_BACKEND ("memory", the default, or
+    "disk" at $RESULT_CACHE_DIR to share results between processes and replicas).
+    Inside a Streamlit app the cache is held with `st.cache_resource`, so it
+    survives reruns and is shared by sessions of the same server. In headless use
+    (streamlit not installed or no script run context) a module-level instance is used.
+
+    Parameters:
+    max_entries (int | None): If given, capacity applied to the cache.
+    max_bytes (int | None): If given, size bound applied to the cache.
+
+    Returns:
+    LRUCache | DiskCache: The shared cache.
+    """
+    global _headless_cache
+    cache = None
+    try:
+        import streamlit as st
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        if get_script_run_ctx(suppress_warning=True) is not None:
+            cache = st.cache_resource(_new_cache)()
+    except ImportError:
+        pass
+
+    if cache is None:
+        if _headless_cache is None:
+            _headless_cache = _new_cache()
+        cache = _headless_cache
+
+    if max_entries is not None or max_bytes is not None:
+        cache.resize(cache.max_entries if max_entries is None else max_entries,
+                     cache.max_bytes if max_bytes is None else max_bytes)
+    return cache
+
+class SingleFlight:
+    """
+    De-duplicates concurrent identical computations: while one thread computes a
+    key, other threads asking for the same key wait for its result instead of
+    computing it again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, compute):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "value": None, "error": None}
+            else:
+                self.shared += 1
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["value"]
+        try:
+            call["value"] = compute()
+            return call["value"]
+        except BaseException as error:
+            call["error"] = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+_single_flight = SingleFlight()
+
+def get_or_compute(key, compute, cache=None):
+    """
+    Cached value of `key`, computing it with `compute()` on a miss.
+
+    Concurrent misses on the same key compute it once: threads of this process
+    share the leader's result and, with a backend that locks across processes
+    (`DiskCache`), other processes wait for the entry and read it.
+
+    Parameters:
+    key (str): Cache key, e.g. from `assumptions_hash`.
+    compute (callable): Function without arguments returning the value.
+    cache (LRUCache | DiskCache): Cache to use, defaults to `get_cache()`.
+
+    Returns:
+    The cached or computed value (shared, do not modify it in place).
+    """
+    cache = get_cache() if cache is None else cache
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    def load_or_compute():
+        with cache.lock(key):
+            # Another thread or process may have stored it while we waited.
+            value = cache.get(key, record=False)
+            if value is None:
+                value = compute()
+                cache.put(key, value)
+            return value
+
+    return _single_flight.do(key, load_or_compute)
+
+def cache_stats(cache=None):
+    """
+    Returns:
+    dict: Statistics of the results cache plus the number of requests served by single-flight de-duplication.
+    """
+    cache = get_cache() if cache is None else cache
+    return {**cache.stats(), "deduplicated": _single_flight.shared}
+
+def cached_calculate_financials(time_period, assumptions, no_implementation=False, time_step="year",
+                                retention_model="flat", cache=None, store=None, adoption_model="linear"):
+    """
+    Memoized `hf.calculate_financials`.
+
+    Lookups go to the in-memory cache first, then to the persistent `store` (if
+    given); results computed here are written to both.
+
+    Parameters:
+    time_period (int): Number of years in the projection.
+    assumptions (dict): Dictionary containing all model assumptions.
+    no_implementation (bool): Passed through to `calculate_financials`.
+    time_step (str): Passed through to `calculate_financials`.
+    retention_model (str): Passed through to `calculate_financials`.
+    cache (LRUCache): Cache to use, defaults to `get_cache()`.
+    store (scenario_store.ScenarioStore | None): Optional persistent result store.
+    adoption_model (str): Passed through to `calculate_financials`.
+
+    Returns:
+    pd.DataFrame: A copy of the cached yearly financial metrics.
+    """
+    cache = get_cache() if cache is None else cache
+    key = assumptions_hash(assumptions, time_period, no_implementation, time_step, retention_model, adoption_model,
+                           core.MODEL_VERSION)
+    use_store = store is not None and not no_implementation
+
+    def compute():
+        df = store.get_result(time_period, assumptions, time_step, retention_model, adoption_model) if use_store else None
+        if df is None:
+            df = hf.calculate_financials(time_period, assumptions, no_implementation, time_step, retention_model,
+                                         adoption_model)
+            if use_store:
+                store.put_result(time_period, assumptions, df, time_step, retention_model, adoption_model)
+        return df
+
+    # Callers may add columns or sort in place, never hand out the cached object.
+    return get_or_compute(key, compute, cache).copy()
+
+def cached_calculate_financials_scenarios(time_period, assumptions_list, time_step="year", retention_model="flat",
+                                          cache=None, store=None, adoption_model="linear"):
+    """
+    Memoized `hf.calculate_financials_scenarios`: scenarios found in the cache (or
+    the persistent `store`, if given) are served from it and all the others are
+    evaluated together in one batch call. Entries are shared with
+    `cached_calculate_financials`; concurrent requests for the same missing
+    scenarios are de-duplicated within the process.
+
+    Parameters:
+    time_period (int): Number of years in the projection.
+    assumptions_list (list[dict]): One assumptions dictionary per scenario.
+    time_step (str): Passed through to `calculate_financials_scenarios`.
+    retention_model (str): Passed through to `calculate_financials_scenarios`.
+    cache (LRUCache): Cache to use, defaults to `get_cache()`.
+    store (scenario_store.ScenarioStore | None): Optional persistent result store.
+    adoption_model (str): Passed through to `calculate_financials_scenarios`.
+
+    Returns:
+    list[pd.DataFrame]: Copies of the yearly financial metrics, in input order.
+    """
+    cache = get_cache() if cache is None else cache
+    keys = [
+        assumptions_hash(assumptions, time_period, False, time_step, retention_model, adoption_model, core.MODEL_VERSION)
+        for assumptions in assumptions_list
+    ]
+    dfs = [cache.get(key) for key in keys]
+
+    missing = [i for i, df in enumerate(dfs) if df is None]
+
+    def compute_missing():
+        # Only the frames of the missing keys are returned: callers sharing this flight
+        # have the same missing keys but may differ in the scenarios they already had.
+        # Re-check: an identical batch may have filled the cache while this one waited.
+        found = [cache.get(keys[i], record=False) for i in missing]
+        for j, i in enumerate(missing):
+            if found[j] is None and store is not None:
+                found[j] = store.get_result(time_period, assumptions_list[i], time_step, retention_model,
+                                            adoption_model)
+                if found[j] is not None:
+                    cache.put(keys[i], found[j])
+        to_compute = [j for j, df in enumerate(found) if df is None]
+        if to_compute:
+            computed = hf.calculate_financials_scenarios(time_period, [assumptions_list[missing[j]] for j in to_compute],
+                                                         time_step, retention_model, adoption_model)
+            for j, df in zip(to_compute, computed):
+                i = missing[j]
+                cache.put(keys[i], df)
+                if store is not None:
+                    store.put_result(time_period, assumptions_list[i], df, time_step, retention_model, adoption_model)
+                found[j] = df
+        return found
+
+    if missing:
+        # Concurrent requests for the same set of missing scenarios share one batch evaluation.
+        computed = _single_flight.do(assumptions_hash([keys[i] for i in missing]), compute_missing)
+        for i, df in zip(missing, computed):
+            dfs[i] = df
+    return [df.copy() for df in dfs]
+
+def simulation_key(time_period, assumptions, distributions, n_paths=100_000, seed=0, percentiles=(5, 25, 50, 75, 95),
+                   time_step="year", retention_model="flat", adoption_model="linear"):
+    """
+    Cache key of a Monte Carlo simulation; simulations are deterministic in their seed,
+    so the key covers every argument that changes the result.
+    """
+    return assumptions_hash(assumptions, "simulate_financials", time_period, distributions, n_paths, seed,
+                            list(percentiles), time_step, retention_model, adoption_model, core.MODEL_VERSION)
+
+def cached_simulate_financials(time_period, assumptions, distributions, n_paths=100_000, seed=0,
+                               percentiles=(5, 25, 50, 75, 95), cache=None, time_step="year", retention_model="flat",
+                               adoption_model="linear"):
+    """
+    Memoized `monte_carlo.simulate_financials`, with single-flight de-duplication.
+
+    Returns:
+    dict: The cached simulation result (shared, do not modify it in place).
+    """
+    import monte_carlo
+
+    key = simulation_key(time_period, assumptions, distributions, n_paths, seed, percentiles, time_step,
+                         retention_model, adoption_model)
+    return get_or_compute(
+        key,
+        lambda: monte_carlo.simulate_financials(time_period, assumptions, distributions, n_paths, seed, percentiles,
+                                                time_step=time_step, retention_model=retention_model,
+                                                adoption_model=adoption_model),
+        cache,
+    )
+
+def cached_evaluate_segments(time_period, segment_table, assumptions, time_step="year", retention_model="flat",
+                             cache=None, adoption_model="linear"):
+    """
+    Memoized `segments.evaluate_segments`, with single-flight de-duplication. Drill-downs
+    are roll-ups of the cached result, so they never re-run the projection.
+
+    Returns:
+    segments.SegmentResult: The cached result (shared, do not modify it in place).
+    """
+    import segments
+
+    key = assumptions_hash(assumptions, "evaluate_segments", time_period, time_step, retention_model, adoption_model,
+                           segments.segments_hash(segment_table), core.MODEL_VERSION)
+    return get_or_compute(
+        key,
+        lambda: segments.evaluate_segments(time_period, segment_table, assumptions, time_step, retention_model,
+                                           adoption_model=adoption_model),
+        cache,
+    )
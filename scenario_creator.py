@@ -1,13 +1,15 @@
 import streamlit as st
 import sys
 import os
-from scipy.special import expit  # For logistic growth
 # Add the docs/financial_analysis directory to the Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'docs', 'financial_analysis'))
 
-import helper_functions as hf
+import profiling
+import scenario_cache
+import scenario_store
 import assumptions_config as ac
 import elements_streamlit as elements
+import helper_functions as hf
 
 ##### NEEDED:
 # If there is no investment, the costs are 0 per month, ROI is 100% the costs cannot be the same in a model where 
@@ -18,21 +20,55 @@ st.set_page_config(layout="wide")
 
 # ---------------- Streamlit Application ----------------
 
+# Time the stages of this rerun when the debug panel is open (or PROFILE_STAGES is set)
+debug_panel = st.session_state.get("debug_panel", False)
+if debug_panel or profiling.ALWAYS_ON:
+    profiling.start_run()
+
 # In main flow:
-st.sidebar.header("Configuración de los escenarios")
+with profiling.stage("sidebar"):
+    st.sidebar.header("Configuración de los escenarios")
+
+    # Time frame outside scenarios for shared configuration
+    years = ac.scenario_timeframe()
+    time_step = ac.scenario_time_step()
+    retention_model = ac.scenario_retention_model()
+    adoption_model = ac.scenario_adoption_model()
+
+    # Scenarios come from an uploaded file or from collapsible sidebar configurations
+    assumptions_by_scenario = ac.scenarios_file()
+    if assumptions_by_scenario is None:
+        assumptions_by_scenario = {}
+        for i in range(ac.scenario_count()):
+            scenario_name = f"Escenario {i + 1}"
+            st.sidebar.subheader(scenario_name)
+            assumptions_by_scenario[scenario_name] = elements.create_scenario_config(scenario_name)
 
-# Time frame outside scenarios for shared configuration
-years = ac.scenario_timeframe()
+    # Saved scenarios from the persistent store can be added to the comparison
+    store = scenario_store.get_store()
+    assumptions_by_scenario.update(elements.saved_scenarios_panel(store, assumptions_by_scenario))
 
-# Create collapsible scenario configurations
-st.sidebar.subheader("Escenario 1")
-assumptions1 = elements.create_scenario_config("Escenario 1")
-st.sidebar.subheader("Escenario 2")
-assumptions2 = elements.create_scenario_config("Escenario 2")
+    # Optional segment table: every scenario is then evaluated per segment and rolled up
+    segment_table = ac.segments_file()
 
-# Create DataFrames
-df1 = hf.calculate_financials(years, assumptions1)
-df2 = hf.calculate_financials(years, assumptions2)
+# Create DataFrames in one batch (scenarios computed before are served from the cache or the store)
+with profiling.stage("calculate_financials"):
+    if segment_table is None:
+        segment_results = None
+        scenario_dfs = dict(zip(
+            assumptions_by_scenario,
+            scenario_cache.cached_calculate_financials_scenarios(years, list(assumptions_by_scenario.values()),
+                                                                 time_step=time_step, retention_model=retention_model,
+                                                                 store=store, adoption_model=adoption_model)
+        ))
+    else:
+        segment_results = {
+            name: scenario_cache.cached_evaluate_segments(years, segment_table, assumptions, time_step, retention_model,
+                                                          adoption_model=adoption_model)
+            for name, assumptions in assumptions_by_scenario.items()
+        }
+        # The portfolio totals feed the comparison views below.
+        scenario_dfs = {name: hf.to_frame(result.rollup()[1]) for name, result in segment_results.items()}
 
 # ---------------- Visualization ----------------
 
@@ -41,16 +77,50 @@ st.header("Análisis de sensibilidad de la implementación de Paco")
 
 # Scenario Metrics Comparison
 st.subheader("Comparación de Métricas de Escenarios")
-elements.scenario_metrics_comparison(df1, df2)
+with profiling.stage("metrics_comparison"):
+    elements.scenario_metrics_comparison(scenario_dfs)
 
 # Scenario Comparison
 st.subheader("Comparación de Escenarios")
-elements.scenario_comparison(df1, df2)
+with profiling.stage("scenario_comparison"):
+    elements.scenario_comparison(scenario_dfs)
+
+# Investment Metrics
+st.subheader("Métricas de Inversión")
+with profiling.stage("investment_metrics"):
+    elements.investment_metrics_comparison(scenario_dfs)
 
 # Cumulative Profit Contribution
 st.subheader("Contribución Acumulada al Beneficio")
-elements.cumulative_profit_contribution(df1, df2)
+with profiling.stage("waterfalls"):
+    elements.cumulative_profit_contribution(scenario_dfs)
+
+# Segment drill-down
+if segment_results is not None:
+    st.subheader("Análisis por Segmentos")
+    with profiling.stage("segments"):
+        elements.segment_drilldown(segment_results)
+
+# Sensitivity Analysis
+st.subheader("Análisis de Sensibilidad")
+with profiling.stage("sensitivities"):
+    elements.sensitivity_tornado(years, assumptions_by_scenario, time_step=time_step, retention_model=retention_model,
+                                 adoption_model=adoption_model)
+
+# Monte Carlo Simulation (runs in the background, refined progressively)
+st.subheader("Simulación Monte Carlo")
+with profiling.stage("monte_carlo"):
+    elements.monte_carlo_simulation(years, assumptions_by_scenario, time_step=time_step,
+                                    retention_model=retention_model, adoption_model=adoption_model)
 
 # Assumptions Comparison Table
 st.subheader("Tabla de Comparación de Supuestos")
-elements.assumptions_comparison_table(assumptions1, assumptions2)
\ No newline at end of file
+with profiling.stage("assumptions_table"):
+    elements.assumptions_comparison_table(assumptions_by_scenario)
+
+# Debug panel: stage timings of this rerun and rolling percentiles over recent reruns
+st.sidebar.checkbox("Panel de depuración", key="debug_panel")
+run = profiling.end_run()
+if debug_panel:
+    st.subheader("Depuración: tiempos por etapa")
+    elements.profiling_panel(run)
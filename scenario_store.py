@@ -0,0 +1,276 @@
+"""
+Persistent content-addressed store of scenarios and results.
+
+Metadata lives in a SQLite database and every result in its own Parquet file
+under the store directory. Results are keyed by a content hash of the
+assumptions, the horizon, the model options and `core.MODEL_VERSION`, so the
+same scenario computed by any analyst or session is only evaluated once.
+Results of an older model version are discarded when the store is opened, and
+the total size of the result files is capped by pruning the least recently
+used ones.
+"""
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+import financial_core as core
+from scenario_cache import _canonical, assumptions_hash
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "financial_analysis", "store")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    name TEXT PRIMARY KEY,
+    assumptions_hash TEXT NOT NULL,
+    assumptions TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    assumptions_hash TEXT NOT NULL,
+    time_period INTEGER NOT NULL,
+    time_step TEXT NOT NULL,
+    retention_model TEXT NOT NULL,
+    adoption_model TEXT NOT NULL DEFAULT 'linear',
+    model_version TEXT NOT NULL,
+    path TEXT NOT NULL,
+    nbytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access);
+"""
+
+# ---------------- Scenario Store ----------------
+
+class ScenarioStore:
+    """
+    Named assumption sets and yearly results persisted on disk.
+
+    Parameters:
+    root (str): Store directory, created if needed.
+    max_bytes (int | None): Cap on the total size of the result files; the least
+        recently used results are pruned beyond it.
+    model_version (str): Model version of the results served and written.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR, max_bytes=512 * 1024**2, model_version=core.MODEL_VERSION):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.model_version = str(model_version)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "results"), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+            if "adoption_model" not in columns:
+                # Stores created before the adoption models only hold linear-adoption results.
+                conn.execute("ALTER TABLE results ADD COLUMN adoption_model TEXT NOT NULL DEFAULT 'linear'")
+        self.invalidate_stale()
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # One short-lived connection per operation keeps the store usable from any thread.
+        conn = sqlite3.connect(os.path.join(self.root, "store.sqlite"), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ---------------- Scenarios ----------------
+
+    def save_scenario(self, name, assumptions):
+        """
+        Save (or overwrite) a named assumption set.
+
+        Returns:
+        str: Content hash of the assumptions.
+        """
+        content_hash = assumptions_hash(assumptions)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO scenarios (name, assumptions_hash, assumptions, created_at) VALUES (?, ?, ?, ?)",
+                (name, content_hash, json.dumps(_canonical(assumptions)), time.time()),
+            )
+        return content_hash
+
+    def load_scenario(self, name):
+        """
+        Returns:
+        dict: The saved assumptions.
+
+        Raises:
+        KeyError: If no scenario with that name is saved.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT assumptions FROM scenarios WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(f"No saved scenario named '{name}'.")
+        return json.loads(row[0])
+
+    def list_scenarios(self):
+        """
+        Returns:
+        pd.DataFrame: One row per saved scenario with its name, content hash and creation time.
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT name, assumptions_hash, created_at FROM scenarios ORDER BY name").fetchall()
+        scenarios = pd.DataFrame(rows, columns=["name", "assumptions_hash", "created_at"])
+        scenarios["created_at"] = pd.to_datetime(scenarios["created_at"], unit="s")
+        return scenarios
+
+    def delete_scenario(self, name):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM scenarios WHERE name = ?", (name,))
+
+    def diff_scenarios(self, name1, name2):
+        """
+        Assumptions that differ between two saved scenarios.
+
+        Returns:
+        pd.DataFrame: Indexed by assumption key, one column per scenario; keys only
+            present in one scenario show None for the other.
+        """
+        assumptions1, assumptions2 = self.load_scenario(name1), self.load_scenario(name2)
+        keys = sorted(set(assumptions1) | set(assumptions2))
+        rows = [
+            (key, assumptions1.get(key), assumptions2.get(key))
+            for key in keys
+            if assumptions1.get(key) != assumptions2.get(key)
+        ]
+        return pd.DataFrame(rows, columns=["assumption", name1, name2]).set_index("assumption")
+
+    # ---------------- Results ----------------
+
+    def result_key(self, time_period, assumptions, time_step="year", retention_model="flat", adoption_model="linear"):
+        return assumptions_hash(assumptions, time_period, time_step, retention_model, adoption_model, self.model_version)
+
+    def get_result(self, time_period, assumptions, time_step="year", retention_model="flat", adoption_model="linear"):
+        """
+        Yearly results of a scenario if they are stored, None otherwise.
+
+        Returns:
+        pd.DataFrame | None: The frame produced by `calculate_financials`.
+        """
+        key = self.result_key(time_period, assumptions, time_step, retention_model, adoption_model)
+        with self._connect() as conn:
+            row = conn.execute("SELECT path FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            path = os.path.join(self.root, row[0])
+            if not os.path.exists(path):
+                # Pruned by another process between the lookup and the read.
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+        return pd.read_parquet(path)
+
+    def put_result(self, time_period, assumptions, df, time_step="year", retention_model="flat", adoption_model="linear"):
+        """
+        Store the yearly results of a scenario and prune the store to `max_bytes`.
+        """
+        key = self.result_key(time_period, assumptions, time_step, retention_model, adoption_model)
+        relative_path = os.path.join("results", f"{key}.parquet")
+        path = os.path.join(self.root, relative_path)
+        # Write to a temporary file first so readers never see a partial file; the name is
+        # unique per writer so concurrent writers of the same result never share it.
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        df.to_parquet(temporary, index=False)
+        os.replace(temporary, path)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, assumptions_hash, time_period, time_step, retention_model, "
+                "adoption_model, model_version, path, nbytes, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, assumptions_hash(assumptions), int(time_period), time_step, retention_model, adoption_model,
+                 self.model_version, relative_path, os.path.getsize(path), now, now),
+            )
+        self.prune()
+
+    def _delete_results(self, conn, rows):
+        for key, relative_path in rows:
+            try:
+                os.remove(os.path.join(self.root, relative_path))
+            except FileNotFoundError:
+                pass
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def invalidate_stale(self):
+        """
+        Delete the results computed by another model version.
+
+        Returns:
+        int: Number of results deleted.
+        """
+        with self._lock, self._connect() as conn:
+            rows = conn.execute("SELECT key, path FROM results WHERE model_version != ?", (self.model_version,)).fetchall()
+            self._delete_results(conn, rows)
+        return len(rows)
+
+    def prune(self, max_bytes=None):
+        """
+        Delete least recently used results until the result files fit in `max_bytes`.
+
+        Returns:
+        int: Number of results deleted.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if max_bytes is None:
+            return 0
+        with self._lock, self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM results").fetchone()[0]
+            if total <= max_bytes:
+                return 0
+            victims = []
+            for key, relative_path, nbytes in conn.execute("SELECT key, path, nbytes FROM results ORDER BY last_access"):
+                if total <= max_bytes:
+                    break
+                victims.append((key, relative_path))
+                total -= nbytes
+            self._delete_results(conn, victims)
+        return len(victims)
+
+    def stats(self):
+        """
+        Returns:
+        dict: Number of saved scenarios and results, total result size and the cap.
+        """
+        with self._connect() as conn:
+            n_scenarios = conn.execute("SELECT COUNT(*) FROM scenarios").fetchone()[0]
+            n_results, nbytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM results").fetchone()
+        return {"scenarios": n_scenarios, "results": n_results, "nbytes": nbytes, "max_bytes": self.max_bytes}
+
+_headless_store = None
+
+def _new_store():
+    return ScenarioStore(os.environ.get("SCENARIO_STORE_DIR", DEFAULT_STORE_DIR))
+
+def get_store():
+    """
+    Return the process-wide scenario store, at $SCENARIO_STORE_DIR or DEFAULT_STORE_DIR.
+
+    Inside a Streamlit app it is held with `st.cache_resource`, like `scenario_cache.get_cache`.
+
+    Returns:
+    ScenarioStore: The shared store.
+    """
+    global _headless_store
+    try:
+        import streamlit as st
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        if get_script_run_ctx(suppress_warning=True) is not None:
+            return st.cache_resource(_new_store)()
+    except ImportError:
+        pass
+
+    if _headless_store is None:
+        _headless_store = _new_store()
+    return _headless_store
@@ -0,0 +1,222 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+import financial_core as core
+
+# ---------------- Segmented Portfolio ----------------
+# A segment table has one row per segment (e.g. region x product x channel):
+# attribute columns describe the segment and assumption columns (any of
+# core.PROJECTION_KEYS) override the scenario's assumptions for it. All segments
+# are evaluated in one batch and kept as a yearly (columns, segments, years)
+# block, so roll-ups and drill-downs are NumPy reductions over that block and
+# never re-run the projection.
+
+# Portfolio totals: the scenario's book of policies, contact volume and
+# implementation costs (incurred once for the whole portfolio). Unless the table
+# has its own column for one of them, every segment carries a share of the
+# scenario's total, so the segments add up to the unsegmented portfolio.
+VOLUME_KEYS = ["initial_insurance_company_health_policies", "avg_contacts_phone_web_daily"]
+COST_KEYS = ["first_year_costs", "recurring_monthly_costs"]
+
+# Yearly columns kept per segment: the projection outputs plus the discounted
+# cumulative costs needed to roll up the discounted ROI.
+SEGMENT_COLUMNS = core.RESULT_COLUMNS + ["discounted_cumulative_costs"]
+
+# Ratios are recomputed from the rolled-up totals instead of being summed.
+RATIO_COLUMNS = ["roi", "discounted_roi"]
+
+def read_segments(source, file_format=None):
+    """
+    Read a segment table.
+
+    Parameters:
+    source (str | file-like): CSV or Parquet file, e.g. a path or a Streamlit upload.
+    file_format (str | None): "csv" or "parquet", taken from the file name if None.
+
+    Returns:
+    pd.DataFrame: One row per segment.
+    """
+    if file_format is None:
+        name = source if isinstance(source, str) else getattr(source, "name", "")
+        file_format = "parquet" if os.path.splitext(name)[1].lower() in (".parquet", ".pq") else "csv"
+    segments = pd.read_parquet(source) if file_format == "parquet" else pd.read_csv(source)
+    return segments.reset_index(drop=True)
+
+def segment_attributes(segments):
+    """
+    Attribute columns of a segment table: every column that is not an assumption.
+    """
+    return [column for column in segments.columns if column not in core.PROJECTION_KEYS]
+
+def segments_hash(segments):
+    """
+    Content hash of a segment table, for cache keys.
+    """
+    digest = hashlib.sha256(",".join(map(str, segments.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(segments, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def segment_assumptions(segments, assumptions):
+    """
+    Assumption columns for the batch engine, one entry per segment.
+
+    Portfolio totals (VOLUME_KEYS and COST_KEYS) without a column in the table are
+    shared out by the segments' contact volume, or by their book of policies when
+    only that is given, or equally when the table has neither.
+
+    Parameters:
+    segments (pd.DataFrame): Segment table.
+    assumptions (dict): Scenario assumptions used where the table has no column.
+
+    Returns:
+    dict: Projection keys mapped to scalars or (N,) arrays.
+    """
+    n_segments = len(segments)
+    inputs = {
+        key: segments[key].to_numpy(dtype=np.float64) if key in segments.columns
+        else assumptions.get(key, core.DEFAULT_ASSUMPTIONS[key])
+        for key in core.PROJECTION_KEYS
+    }
+    share = np.full(n_segments, 1 / max(n_segments, 1))
+    for key in VOLUME_KEYS:
+        if key in segments.columns:
+            volume = inputs[key]
+            if volume.sum() > 0:
+                share = volume / volume.sum()
+            break
+    for key in VOLUME_KEYS + COST_KEYS:
+        if key not in segments.columns:
+            inputs[key] = inputs[key] * share
+    return inputs
+
+class SegmentResult:
+    """
+    Yearly projection of every segment of a portfolio, with roll-ups by segment attributes.
+
+    Parameters:
+    data (np.ndarray): (len(SEGMENT_COLUMNS), N, years) block in raw units.
+    attributes (pd.DataFrame): Attribute columns of the N segments.
+    """
+
+    def __init__(self, data, attributes):
+        self.data = data
+        self.attributes = attributes.reset_index(drop=True)
+
+    @property
+    def n_segments(self):
+        return self.data.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + int(self.attributes.memory_usage(index=True, deep=True).sum())
+
+    def mask(self, filters=None):
+        """
+        Boolean mask of the segments matching `filters`.
+
+        Parameters:
+        filters (dict | None): Attribute mapped to the allowed value or list of values.
+
+        Returns:
+        np.ndarray: (N,) booleans.
+        """
+        selected = np.ones(self.n_segments, dtype=bool)
+        for attribute, allowed in (filters or {}).items():
+            if isinstance(allowed, (list, tuple, set, np.ndarray, pd.Index)):
+                selected &= self.attributes[attribute].isin(list(allowed)).to_numpy()
+            else:
+                selected &= (self.attributes[attribute] == allowed).to_numpy()
+        return selected
+
+    def rollup(self, by=(), filters=None):
+        """
+        Totals of the segments matching `filters`, per combination of the `by` attributes.
+
+        Flows, running totals and NPV are summed; ROI and discounted ROI are
+        recomputed from the summed profits and costs.
+
+        Parameters:
+        by (list[str]): Attributes to group by; an empty list gives the portfolio total.
+        filters (dict | None): See `mask`.
+
+        Returns:
+        tuple: (pd.DataFrame of the G groups' `by` values, core.ProjectionResult with G scenarios).
+        """
+        by = list(by)
+        selected = np.flatnonzero(self.mask(filters))
+        if by and len(selected):
+            keys = pd.MultiIndex.from_frame(self.attributes.loc[selected, by])
+            codes, groups = pd.factorize(keys, sort=True)
+            order = np.argsort(codes, kind="stable")
+            starts = np.flatnonzero(np.diff(codes[order], prepend=-1))
+            totals = np.add.reduceat(self.data[:, selected[order]], starts, axis=1)
+            groups = pd.DataFrame(list(groups), columns=by)
+        else:
+            totals = self.data[:, selected].sum(axis=1, keepdims=True)
+            groups = pd.DataFrame(index=range(1))
+
+        values = {column: totals[i] for i, column in enumerate(SEGMENT_COLUMNS)}
+        core.evaluate_nodes(values, set(RATIO_COLUMNS))
+        values["year"] = np.broadcast_to(np.arange(totals.shape[2], dtype=np.float64), totals.shape[1:])
+        data = np.stack([values[column] for column in core.RESULT_COLUMNS])
+        return groups, core.ProjectionResult(data)
+
+    def frame(self, by=(), filters=None, columns=None, year=None):
+        """
+        Long-format roll-up: one row per group and year.
+
+        Parameters:
+        by (list[str]): Attributes to group by.
+        filters (dict | None): See `mask`.
+        columns (list[str] | None): Result columns to include, all of core.RESULT_COLUMNS by default.
+        year (int | None): Only this year if given.
+
+        Returns:
+        pd.DataFrame: The `by` columns, "year" and the result columns, in raw units.
+        """
+        groups, result = self.rollup(by, filters)
+        columns = [column for column in (columns or core.RESULT_COLUMNS) if column != "year"]
+        n_groups, n_years = result["year"].shape
+        years = np.arange(n_years) if year is None else np.array([year])
+        frame = groups.loc[np.repeat(np.arange(n_groups), len(years))].reset_index(drop=True)
+        frame["year"] = np.tile(years, n_groups)
+        for column in columns:
+            frame[column] = result[column][:, years].ravel()
+        return frame
+
+def evaluate_segments(time_period, segments, assumptions, time_step="year", retention_model="flat",
+                      max_chunk_elements=4_000_000, adoption_model="linear"):
+    """
+    Project every segment of a segment table in one vectorized batch.
+
+    Parameters:
+    time_period (int): Number of years in the projection.
+    segments (pd.DataFrame): Segment table (see `read_segments`).
+    assumptions (dict): Scenario assumptions used where the table has no column.
+    time_step (str): Projection step, one of core.TIME_STEPS; results are yearly.
+    retention_model (str): One of core.RETENTION_MODELS.
+    max_chunk_elements (int): Segments are projected in chunks of at most this many
+        segment x period cells, which bounds the intermediate arrays.
+    adoption_model (str): One of core.ADOPTION_MODELS.
+
+    Returns:
+    SegmentResult: Yearly results per segment.
+    """
+    inputs = segment_assumptions(segments, assumptions)
+    n_segments = len(segments)
+    periods_per_year = core.TIME_STEPS[time_step]
+    chunk_size = max(1, max_chunk_elements // ((time_period + 1) * periods_per_year))
+    data = np.empty((len(SEGMENT_COLUMNS), n_segments, time_period + 1))
+    for start in range(0, n_segments, chunk_size):
+        stop = min(start + chunk_size, n_segments)
+        chunk = {key: value[start:stop] if np.ndim(value) else value for key, value in inputs.items()}
+        projection = core.IncrementalProjection(time_period, chunk, time_step=time_step,
+                                                retention_model=retention_model, adoption_model=adoption_model)
+        block = np.concatenate([projection.result.data,
+                                projection.values["discounted_cumulative_costs"][np.newaxis]])
+        yearly = core.aggregate_to_years(core.ProjectionResult(block, SEGMENT_COLUMNS, periods_per_year))
+        data[:, start:stop] = yearly.data
+    return SegmentResult(data, segments[segment_attributes(segments)])
@@ -0,0 +1,311 @@
+import numpy as np
+import pandas as pd
+
+import financial_core as core
+
+# ---------------- Forward-mode Dual Numbers ----------------
+
+class Dual:
+    """
+    Array of forward-mode dual numbers: a value plus one tangent per seeded input.
+
+    The tangent has a leading axis of length K (one slot per input being
+    differentiated) followed by the value's shape, so a single evaluation of the
+    projection graph propagates all K derivatives at once. NumPy ufuncs and the
+    few array functions used by the model (np.where, np.cumsum, np.broadcast_to and
+    the FFTs of the cohort convolution) dispatch here, which lets the node functions
+    in `financial_core` run unchanged.
+
+    Parameters:
+    value (np.ndarray): Primal values.
+    tangent (np.ndarray): Derivatives, shape (K,) + value.shape (or broadcastable to it).
+    """
+
+    __array_priority__ = 1000
+
+    def __init__(self, value, tangent):
+        # Complex values (the spectra of the cohort convolution) are kept complex.
+        self.value = np.asarray(value, dtype=np.result_type(value, np.float64))
+        self.tangent = np.asarray(tangent, dtype=np.result_type(tangent, np.float64))
+
+    @property
+    def shape(self):
+        return self.value.shape
+
+    @property
+    def ndim(self):
+        return self.value.ndim
+
+    def __getitem__(self, index):
+        # The leading input axis of the tangent is kept whole.
+        index = index if isinstance(index, tuple) else (index,)
+        return Dual(self.value[index], self.tangent[(slice(None),) + index])
+
+    def sum(self, axis):
+        return Dual(self.value.sum(axis=axis), self.tangent.sum(axis=_tangent_axis(axis)))
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != "__call__" or kwargs or ufunc not in _UFUNC_RULES:
+            return NotImplemented
+        values = [x.value if isinstance(x, Dual) else x for x in inputs]
+        tangents = [x.tangent if isinstance(x, Dual) else None for x in inputs]
+        return _UFUNC_RULES[ufunc](values, tangents)
+
+    def __array_function__(self, func, types, args, kwargs):
+        if func not in _FUNCTION_RULES:
+            return NotImplemented
+        return _FUNCTION_RULES[func](*args, **kwargs)
+
+    def __add__(self, other):
+        return np.add(self, other)
+
+    def __radd__(self, other):
+        return np.add(other, self)
+
+    def __sub__(self, other):
+        return np.subtract(self, other)
+
+    def __rsub__(self, other):
+        return np.subtract(other, self)
+
+    def __mul__(self, other):
+        return np.multiply(self, other)
+
+    def __rmul__(self, other):
+        return np.multiply(other, self)
+
+    def __truediv__(self, other):
+        return np.true_divide(self, other)
+
+    def __rtruediv__(self, other):
+        return np.true_divide(other, self)
+
+    def __pow__(self, other):
+        return np.power(self, other)
+
+    def __rpow__(self, other):
+        return np.power(other, self)
+
+    def __neg__(self):
+        return np.negative(self)
+
+    def __lt__(self, other):
+        return np.less(self, other)
+
+    def __le__(self, other):
+        return np.less_equal(self, other)
+
+    def __gt__(self, other):
+        return np.greater(self, other)
+
+    def __ge__(self, other):
+        return np.greater_equal(self, other)
+
+def _dual(value, tangent):
+    return value if tangent is None else Dual(value, tangent)
+
+def _sum_tangents(*terms):
+    terms = [term for term in terms if term is not None]
+    if not terms:
+        return None
+    total = terms[0]
+    for term in terms[1:]:
+        total = total + term
+    return total
+
+def _scale(tangent, factor):
+    return None if tangent is None else tangent * factor
+
+def _add(values, tangents):
+    return _dual(values[0] + values[1], _sum_tangents(*tangents))
+
+def _subtract(values, tangents):
+    return _dual(values[0] - values[1], _sum_tangents(tangents[0], _scale(tangents[1], -1.0)))
+
+def _multiply(values, tangents):
+    (a, b), (da, db) = values, tangents
+    return _dual(a * b, _sum_tangents(_scale(da, b), _scale(db, a)))
+
+def _divide(values, tangents):
+    (a, b), (da, db) = values, tangents
+    return _dual(a / b, _sum_tangents(_scale(da, 1 / b), _scale(db, -a / b**2)))
+
+def _power(values, tangents):
+    (a, b), (da, db) = values, tangents
+    result = a ** b
+    # d(a^b) = b a^(b-1) da + a^b ln(a) db; ln(a) is only needed when b carries a tangent.
+    log_a = np.log(np.where(a > 0, a, 1.0)) if db is not None else None
+    return _dual(result, _sum_tangents(_scale(da, b * a ** (b - 1)), _scale(db, result * log_a if log_a is not None else 0)))
+
+def _negative(values, tangents):
+    return _dual(-values[0], _scale(tangents[0], -1.0))
+
+def _exp(values, tangents):
+    result = np.exp(values[0])
+    return _dual(result, _scale(tangents[0], result))
+
+def _log(values, tangents):
+    return _dual(np.log(values[0]), _scale(tangents[0], 1 / values[0]))
+
+def _select(condition, values, tangents):
+    value = np.where(condition, values[0], values[1])
+    if tangents[0] is None and tangents[1] is None:
+        return value
+    first = 0.0 if tangents[0] is None else tangents[0]
+    second = 0.0 if tangents[1] is None else tangents[1]
+    return Dual(value, np.where(condition, first, second))
+
+def _minimum(values, tangents):
+    # At ties the first argument's derivative is used (one-sided derivative of the clamp).
+    return _select(values[0] <= values[1], values, tangents)
+
+def _maximum(values, tangents):
+    return _select(values[0] >= values[1], values, tangents)
+
+def _comparison(ufunc):
+    return lambda values, tangents: ufunc(values[0], values[1])
+
+_UFUNC_RULES = {
+    np.add: _add,
+    np.subtract: _subtract,
+    np.multiply: _multiply,
+    np.true_divide: _divide,
+    np.power: _power,
+    np.negative: _negative,
+    np.exp: _exp,
+    np.log: _log,
+    np.minimum: _minimum,
+    np.maximum: _maximum,
+    np.less: _comparison(np.less),
+    np.less_equal: _comparison(np.less_equal),
+    np.greater: _comparison(np.greater),
+    np.greater_equal: _comparison(np.greater_equal),
+    np.equal: _comparison(np.equal),
+}
+
+def _where(condition, x, y):
+    values = [v.value if isinstance(v, Dual) else v for v in (x, y)]
+    tangents = [v.tangent if isinstance(v, Dual) else None for v in (x, y)]
+    return _select(condition, values, tangents)
+
+def _tangent_axis(axis):
+    # Tangents carry a leading input axis, so a non-negative axis shifts by one.
+    return axis + 1 if axis is not None and axis >= 0 else axis
+
+def _cumsum(a, axis=None):
+    return Dual(np.cumsum(a.value, axis=axis), np.cumsum(a.tangent, axis=_tangent_axis(axis)))
+
+def _broadcast_to(array, shape):
+    shape = tuple(shape)
+    return Dual(np.broadcast_to(array.value, shape), np.broadcast_to(array.tangent, array.tangent.shape[:1] + shape))
+
+def _rfft(a, n=None, axis=-1, norm=None):
+    # The transforms are linear, so the tangents are transformed like the values.
+    return Dual(np.fft.rfft(a.value, n, axis, norm), np.fft.rfft(a.tangent, n, _tangent_axis(axis), norm))
+
+def _irfft(a, n=None, axis=-1, norm=None):
+    return Dual(np.fft.irfft(a.value, n, axis, norm), np.fft.irfft(a.tangent, n, _tangent_axis(axis), norm))
+
+_FUNCTION_RULES = {
+    np.where: _where,
+    np.cumsum: _cumsum,
+    np.broadcast_to: _broadcast_to,
+    np.fft.rfft: _rfft,
+    np.fft.irfft: _irfft,
+}
+
+# ---------------- Sensitivities ----------------
+
+def _to_years(array, periods_per_year, column):
+    # Yearly view of an (..., periods) array, as in core.aggregate_to_years.
+    by_year = array.reshape(array.shape[:-1] + (-1, periods_per_year))
+    if column in core.FLOW_COLUMNS:
+        return by_year.sum(axis=-1)
+    return by_year[..., 0] if column == "year" else by_year[..., -1]
+
+def financial_sensitivities(time_period, assumptions, keys=None, time_step="year", retention_model="flat",
+                            adoption_model="linear"):
+    """
+    Values and derivatives of every output column with respect to every assumption,
+    computed in a single forward-mode pass over the projection graph.
+
+    Piecewise clamps (np.minimum / np.maximum in `calculate_contacts` and
+    `diminishing_conversion_rate`) use the derivative of the active branch.
+    Sub-yearly projections are aggregated to years like `core.aggregate_to_years`
+    (the derivatives of flows are summed with the flows).
+
+    Parameters:
+    time_period (int): Number of years in the projection.
+    assumptions (dict | list[dict]): Assumption sets, see `core.stack_assumptions`.
+    keys (list[str]): Assumptions to differentiate with respect to, defaults to core.PROJECTION_KEYS.
+    time_step (str): Projection step, one of core.TIME_STEPS.
+    retention_model (str): One of core.RETENTION_MODELS.
+    adoption_model (str): One of core.ADOPTION_MODELS.
+
+    Returns:
+    dict:
+        "keys": The differentiated assumption keys (K).
+        "values": Output column mapped to an (N, T) array, one value per year.
+        "derivatives": Output column mapped to a (K, N, T) array of d(column)/d(key).
+    """
+    keys = list(core.PROJECTION_KEYS if keys is None else keys)
+    inputs = core.stack_assumptions(assumptions)
+    n_scenarios = next(iter(inputs.values())).shape[0]
+
+    values = core.time_inputs(time_period, time_step, retention_model, adoption_model)
+    for key, value in inputs.items():
+        if key in keys:
+            tangent = np.zeros((len(keys), n_scenarios, 1))
+            tangent[keys.index(key)] = 1.0
+            values[key] = Dual(value, tangent)
+        else:
+            values[key] = value
+    core.evaluate_nodes(values)
+
+    periods_per_year = core.TIME_STEPS[time_step]
+    shape = (n_scenarios, (time_period + 1) * periods_per_year)
+    output_values, derivatives = {}, {}
+    for column in core.RESULT_COLUMNS:
+        node = values[column]
+        if isinstance(node, Dual):
+            output_values[column] = _to_years(np.broadcast_to(node.value, shape), periods_per_year, column)
+            derivatives[column] = _to_years(np.broadcast_to(node.tangent, (len(keys),) + shape), periods_per_year,
+                                            column)
+        else:
+            output_values[column] = _to_years(np.broadcast_to(node, shape), periods_per_year, column)
+            derivatives[column] = np.zeros((len(keys), n_scenarios, time_period + 1))
+    return {"keys": keys, "values": output_values, "derivatives": derivatives}
+
+def sensitivity_table(time_period, assumptions, columns=("cumulative_profit", "roi"), year=None, relative_change=0.1,
+                      time_step="year", retention_model="flat", adoption_model="linear"):
+    """
+    Sensitivity of selected outputs to every numeric assumption for one scenario.
+
+    Parameters:
+    time_period (int): Number of years in the projection.
+    assumptions (dict): Assumptions for the scenario.
+    columns (tuple): Output columns (core.RESULT_COLUMNS) to report.
+    year (int): Year at which the outputs are read, defaults to the last year.
+    relative_change (float): Assumption change used for the linearised impact (0.1 = ±10%).
+    time_step, retention_model, adoption_model (str): Projection options, see `financial_sensitivities`.
+
+    Returns:
+    pd.DataFrame: One row per assumption with its value and, per column, the derivative,
+        the elasticity and the linearised impact of a `relative_change` change.
+    """
+    year = time_period if year is None else year
+    sensitivities = financial_sensitivities(time_period, assumptions, time_step=time_step,
+                                            retention_model=retention_model, adoption_model=adoption_model)
+    keys = sensitivities["keys"]
+    # OPTIONAL_KEYS missing from older assumption sets take their defaults, as in core.stack_assumptions.
+    assumption_values = np.array([float(assumptions.get(key, core.DEFAULT_ASSUMPTIONS[key])) for key in keys])
+
+    table = {"value": assumption_values}
+    for column in columns:
+        output = sensitivities["values"][column][0, year]
+        derivative = sensitivities["derivatives"][column][:, 0, year]
+        table[f"d_{column}"] = derivative
+        table[f"elasticity_{column}"] = np.divide(derivative * assumption_values, output,
+                                                   out=np.zeros_like(derivative), where=output != 0)
+        table[f"impact_{column}"] = derivative * assumption_values * relative_change
+    return pd.DataFrame(table, index=pd.Index(keys, name="assumption"))
@@ -0,0 +1,296 @@
+import numpy as np
+
+# ---------------- Streaming Statistics ----------------
+# Bounded-memory summaries of many independent distributions at once (one per
+# year of a projection), updated chunk by chunk and mergeable across processes:
+# exact moments plus a t-digest style quantile sketch. All state is plain NumPy
+# arrays, so the objects pickle cheaply between worker processes.
+
+class RunningMoments:
+    """
+    Exact count, mean, central moments (up to the 4th), minimum and maximum of
+    `n_series` distributions, updated from chunks and merged with the pairwise
+    formulas of Chan et al. / Pébay, so no sample has to be kept.
+
+    Parameters:
+    n_series (int): Number of distributions (e.g. years).
+    """
+
+    def __init__(self, n_series):
+        self.count = np.zeros(n_series)
+        self.mean = np.zeros(n_series)
+        self.m2 = np.zeros(n_series)
+        self.m3 = np.zeros(n_series)
+        self.m4 = np.zeros(n_series)
+        self.min = np.full(n_series, np.inf)
+        self.max = np.full(n_series, -np.inf)
+
+    @classmethod
+    def from_values(cls, values):
+        """
+        Moments of a chunk.
+
+        Parameters:
+        values (np.ndarray): (n_series, n) samples.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        moments = cls(values.shape[0])
+        if values.shape[1] == 0:
+            return moments
+        moments.count[:] = values.shape[1]
+        moments.mean = values.mean(axis=1)
+        deviations = values - moments.mean[:, np.newaxis]
+        squared = deviations * deviations
+        moments.m2 = squared.sum(axis=1)
+        moments.m3 = (squared * deviations).sum(axis=1)
+        moments.m4 = (squared * squared).sum(axis=1)
+        moments.min = values.min(axis=1)
+        moments.max = values.max(axis=1)
+        return moments
+
+    def update(self, values):
+        return self.merge(RunningMoments.from_values(values))
+
+    def merge(self, other):
+        """
+        Combine with the moments of another set of samples, in place.
+
+        Returns:
+        RunningMoments: self.
+        """
+        n_a, n_b = self.count, other.count
+        n = n_a + n_b
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = other.mean - self.mean
+            delta_n = np.where(n > 0, delta / n, 0.0)
+            delta_n2 = delta_n * delta_n
+            term = delta * delta_n * n_a * n_b
+            mean = self.mean + delta_n * n_b
+            m2 = self.m2 + other.m2 + term
+            m3 = (self.m3 + other.m3 + term * delta_n * (n_a - n_b)
+                  + 3 * delta_n * (n_a * other.m2 - n_b * self.m2))
+            m4 = (self.m4 + other.m4 + term * delta_n2 * (n_a * n_a - n_a * n_b + n_b * n_b)
+                  + 6 * delta_n2 * (n_a * n_a * other.m2 + n_b * n_b * self.m2)
+                  + 4 * delta_n * (n_a * other.m3 - n_b * self.m3))
+        self.count, self.mean, self.m2, self.m3, self.m4 = n, mean, m2, m3, m4
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        # Sample variance (ddof=1).
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def skewness(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(self.count) * self.m3 / self.m2 ** 1.5
+
+    @property
+    def kurtosis(self):
+        # Excess kurtosis.
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.count * self.m4 / (self.m2 * self.m2) - 3
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch of `n_series` distributions in the style of the
+    merging t-digest: every distribution is summarised by at most
+    compression / 2 + 1 weighted centroids whose size follows the arcsine scale
+    function, so centroids are small in the tails (where VaR and expected
+    shortfall are read) and large around the median.
+
+    Chunks are sorted once and reduced to centroids with np.add.reduceat, and
+    all distributions are compressed together in vectorized form.
+
+    Parameters:
+    n_series (int): Number of distributions (e.g. years).
+    compression (int): Accuracy parameter (delta); memory is O(n_series * compression).
+    """
+
+    def __init__(self, n_series, compression=300):
+        self.compression = compression
+        self.n_centroids = compression // 2 + 1
+        self.means = np.zeros((n_series, 0))
+        self.weights = np.zeros((n_series, 0))
+        # Exact extremes anchor the interpolation beyond the outer centroids.
+        self.min = np.full(n_series, np.inf)
+        self.max = np.full(n_series, -np.inf)
+
+    @property
+    def count(self):
+        return self.weights.sum(axis=1)
+
+    def _bucket(self, q):
+        # Centroid index of the quantile q under the arcsine scale function k(q).
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * np.clip(q, 0.0, 1.0) - 1)
+        return np.minimum(np.floor(k + self.compression / 4).astype(np.int64), self.n_centroids - 1)
+
+    def update(self, values):
+        """
+        Add a chunk of samples.
+
+        Parameters:
+        values (np.ndarray): (n_series, n) samples.
+
+        Returns:
+        QuantileSketch: self.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n = values.shape[1]
+        if n == 0:
+            return self
+        # Rank positions where the bucket changes; the same for every series of the chunk.
+        buckets = self._bucket((np.arange(n) + 0.5) / n)
+        starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+        # A full sort is several times faster than np.partition at ~150 boundaries.
+        ordered = np.sort(values, axis=1)
+        sizes = np.diff(np.append(starts, n)).astype(np.float64)
+        means = np.add.reduceat(ordered, starts, axis=1) / sizes
+        self.min = np.minimum(self.min, values.min(axis=1))
+        self.max = np.maximum(self.max, values.max(axis=1))
+        return self._absorb(means, np.broadcast_to(sizes, means.shape))
+
+    def merge(self, other):
+        """
+        Combine with another sketch of the same distributions, in place.
+
+        Returns:
+        QuantileSketch: self.
+        """
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self._absorb(other.means, other.weights)
+
+    def _absorb(self, means, weights):
+        means = np.concatenate([self.means, means], axis=1)
+        weights = np.concatenate([self.weights, weights], axis=1)
+        n_series = means.shape[0]
+
+        # Sort the centroids of every series; empty ones go last.
+        order = np.argsort(np.where(weights > 0, means, np.inf), axis=1, kind="stable")
+        means = np.take_along_axis(means, order, axis=1)
+        weights = np.take_along_axis(weights, order, axis=1)
+
+        total = weights.sum(axis=1, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            q = (np.cumsum(weights, axis=1) - weights / 2) / total
+        buckets = self._bucket(np.nan_to_num(q))
+        ids = (buckets + self.n_centroids * np.arange(n_series)[:, np.newaxis]).ravel()
+        size = n_series * self.n_centroids
+        new_weights = np.bincount(ids, weights.ravel(), minlength=size)
+        weighted = np.bincount(ids, (weights * np.where(weights > 0, means, 0.0)).ravel(), minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            new_means = np.where(new_weights > 0, weighted / new_weights, 0.0)
+        self.means = new_means.reshape(n_series, self.n_centroids)
+        self.weights = new_weights.reshape(n_series, self.n_centroids)
+        return self
+
+    def _knots(self, series):
+        # (cumulative weight, value) points of the piecewise-linear quantile function of one series.
+        filled = self.weights[series] > 0
+        weights, means = self.weights[series][filled], self.means[series][filled]
+        centres = np.cumsum(weights) - weights / 2
+        total = weights.sum()
+        positions = np.concatenate([[0.0], centres, [total]]) / total
+        values = np.concatenate([[self.min[series]], means, [self.max[series]]])
+        return positions, values
+
+    def quantile(self, q):
+        """
+        Approximate quantiles.
+
+        Parameters:
+        q (array-like): Quantiles in [0, 1].
+
+        Returns:
+        np.ndarray: (n_series, len(q)); NaN for series without samples.
+        """
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        result = np.full((self.means.shape[0], len(q)), np.nan)
+        for series in np.flatnonzero(self.weights.sum(axis=1) > 0):
+            result[series] = np.interp(q, *self._knots(series))
+        return result
+
+    def tail_mean(self, level):
+        """
+        Approximate mean of the lowest `level` share of every distribution (the
+        expected shortfall at `level`). Centroids wholly inside the tail contribute
+        their exact sums, the centroid that straddles the boundary a pro-rata share.
+
+        Returns:
+        np.ndarray: (n_series,); NaN for series without samples.
+        """
+        # Empty centroids are kept in order by _absorb, with zero weight they add nothing.
+        tail = level * self.weights.sum(axis=1, keepdims=True)
+        before = np.cumsum(self.weights, axis=1) - self.weights
+        taken = np.clip(tail - before, 0.0, self.weights)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (taken * self.means).sum(axis=1) / tail[:, 0]
+
+class StreamingStats:
+    """
+    Running moments, quantile sketch and count of negative values of
+    `n_series` distributions.
+
+    Parameters:
+    n_series (int): Number of distributions (e.g. years).
+    compression (int): Accuracy parameter of the quantile sketch.
+    """
+
+    def __init__(self, n_series, compression=300):
+        self.moments = RunningMoments(n_series)
+        self.sketch = QuantileSketch(n_series, compression)
+        self.negative = np.zeros(n_series, dtype=np.int64)
+
+    @property
+    def count(self):
+        return self.moments.count
+
+    def update(self, values):
+        """
+        Add a chunk of samples, (n_series, n).
+
+        Returns:
+        StreamingStats: self.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        self.moments.update(values)
+        self.sketch.update(values)
+        self.negative += (values < 0).sum(axis=1)
+        return self
+
+    def merge(self, other):
+        """
+        Combine with the statistics of another set of samples (e.g. from another worker), in place.
+
+        Returns:
+        StreamingStats: self.
+        """
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.negative += other.negative
+        return self
+
+    def value_at_risk(self, level=0.05):
+        """
+        The `level` quantile: the value only `level` of the samples fall below.
+        """
+        return self.sketch.quantile([level])[:, 0]
+
+    def expected_shortfall(self, level=0.05):
+        """
+        Mean of the samples below the value at risk at `level`.
+        """
+        return self.sketch.tail_mean(level)
+
+    @property
+    def prob_negative(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.negative / self.moments.count
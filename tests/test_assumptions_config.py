@@ -0,0 +1,42 @@
+from streamlit.testing.v1 import AppTest
+
+
+def _upload_app(csv):
+    import io
+    from unittest import mock
+
+    import streamlit as st
+
+    import assumptions_config as ac
+
+    upload = io.BytesIO(csv.encode("utf-8"))
+    upload.name = "escenarios.csv"
+    with mock.patch.object(st.sidebar, "file_uploader", return_value=upload):
+        st.session_state["scenarios"] = ac.scenarios_file()
+
+
+def _run(csv):
+    return AppTest.from_function(_upload_app, args=(csv,)).run()
+
+
+def test_scenarios_file_loads_named_scenarios():
+    at = _run("scenario,nps_increase\nBase,0.01\nOptimista,0.02\n")
+
+    assert not at.error
+    scenarios = at.session_state["scenarios"]
+    assert list(scenarios) == ["Base", "Optimista"]
+    assert scenarios["Optimista"]["nps_increase"] == 0.02
+
+
+def test_scenarios_file_rejects_repeated_names():
+    at = _run("scenario,nps_increase\nBase,0.01\nBase,0.02\n")
+
+    assert at.session_state["scenarios"] is None
+    assert "Base" in at.error[0].value
+
+
+def test_scenarios_file_rejects_blank_values():
+    at = _run("scenario,nps_increase,recurring_monthly_costs\nBase,0.01,40000\nOptimista,,40000\n")
+
+    assert at.session_state["scenarios"] is None
+    assert "Optimista (nps_increase)" in at.error[0].value
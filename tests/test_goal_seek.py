@@ -0,0 +1,26 @@
+import numpy as np
+
+import financial_core as core
+from goal_seek import goal_seek
+
+
+def test_one_assumption_set_with_many_targets():
+    targets = np.array([100.0, 150.0, 200.0])
+    solution = goal_seek(6, core.DEFAULT_ASSUMPTIONS, "recurring_monthly_costs", "roi", targets,
+                         bounds=(0, 1e6), year=5)
+
+    assert solution["value"].shape == (3,)
+    assert solution["bracketed"].all()
+    # Higher ROI targets leave room for lower recurring costs.
+    assert np.all(np.diff(solution["value"]) < 0)
+    solved = core.calculate_financials_batch(6, {**core.DEFAULT_ASSUMPTIONS,
+                                                 "recurring_monthly_costs": solution["value"]})
+    np.testing.assert_allclose(solved["roi"][:, 5], targets, rtol=1e-6)
+
+
+def test_one_assumption_set_with_many_bounds():
+    solution = goal_seek(6, core.DEFAULT_ASSUMPTIONS, "recurring_monthly_costs", "roi", 150,
+                         bounds=(np.zeros(2), np.array([1e6, 1.0])), year=5)
+
+    assert solution["bracketed"].tolist() == [True, False]
+    assert np.isnan(solution["value"][1])
@@ -1,80 +1,166 @@
+import io
+
 import numpy as np
-import matplotlib.pyplot as plt
 import streamlit as st
 import pandas as pd
 
+import helper_functions as hf
+import profiling
+import scenario_cache
 
-def plot_waterfall(scenario_df, scenario_name, y_max):
-    components = {
-        "Nuevos clientes": scenario_df["Nuevos Clientes (M)"].sum(),
-        "Retención": scenario_df["Beneficio de Retención (€M)"].sum(),
-        "Ahorro": scenario_df["Ahorros del Chatbot (€M)"].sum(),
-        "Costes": -scenario_df["Costes (€M)"].sum()
-    }
 
-    labels = list(components.keys())
-    values = list(components.values())
-    cumulative = np.cumsum(values)
+WATERFALL_LABELS = ["Nuevos clientes", "Retención", "Ahorro", "Costes"]
+WATERFALL_COLORS = ["#FF9999", "#FF6666", "#FF3333", "#FF0000"]  # Custom red tones
+
+# Rendered waterfalls (PNG bytes) keyed by a hash of their four bar totals and
+# the y-axis limit. Module-level, so reruns and sessions of one server share it.
+waterfall_cache = scenario_cache.LRUCache(max_entries=256, max_bytes=64 * 1024 * 1024)
 
+def _waterfall_bars(components):
+    """
+    Bar values, bar bottoms and running totals of a waterfall.
+    """
+    values = np.asarray(components, dtype=np.float64)
+    cumulative = np.cumsum(values)
+    return values, cumulative - values, cumulative
+
+def render_waterfall_png(components, y_max, dpi=120):
+    """
+    Render a waterfall chart to PNG. The figure is closed before returning, so
+    repeated renders do not accumulate figures in pyplot.
+
+    Parameters:
+    components (tuple): The four bar totals, as returned by hf.waterfall_components.
+    y_max (float): Shared y-axis limit (see hf.calculate_max_y_limit).
+    dpi (int): Resolution of the image. The default keeps the 12-inch figure
+        narrower than Streamlit's maximum content width, so st.image sends the
+        cached bytes as they are instead of resizing and re-encoding them.
+
+    Returns:
+    bytes: The PNG image.
+    """
+    # matplotlib is only loaded once a waterfall is actually rendered.
+    import matplotlib.pyplot as plt
+
+    values, starts, cumulative = _waterfall_bars(components)
     fig, ax = plt.subplots(figsize=(12, 6))  # Adjusted figsize for better width
+    try:
+        ax.bar(WATERFALL_LABELS, values, bottom=starts, color=WATERFALL_COLORS)
+        for i, value in enumerate(values):
+            ax.text(i, 1, f"{value:.1f}M", ha="center", color="red" if value < 0 else "black", fontsize=12)
+            # Running total on top of the bar: its bottom for negative bars.
+            ax.text(i, starts[i] if value < 0 else cumulative[i], f"{cumulative[i]:.1f}M", ha="center",
+                    va="baseline" if value < 0 else "bottom", color="black", fontweight="bold", fontsize=12)
+
+        # Remove the box around the plot
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+
+        # Set y-axis limits to ensure all columns fit within the chart
+        ax.set_ylim(0, y_max + y_max)
+
+        # Remove y-axis values
+        ax.set_yticklabels([])
+        ax.yaxis.set_ticks([])
 
-    # Custom red tones
-    colors = ["#FF9999", "#FF6666", "#FF3333", "#FF0000"]
-
-    # Plot bars
-    for i, (label, value) in enumerate(zip(labels, values)):
-        start = cumulative[i] - value if i > 0 else 0
-        ax.bar(label, value, bottom=start, color=colors[i])
-        ax.text(i, 
-                1, 
-                f"{value:.1f}M", 
-                ha="center", 
-                color="red" if value < 0 else "black", 
-                fontsize=12)
-        if value < 0:
-            ax.text(i, 
-                    start, 
-                    f"{cumulative[i]:.1f}M", 
-                    ha="center", 
-                    va="baseline", 
-                    color="black", 
-                    fontweight="bold", 
-                    fontsize=12)
-        else:
-            ax.text(i, 
-                    start + value, 
-                    f"{cumulative[i]:.1f}M", 
-                    ha="center", 
-                    va="bottom", 
-                    color="black", 
-                    fontweight="bold", 
-                    fontsize=12)
-
-    # Remove the box around the plot
-    ax.spines['top'].set_visible(False)
-    ax.spines['right'].set_visible(False)
-    ax.spines['left'].set_visible(False)
-    ax.spines['bottom'].set_visible(False)
-
-    # Set y-axis limits to ensure all columns fit within the chart
-    ax.set_ylim(0, y_max +  y_max)
-
-    # Remove y-axis values
-    ax.set_yticklabels([])
-    ax.yaxis.set_ticks([])
-
-    # Adjust the layout to make sure everything fits
-    plt.tight_layout()
-    plt.subplots_adjust(left=0.1, right=0.9, top=0.9, bottom=0.2)  # Adjust the padding as needed
-
-    # Set x-axis label size
-    ax.tick_params(axis='x', labelsize=18)
-
-    ax.set_ylabel("Contribución Acumulada al Beneficio (€M)", fontsize=15)
-    st.pyplot(fig)
-
-
-def compare_assumptions(assumptions1, assumptions2):
+        # Adjust the layout to make sure everything fits
+        fig.tight_layout()
+        fig.subplots_adjust(left=0.1, right=0.9, top=0.9, bottom=0.2)  # Adjust the padding as needed
+
+        # Set x-axis label size
+        ax.tick_params(axis='x', labelsize=18)
+
+        ax.set_ylabel("Contribución Acumulada al Beneficio (€M)", fontsize=15)
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+@profiling.timed()
+def plot_waterfall(scenario_df, scenario_name, y_max):
+    """
+    Waterfall of the profit contributions of one scenario, rendered once per
+    distinct (bar totals, y_max) and served from the cache afterwards.
+    """
+    components = hf.waterfall_components(scenario_df)
+    key = scenario_cache.assumptions_hash({"components": list(components), "y_max": float(y_max)}, "waterfall")
+    png = waterfall_cache.get(key)
+    if png is None:
+        png = render_waterfall_png(components, float(y_max))
+        waterfall_cache.put(key, png)
+    st.image(png, width="stretch", output_format="PNG")
+
+def waterfall_vega_lite_spec(y_max):
+    """
+    Vega-Lite specification of the waterfall chart for the data built by plot_waterfall_vega.
+    Written as a plain dict so no Altair objects have to be built and validated per chart.
+    """
+    y_scale = {"domain": [0, 2 * float(y_max)]}
+    return {
+        "height": 350,
+        "view": {"strokeWidth": 0},
+        "encoding": {
+            "x": {"field": "Componente", "type": "nominal", "sort": None, "title": None,
+                  "axis": {"labelAngle": 0, "labelFontSize": 14}},
+        },
+        "layer": [
+            {
+                "mark": {"type": "bar", "clip": True},
+                "encoding": {
+                    "y": {"field": "inicio", "type": "quantitative", "scale": y_scale,
+                          "axis": {"labels": False, "ticks": False, "grid": False},
+                          "title": "Contribución Acumulada al Beneficio (€M)"},
+                    "y2": {"field": "fin"},
+                    "color": {"field": "color", "type": "nominal", "scale": None},
+                    "tooltip": [
+                        {"field": "Componente", "type": "nominal"},
+                        {"field": "valor", "type": "quantitative", "format": ".1f", "title": "Valor (€M)"},
+                        {"field": "fin", "type": "quantitative", "format": ".1f", "title": "Acumulado (€M)"},
+                    ],
+                },
+            },
+            {
+                # Running total on top of each bar.
+                "mark": {"type": "text", "dy": -8, "fontWeight": "bold", "fontSize": 12},
+                "encoding": {"y": {"field": "cima", "type": "quantitative", "scale": y_scale},
+                             "text": {"field": "etiqueta_total"}},
+            },
+            {
+                # Bar values at the foot of the chart.
+                "mark": {"type": "text", "dy": -8, "fontSize": 12},
+                "encoding": {"y": {"field": "pie", "type": "quantitative", "scale": y_scale},
+                             "text": {"field": "etiqueta_valor"},
+                             "color": {"field": "color_valor", "type": "nominal", "scale": None}},
+            },
+        ],
+    }
+
+@profiling.timed()
+def plot_waterfall_vega(scenario_df, scenario_name, y_max):
+    """
+    Vector (Vega-Lite) version of plot_waterfall: four rows of data and a small
+    spec are sent to the browser and drawn there, so many scenarios stay cheap to render.
+    """
+    values, starts, cumulative = _waterfall_bars(hf.waterfall_components(scenario_df))
+    data = pd.DataFrame({
+        "Componente": WATERFALL_LABELS,
+        "inicio": starts,
+        "fin": cumulative,
+        "valor": values,
+        "color": WATERFALL_COLORS,
+        "etiqueta_valor": [f"{value:.1f}M" for value in values],
+        "etiqueta_total": [f"{total:.1f}M" for total in cumulative],
+        "cima": np.maximum(starts, cumulative),
+        "color_valor": np.where(values < 0, "red", "black"),
+        "pie": 1.0,
+    })
+    st.vega_lite_chart(data, waterfall_vega_lite_spec(y_max), use_container_width=True)
+
+
+@profiling.timed()
+def compare_assumptions(assumptions_by_scenario):
     categories = {
         "Costes de implementación": ["first_year_costs", "recurring_monthly_costs"],
         "Negocio": ["initial_insurance_company_health_policies", "avg_contacts_phone_web_daily", "health_insurance_yearly_company_growth_rate", "perc_estimated_current_conversion", "conversion_increase", "max_conversion_rate"],  
@@ -108,35 +194,29 @@ def compare_assumptions(assumptions1, assumptions2):
         "insurance_company_avg_policy_price": "Valor promedio de las pólizas en insurance_company"
     }
 
+    def format_value(key, value):
+        if value is None:
+            return None
+        if key in percentage_keys:
+            return f"{value * 100:.2f}%"
+        if key in monetary_big_keys:
+            return f"€{value/1000000 :.2f}M"
+        if key in monetary_small_keys:
+            return f"€{value :.2f}"
+        if key in absolute_keys:
+            return f"{value:.0f}"
+        return value
+
+    labels = {**percentage_keys, **monetary_big_keys, **monetary_small_keys, **absolute_keys}
+
     table_data = []
     for category, keys in categories.items():
         for key in keys:
-            value1 = assumptions1.get(key)
-            value2 = assumptions2.get(key)
-            if key in percentage_keys:
-                value1 = f"{value1 * 100:.2f}%" if value1 is not None else None
-                value2 = f"{value2 * 100:.2f}%" if value2 is not None else None
-                assumption_name = percentage_keys[key]
-            elif key in monetary_big_keys:
-                value1= f"€{value1/1000000 :.2f}M" if value1 is not None else None
-                value2= f"€{value2/1000000 :.2f}M" if value2 is not None else None
-                assumption_name = monetary_big_keys[key]
-            elif key in monetary_small_keys:
-                value1= f"€{value1 :.2f}" if value1 is not None else None
-                value2= f"€{value2 :.2f}" if value2 is not None else None
-                assumption_name = monetary_small_keys[key]
-            elif key in absolute_keys:
-                value1 = f"{value1:.0f}" if value1 is not None else None
-                value2 = f"{value2:.0f}" if value2 is not None else None
-                assumption_name = absolute_keys[key]
-            else:
-                assumption_name = key.replace("_", " ").capitalize()
-            table_data.append({
-                "Categoría": category,
-                "Supuesto": assumption_name,
-                "Escenario 1": value1,
-                "Escenario 2": value2
-            })
+            assumption_name = labels.get(key, key.replace("_", " ").capitalize())
+            row = {"Categoría": category, "Supuesto": assumption_name}
+            for name, assumptions in assumptions_by_scenario.items():
+                row[name] = format_value(key, assumptions.get(key))
+            table_data.append(row)
 
     comparison_table = pd.DataFrame(table_data)
     st.dataframe(comparison_table, height=600, width=1200)